@@ -0,0 +1,340 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Benchmark cvs2svn, cvs2git and cvs2hg on a synthetic repository.
+
+A synthetic CVS repository is generated using synthetic_repos.py, then
+each of the tools is run on it with --write-stats.  The time, peak
+memory and temporary file sizes of each pass are collected into a
+single JSON file, together with the parameters of the repository and
+the git commit of the working tree, so that the results of different
+commits can be compared using the --compare option."""
+
+
+import sys
+import os
+import time
+import shutil
+import optparse
+import subprocess
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contrib.synthetic_repos import DEFAULTS
+from contrib.synthetic_repos import generate_repository
+
+
+usage = """\
+USAGE: %prog [options]
+       %prog --compare OLD.json NEW.json"""
+description = """\
+Generate a synthetic CVS repository and convert it with cvs2svn,
+cvs2git and cvs2hg, recording the time, peak memory and temporary
+file sizes of each pass as JSON.  With --compare, compare the results
+of two earlier runs.
+"""
+
+
+# The top-level directory of the cvs2svn source tree:
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parameters for synthetic_repos.generate_repository(), by size:
+PRESETS = {
+    'small' : {},
+    'medium' : {
+        'files' : 2000, 'dirs' : 100, 'commits' : 2000, 'branches' : 20,
+        'tags' : 50, 'vendor_imports' : 3,
+        },
+    'large' : {
+        'files' : 20000, 'dirs' : 1000, 'commits' : 20000, 'revisions' : 20,
+        'branches' : 50, 'tags' : 200, 'vendor_imports' : 5,
+        },
+    }
+
+
+def get_tool_args(tool, outdir):
+    """Return the output arguments to pass to TOOL.
+
+    The output files are written into directory OUTDIR."""
+
+    if tool == 'cvs2svn':
+        return ['--dumpfile=%s' % (os.path.join(outdir, 'cvs2svn.dump'),)]
+    elif tool == 'cvs2git':
+        return [
+            '--blobfile=%s' % (os.path.join(outdir, 'cvs2git.blob'),),
+            '--dumpfile=%s' % (os.path.join(outdir, 'cvs2git.dump'),),
+            '--username=cvs2git',
+            '--use-external-blob-generator',
+            ]
+    elif tool == 'cvs2hg':
+        return ['--hgrepos=%s' % (os.path.join(outdir, 'cvs2hg.hg'),)]
+    else:
+        raise ValueError('Unknown tool %r' % (tool,))
+
+
+def get_git_commit():
+    """Return the git commit of the source tree, or None if unknown."""
+
+    try:
+        p = subprocess.Popen(
+            ['git', 'rev-parse', 'HEAD'], cwd=TOP_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+        (output, error) = p.communicate()
+    except OSError:
+        return None
+    if p.returncode:
+        return None
+    return output.strip()
+
+
+def run_tool(tool, cvsrepo, workdir, extra_args):
+    """Convert CVSREPO using TOOL and return the results as a map.
+
+    Temporary files and output are written to WORKDIR, which is
+    emptied afterwards."""
+
+    outdir = os.path.join(workdir, tool)
+    os.makedirs(outdir)
+    stats_file = os.path.join(workdir, '%s-stats.json' % (tool,))
+    log_file = os.path.join(workdir, '%s.log' % (tool,))
+    cmd = [sys.executable, os.path.join(TOP_DIR, tool)]
+    cmd += get_tool_args(tool, outdir)
+    cmd += [
+        '--tmpdir=%s' % (os.path.join(outdir, 'tmp'),),
+        '--write-stats=%s' % (stats_file,),
+        ]
+    cmd += extra_args
+    cmd.append(cvsrepo)
+
+    sys.stderr.write('Running %s...\n' % (tool,))
+    log = open(log_file, 'w')
+    start_time = time.time()
+    try:
+        returncode = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        log.close()
+    wall_time = time.time() - start_time
+
+    results = {'command' : cmd, 'wall_time' : wall_time}
+    if returncode:
+        results['error'] = returncode
+        results['log'] = open(log_file).read()[-2000:]
+        sys.stderr.write('%s failed (exit code %d).\n' % (tool, returncode,))
+    else:
+        f = open(stats_file)
+        stats = json.load(f)
+        f.close()
+        results['stats'] = stats
+        results['passes'] = stats['passes']
+        results['max_rss'] = max(
+            [0] + [p.get('max_rss', 0) for p in stats['passes']]
+            )
+        # The temporary files in use during a pass are a lower bound
+        # for the disk space needed during the pass:
+        results['peak_tmp_bytes'] = max(
+            [0] + [
+                p.get('artifacts_created', 0) + p.get('artifacts_needed', 0)
+                for p in stats['passes']
+                ]
+            )
+        shutil.rmtree(outdir)
+    return results
+
+
+def run_benchmark(params, tools, workdir, extra_args):
+    """Run the benchmark and return the results as a map."""
+
+    cvsrepo = os.path.join(workdir, 'cvsrepos')
+    sys.stderr.write('Generating synthetic repository...\n')
+    start_time = time.time()
+    generate_repository(cvsrepo, **params)
+    generate_time = time.time() - start_time
+
+    results = {}
+    for tool in tools:
+        results[tool] = run_tool(tool, cvsrepo, workdir, extra_args)
+
+    shutil.rmtree(cvsrepo)
+
+    return {
+        'commit' : get_git_commit(),
+        'python' : sys.version,
+        'date' : time.time(),
+        'params' : params,
+        'generate_time' : generate_time,
+        'results' : results,
+        }
+
+
+def _format_ratio(old, new):
+    if not old:
+        return '%8s' % ('-',)
+    return '%7.2fx' % (float(new) / old,)
+
+
+def compare(old, new, f):
+    """Write a comparison of benchmark results OLD and NEW to F."""
+
+    f.write('old: %s\nnew: %s\n' % (old.get('commit'), new.get('commit'),))
+    if old['params'] != new['params']:
+        f.write('WARNING: the repository parameters differ!\n')
+    tools = [tool for tool in old['results'] if tool in new['results']]
+    tools.sort()
+    for tool in tools:
+        old_results = old['results'][tool]
+        new_results = new['results'][tool]
+        f.write('\n%s:\n' % (tool,))
+        if 'error' in old_results or 'error' in new_results:
+            f.write('    (failed)\n')
+            continue
+        f.write(
+            '    %-36s %10s %10s %8s %10s %8s\n'
+            % ('pass', 'old time', 'new time', '', 'new RSS', '',)
+            )
+        old_passes = {}
+        for p in old_results['passes']:
+            old_passes[p['number']] = p
+        for p in new_results['passes']:
+            o = old_passes.get(p['number'], {})
+            f.write(
+                '    %-36s %10.3f %10.3f %s %10d %s\n' % (
+                    '%d (%s)' % (p['number'], p.get('name'),),
+                    o.get('duration', 0.0), p.get('duration', 0.0),
+                    _format_ratio(o.get('duration'), p.get('duration')),
+                    p.get('max_rss', 0),
+                    _format_ratio(o.get('max_rss'), p.get('max_rss')),
+                    )
+                )
+        f.write(
+            '    %-36s %10.3f %10.3f %s\n' % (
+                'total (wall clock)',
+                old_results['wall_time'], new_results['wall_time'],
+                _format_ratio(old_results['wall_time'], new_results['wall_time']),
+                )
+            )
+        f.write(
+            '    peak temporary file size: %d -> %d bytes\n' % (
+                old_results['peak_tmp_bytes'], new_results['peak_tmp_bytes'],
+                )
+            )
+
+
+class MyHelpFormatter(optparse.IndentedHelpFormatter):
+    """A HelpFormatter for optparse that doesn't reformat the description."""
+
+    def format_description(self, description):
+        return description
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage=usage, description=description,
+        formatter=MyHelpFormatter(),
+        )
+    parser.add_option(
+        '--preset', type='choice', choices=PRESETS.keys(), default='small',
+        help=(
+            'size of the synthetic repository: %s (default %%default)'
+            % (', '.join(PRESETS.keys()),)
+            ),
+        )
+    parser.add_option(
+        '--set', action='append', default=[], metavar='NAME=VALUE',
+        help=(
+            'override a parameter of the synthetic repository (see '
+            'synthetic_repos.py --help); may be specified multiple times'
+            ),
+        )
+    parser.add_option(
+        '--tools', default='cvs2svn,cvs2git,cvs2hg',
+        help='comma-separated list of tools to run (default %default)',
+        )
+    parser.add_option(
+        '--workdir', default='benchmark-tmp',
+        help='directory for temporary files (default %default)',
+        )
+    parser.add_option(
+        '--output', metavar='PATH',
+        help='write the results to PATH (default: standard output)',
+        )
+    parser.add_option(
+        '--tool-option', action='append', default=[], metavar='OPTION',
+        help='pass OPTION to each tool; may be specified multiple times',
+        )
+    parser.add_option(
+        '--compare', action='store_true', default=False,
+        help='compare the results in two JSON files',
+        )
+
+    (options, args) = parser.parse_args()
+
+    if options.compare:
+        if len(args) != 2:
+            parser.error('--compare requires exactly two arguments')
+        results = []
+        for filename in args:
+            f = open(filename)
+            results.append(json.load(f))
+            f.close()
+        compare(results[0], results[1], sys.stdout)
+        return
+
+    if args:
+        parser.error('no arguments are allowed')
+
+    params = DEFAULTS.copy()
+    params.update(PRESETS[options.preset])
+    for setting in options.set:
+        try:
+            (name, value) = setting.split('=', 1)
+        except ValueError:
+            parser.error('--set requires NAME=VALUE')
+        if name not in DEFAULTS:
+            parser.error('unknown parameter %r' % (name,))
+        params[name] = type(DEFAULTS[name])(value)
+
+    tools = [tool.strip() for tool in options.tools.split(',') if tool.strip()]
+
+    if os.path.exists(options.workdir):
+        parser.error('%r already exists' % (options.workdir,))
+    os.makedirs(options.workdir)
+    try:
+        data = run_benchmark(params, tools, options.workdir, options.tool_option)
+    finally:
+        shutil.rmtree(options.workdir, True)
+
+    if options.output:
+        f = open(options.output, 'w')
+    else:
+        f = sys.stdout
+    json.dump(data, f, indent=2, sort_keys=True)
+    f.write('\n')
+    if options.output:
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
+
+
@@ -0,0 +1,675 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Estimate the cost of converting a CVS repository from a sample.
+
+The ,v files of the repository are listed using walk_repository(), so
+their number and total size are known exactly.  A random sample of
+them is parsed with the collectors used by CollectRevsPass, measuring
+for each file the parse time, the numbers of revisions, branches and
+tags, the lengths of the RCS delta chains, and the total size of the
+fulltexts of all revisions.  The totals of these quantities for the
+whole repository are extrapolated using ratio estimators, with the
+sizes of the ,v files as the auxiliary variable, together with their
+95% confidence ranges.
+
+Then half of the sample and the whole sample are converted as
+repositories of their own, running each pass in a separate process
+with --write-stats.  The time, peak memory and temporary file sizes of
+each pass are fitted to a straight line through the two measurements,
+as a function of the quantity that the pass is mostly driven by (see
+PASS_DRIVERS), and extrapolated to the estimated total of that
+quantity.  The ranges given for the costs of the passes only reflect
+the sampling error of the driving quantity; passes whose cost grows
+faster than linearly (e.g., breaking changeset cycles in a repository
+with a very tangled history) can take longer than estimated."""
+
+
+import sys
+import os
+import time
+import math
+import random
+import shutil
+import optparse
+import subprocess
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib.common import FatalError
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.project import Project
+from cvs2svn_lib.cvs_path import CVSFile
+from cvs2svn_lib.cvs_item import CVSRevision
+from cvs2svn_lib.cvs_item import CVSBranch
+from cvs2svn_lib.cvs_item import CVSTag
+from cvs2svn_lib.metadata_database import MetadataLogger
+from cvs2svn_lib.repository_walker import walk_repository
+from cvs2svn_lib.collect_data import _ProjectDataCollector
+from cvs2svn_lib.collect_data import _FileDataCollector
+from cvs2svn_lib.rcs_stream import RCSStream
+from cvs2svn_lib.rcs_stream import MalformedDeltaException
+from cvs2svn_lib.passes import passes
+from cvs2svn_rcsparse import parse
+from contrib.benchmark import TOP_DIR
+from contrib.benchmark import get_tool_args
+
+
+usage = 'USAGE: %prog [options] CVSREPO'
+description = """\
+Estimate the time, peak memory and temporary disk space needed to
+convert CVSREPO, by measuring a random sample of its ,v files.
+"""
+
+
+# The factor by which the standard error is multiplied to get a 95%
+# confidence range:
+Z_95 = 1.96
+
+# The quantities measured for each sampled file, with their
+# descriptions:
+QUANTITIES = [
+    ('revisions', 'CVS revisions'),
+    ('branches', 'CVS branches'),
+    ('tags', 'CVS tags'),
+    ('items', 'CVSItems (revisions, branches and tags)'),
+    ('delta_applications', 'delta applications to check out all revisions'),
+    ('fulltext_bytes', 'fulltext bytes of all revisions'),
+    ('parse_time', 'parse time in CollectRevsPass (seconds)'),
+    ]
+
+# A map {pass_name : quantity} of the quantity that the cost of each
+# pass is assumed to be proportional to.  The cost of the passes that
+# are not listed here is assumed to be proportional to the number of
+# CVSItems:
+PASS_DRIVERS = {
+    'CollectRevsPass' : 'size',
+    'FilterSymbolsPass' : 'fulltext_bytes',
+    'OutputPass' : 'fulltext_bytes',
+    }
+
+
+class SampleCollectData:
+    """A stand-in for CollectData that doesn't write any databases.
+
+    It provides the members that _ProjectDataCollector and
+    _FileDataCollector use, keeping the metadata in memory and
+    remembering the fatal errors instead of reporting them."""
+
+    def __init__(self):
+        self.item_key_generator = KeyGenerator()
+        self.symbol_key_generator = KeyGenerator()
+        self.metadata_logger = MetadataLogger({})
+        self.fatal_errors = []
+
+    def record_fatal_error(self, err):
+        self.fatal_errors.append(err)
+
+    def register_trunk(self, trunk):
+        pass
+
+
+class MeasuringFileDataCollector(_FileDataCollector):
+    """A _FileDataCollector that also remembers the RCS delta tree."""
+
+    def __init__(self, pdc, cvs_file):
+        _FileDataCollector.__init__(self, pdc, cvs_file)
+
+        # The head revision, from which all deltas are computed:
+        self.head = None
+
+        # A map {revision : (next, branches)} describing the delta
+        # tree.  NEXT is the revision whose deltatext is relative to
+        # REVISION along the same line of development (or None), and
+        # BRANCHES are the first revisions of the branches sprouting
+        # from REVISION:
+        self.successors = {}
+
+        # A map {revision : deltatext}:
+        self.texts = {}
+
+    def set_head_revision(self, revision):
+        _FileDataCollector.set_head_revision(self, revision)
+        self.head = revision
+
+    def define_revision(
+          self, revision, timestamp, author, state, branches, next
+          ):
+        _FileDataCollector.define_revision(
+            self, revision, timestamp, author, state, branches, next
+            )
+        self.successors[revision] = (next, branches)
+
+    def set_revision_info(self, revision, log, text):
+        _FileDataCollector.set_revision_info(self, revision, log, text)
+        # As in the collector, only the first deltatext counts:
+        self.texts.setdefault(revision, text)
+
+    def measure_delta_tree(self):
+        """Return (fulltext_bytes, delta_applications, max_chain).
+
+        FULLTEXT_BYTES is the total size of the fulltexts of all
+        revisions, DELTA_APPLICATIONS is the total number of deltas
+        that have to be applied to check out each revision separately
+        (as 'co' does), and MAX_CHAIN is the largest number of deltas
+        that have to be applied for any single revision."""
+
+        fulltext_bytes = 0
+        delta_applications = 0
+        max_chain = 0
+        if self.head is None:
+            return (fulltext_bytes, delta_applications, max_chain)
+
+        stack = [(self.head, self.texts.get(self.head, ''), 0)]
+        while stack:
+            (revision, text, chain) = stack.pop()
+            fulltext_bytes += len(text)
+            delta_applications += chain
+            max_chain = max(max_chain, chain)
+            (next, branches) = self.successors.get(revision, (None, []))
+            for child in list(branches) + [next]:
+                if child is None or child not in self.successors:
+                    continue
+                stream = RCSStream(text)
+                try:
+                    stream.apply_diff(self.texts.get(child, ''))
+                except MalformedDeltaException:
+                    # The collector has recorded an error for this
+                    # file already, or the conversion will report it:
+                    continue
+                stack.append((child, stream.get_text(), chain + 1))
+
+        return (fulltext_bytes, delta_applications, max_chain)
+
+
+def list_rcs_files(cvsrepo):
+    """Return (project, cvs_files, errors) for the repository at CVSREPO.
+
+    CVS_FILES is a list of the CVSFiles found by walk_repository(),
+    and ERRORS is a list of the errors that it reported."""
+
+    project = Project(0, cvsrepo)
+    errors = []
+    cvs_files = [
+        cvs_path
+        for cvs_path in walk_repository(project, KeyGenerator(), errors.append)
+        if isinstance(cvs_path, CVSFile)
+        ]
+    return (project, cvs_files, errors)
+
+
+def measure_file(pdc, cvs_file):
+    """Parse CVS_FILE and return a map {quantity : value} describing it.
+
+    PDC is the _ProjectDataCollector of the project.  Return None if
+    the file could not be parsed."""
+
+    size = os.path.getsize(cvs_file.filename)
+    fdc = MeasuringFileDataCollector(pdc, cvs_file)
+    start_time = time.time()
+    try:
+        parse(open(cvs_file.filename, 'rb'), fdc)
+        cvs_file_items = fdc.get_cvs_file_items()
+    except Exception, e:
+        pdc.collect_data.record_fatal_error(
+            '%s: %s' % (cvs_file.filename, e,)
+            )
+        return None
+    parse_time = time.time() - start_time
+
+    counts = {CVSRevision : 0, CVSBranch : 0, CVSTag : 0}
+    symbol_names = set()
+    for cvs_item in cvs_file_items.values():
+        for (cls, count) in counts.items():
+            if isinstance(cvs_item, cls):
+                counts[cls] = count + 1
+        if isinstance(cvs_item, (CVSBranch, CVSTag)):
+            symbol_names.add(cvs_item.symbol.name)
+
+    (fulltext_bytes, delta_applications, max_chain) = fdc.measure_delta_tree()
+
+    return {
+        'size' : size,
+        'revisions' : counts[CVSRevision],
+        'branches' : counts[CVSBranch],
+        'tags' : counts[CVSTag],
+        'items' : counts[CVSRevision] + counts[CVSBranch] + counts[CVSTag],
+        'delta_applications' : delta_applications,
+        'max_chain' : max_chain,
+        'fulltext_bytes' : fulltext_bytes,
+        'parse_time' : parse_time,
+        'symbol_names' : symbol_names,
+        }
+
+
+def estimate_total(values, sizes, total_size, population):
+    """Estimate the total of a quantity over all files from a sample.
+
+    VALUES[i] is the value of the quantity for the i'th sampled file
+    and SIZES[i] is the size of that file.  TOTAL_SIZE is the total
+    size of all POPULATION files.  The quantity is estimated as being
+    proportional to file size (a ratio estimator), which is much more
+    precise than scaling the mean when the files vary in size.
+
+    Return (estimate, low, high), where LOW and HIGH are the bounds of
+    the 95% confidence range.  The total is never less than the sum
+    over the sample."""
+
+    n = len(values)
+    sample_total = sum(values)
+    sample_size = sum(sizes)
+    if n >= population or not sample_size:
+        return (sample_total, sample_total, sample_total)
+
+    ratio = float(sample_total) / sample_size
+    estimate = ratio * total_size
+    if n < 2:
+        return (estimate, sample_total, None)
+
+    residual_variance = sum([
+        (value - ratio * size) ** 2
+        for (value, size) in zip(values, sizes)
+        ]) / (n - 1)
+    standard_error = population * math.sqrt(
+        (1.0 - float(n) / population) * residual_variance / n
+        )
+    return (
+        estimate,
+        max(sample_total, estimate - Z_95 * standard_error),
+        estimate + Z_95 * standard_error,
+        )
+
+
+def get_tree_size(path):
+    """Return the total size of the files under PATH."""
+
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def convert_sample(tool, project, cvs_files, workdir, name, tool_args):
+    """Convert CVS_FILES as a repository of their own, pass by pass.
+
+    The files are copied into a new repository under WORKDIR, which is
+    converted using TOOL, running each pass in a separate process so
+    that its peak memory can be measured on its own.  Return (passes,
+    output_size), where PASSES is a list of the per-pass statistics
+    written by --write-stats, and OUTPUT_SIZE is the size of the
+    output.  Return None if the conversion failed."""
+
+    root = os.path.join(workdir, name)
+    os.makedirs(os.path.join(root, 'CVSROOT'))
+    module = os.path.join(root, 'module')
+    prefix_length = len(project.project_cvs_repos_path) + len(os.sep)
+    for cvs_file in cvs_files:
+        dest = os.path.join(module, cvs_file.filename[prefix_length:])
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        shutil.copy2(cvs_file.filename, dest)
+
+    outdir = os.path.join(workdir, '%s-output' % (name,))
+    os.makedirs(outdir)
+    tmpdir = os.path.join(workdir, '%s-tmp' % (name,))
+    log_file = os.path.join(workdir, '%s.log' % (name,))
+    log = open(log_file, 'w')
+    results = []
+    try:
+        for i in range(1, len(passes) + 1):
+            stats_file = os.path.join(workdir, '%s-pass%d.json' % (name, i,))
+            cmd = [sys.executable, os.path.join(TOP_DIR, tool)]
+            cmd += get_tool_args(tool, outdir)
+            cmd += [
+                '--tmpdir=%s' % (tmpdir,),
+                '--passes=%d:%d' % (i, i,),
+                '--write-stats=%s' % (stats_file,),
+                ]
+            cmd += tool_args
+            cmd.append(module)
+            log.flush()
+            if subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT):
+                sys.stderr.write(
+                    'Conversion of the sample failed in pass %d; see %s.\n'
+                    % (i, log_file,)
+                    )
+                return None
+            f = open(stats_file)
+            stats = json.load(f)
+            f.close()
+            for data in stats['passes']:
+                if data['number'] == i:
+                    # The temporary files in use during the pass:
+                    data['temporary_bytes'] = (
+                        data.get('artifacts_created', 0)
+                        + data.get('artifacts_needed', 0)
+                        )
+                    results.append(data)
+    finally:
+        log.close()
+
+    return (results, get_tree_size(outdir))
+
+
+def fit(x1, y1, x2, y2, x):
+    """Extrapolate the line through (X1, Y1) and (X2, Y2) to X.
+
+    If the two points are not distinct, assume that Y is proportional
+    to X.  A negative slope (which can only be caused by measurement
+    noise) is treated as zero."""
+
+    if x1 is None or x2 <= x1:
+        if not x2:
+            return y2
+        return y2 * float(x) / x2
+    slope = max(0.0, float(y2 - y1) / (x2 - x1))
+    return y2 + slope * (x - x2)
+
+
+def format_quantity(value, unit):
+    if value is None:
+        return '?'
+    elif unit == 'KiB':
+        return format_quantity(value * 1024.0, 'bytes')
+    elif unit == 'bytes':
+        for (divisor, suffix) in [
+              (1024.0 ** 3, 'GiB'), (1024.0 ** 2, 'MiB'), (1024.0, 'KiB'),
+              ]:
+            if value >= divisor:
+                return '%.1f %s' % (value / divisor, suffix,)
+        return '%d B' % (value,)
+    elif unit == 'seconds':
+        if value >= 3600:
+            return '%.1f h' % (value / 3600.0,)
+        elif value >= 60:
+            return '%.1f min' % (value / 60.0,)
+        else:
+            return '%.1f s' % (value,)
+    else:
+        return '%d' % (value,)
+
+
+def format_estimate(estimate, unit=None):
+    (value, low, high) = estimate
+    if low == high:
+        return format_quantity(value, unit)
+    return '%s (%s - %s)' % (
+        format_quantity(value, unit),
+        format_quantity(low, unit), format_quantity(high, unit),
+        )
+
+
+class Estimator:
+    """Estimate the costs of the conversion from the measured sample."""
+
+    def __init__(self, cvs_files, measurements):
+        self.population = len(cvs_files)
+        self.total_size = sum([
+            os.path.getsize(cvs_file.filename) for cvs_file in cvs_files
+            ])
+        self.measurements = measurements
+        self.sizes = [m['size'] for m in measurements]
+
+    def get_total(self, quantity):
+        """Return (estimate, low, high) for the total of QUANTITY."""
+
+        if quantity == 'size':
+            return (self.total_size, self.total_size, self.total_size)
+        return estimate_total(
+            [m[quantity] for m in self.measurements],
+            self.sizes, self.total_size, self.population,
+            )
+
+    def get_sample_total(self, quantity, n):
+        """Return the total of QUANTITY over the first N sampled files."""
+
+        return sum([m[quantity] for m in self.measurements[:n]])
+
+    def extrapolate(self, quantity, n1, y1, n2, y2):
+        """Return (estimate, low, high) for a cost driven by QUANTITY.
+
+        Y1 and Y2 are the costs measured for conversions of the first
+        N1 and N2 sampled files (N1 may be None)."""
+
+        if n1 is None:
+            x1 = None
+        else:
+            x1 = self.get_sample_total(quantity, n1)
+        x2 = self.get_sample_total(quantity, n2)
+        retval = []
+        for x in self.get_total(quantity):
+            if x is None:
+                retval.append(None)
+            else:
+                retval.append(fit(x1, y1, x2, y2, x))
+        return tuple(retval)
+
+
+def write_report(f, cvsrepo, seed, estimator, errors, conversions, tool):
+    """Write the estimates to F.
+
+    CONVERSIONS is a list [(n, results)] of the numbers of sampled
+    files that were converted and the results of convert_sample()."""
+
+    measurements = estimator.measurements
+    f.write(
+        '%s: %d ,v files, %s; sampled %d files (seed %d).\n'
+        % (cvsrepo, estimator.population,
+           format_quantity(estimator.total_size, 'bytes'),
+           len(measurements), seed,)
+        )
+    for error in errors:
+        f.write('WARNING: %s\n' % (error,))
+
+    f.write('\nEstimated totals (95% confidence range):\n')
+    for (quantity, description) in QUANTITIES:
+        if quantity == 'fulltext_bytes':
+            unit = 'bytes'
+        elif quantity == 'parse_time':
+            unit = 'seconds'
+        else:
+            unit = None
+        f.write(
+            '    %-48s %s\n'
+            % (description, format_estimate(estimator.get_total(quantity), unit),)
+            )
+    symbol_names = set()
+    for m in measurements:
+        symbol_names.update(m['symbol_names'])
+    f.write(
+        '    %-48s %d\n' % ('distinct symbols (in the sample)', len(symbol_names),)
+        )
+    f.write(
+        '    %-48s %d\n'
+        % ('longest delta chain (in the sample)',
+           max([0] + [m['max_chain'] for m in measurements]),)
+        )
+
+    if not conversions:
+        return
+
+    if len(conversions) == 2:
+        (n1, (passes1, output_size1)) = conversions[0]
+    else:
+        n1 = passes1 = output_size1 = None
+    (n2, (passes2, output_size2)) = conversions[-1]
+
+    def extrapolate_pass(i, name, key):
+        if passes1 is None:
+            y1 = None
+        else:
+            y1 = passes1[i].get(key, 0)
+        return estimator.extrapolate(
+            PASS_DRIVERS.get(name, 'items'), n1, y1, n2, passes2[i].get(key, 0)
+            )
+
+    f.write('\nEstimated costs per pass for %s (95%% confidence range):\n' % (tool,))
+    totals = [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]]
+    for i in range(len(passes2)):
+        name = passes2[i].get('name')
+        f.write('  %d (%s):\n' % (passes2[i]['number'], name,))
+        for (j, key, unit, description) in [
+              (0, 'duration', 'seconds', 'time'),
+              (1, 'max_rss', 'KiB', 'peak memory'),
+              (2, 'temporary_bytes', 'bytes', 'temporary files'),
+              ]:
+            estimate = extrapolate_pass(i, name, key)
+            f.write('    %-20s %s\n' % (description, format_estimate(estimate, unit),))
+            for k in range(3):
+                if estimate[k] is None:
+                    totals[j][k] = None
+                elif totals[j][k] is not None:
+                    if j == 0:
+                        totals[j][k] += estimate[k]
+                    else:
+                        totals[j][k] = max(totals[j][k], estimate[k])
+
+    output_size = estimator.extrapolate(
+        'fulltext_bytes', n1, output_size1, n2, output_size2
+        )
+    f.write('\nEstimated totals for %s (95%% confidence range):\n' % (tool,))
+    f.write('    %-20s %s\n' % ('time', format_estimate(totals[0], 'seconds'),))
+    f.write('    %-20s %s\n' % ('peak memory', format_estimate(totals[1], 'KiB'),))
+    f.write('    %-20s %s\n' % ('temporary files', format_estimate(totals[2], 'bytes'),))
+    f.write('    %-20s %s\n' % ('output', format_estimate(output_size, 'bytes'),))
+    f.write(
+        '\nThe temporary file sizes are those of the files in use during each\n'
+        'pass; allow some headroom for the files kept for later passes.\n'
+        )
+
+
+class MyHelpFormatter(optparse.IndentedHelpFormatter):
+    """A HelpFormatter for optparse that doesn't reformat the description."""
+
+    def format_description(self, description):
+        return description
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage=usage, description=description,
+        formatter=MyHelpFormatter(),
+        )
+    parser.add_option(
+        '--sample-size', type='int', default=200, metavar='N',
+        help='the number of ,v files to sample (default %default)',
+        )
+    parser.add_option(
+        '--seed', type='int',
+        help='the seed for choosing the sample (default: random)',
+        )
+    parser.add_option(
+        '--tool', type='choice', choices=['cvs2svn', 'cvs2git', 'cvs2hg'],
+        default='cvs2svn',
+        help='the tool whose costs are estimated (default %default)',
+        )
+    parser.add_option(
+        '--tool-option', action='append', default=[], metavar='OPTION',
+        help=(
+            'pass OPTION to the tool when converting the sample; may be '
+            'specified multiple times'
+            ),
+        )
+    parser.add_option(
+        '--no-convert', action='store_true', default=False,
+        help=(
+            'only parse the sample; do not convert it to estimate the '
+            'costs of the passes'
+            ),
+        )
+    parser.add_option(
+        '--workdir', default='estimate-tmp',
+        help='directory for temporary files (default %default)',
+        )
+
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('exactly one CVSREPO argument is required')
+    cvsrepo = args[0]
+    if options.sample_size < 2:
+        parser.error('--sample-size must be at least 2')
+    seed = options.seed
+    if seed is None:
+        seed = random.randrange(1000000)
+
+    try:
+        (project, cvs_files, errors) = list_rcs_files(cvsrepo)
+    except FatalError, e:
+        sys.stderr.write('%s\n' % (e,))
+        sys.exit(1)
+    if not cvs_files:
+        sys.stderr.write('No ,v files found under %r.\n' % (cvsrepo,))
+        sys.exit(1)
+
+    sample = random.Random(seed).sample(
+        cvs_files, min(options.sample_size, len(cvs_files))
+        )
+
+    sys.stderr.write('Parsing %d of %d ,v files...\n' % (len(sample), len(cvs_files),))
+    collect_data = SampleCollectData()
+    pdc = _ProjectDataCollector(collect_data, project)
+    measured_files = []
+    measurements = []
+    for cvs_file in sample:
+        m = measure_file(pdc, cvs_file)
+        if m is not None:
+            measured_files.append(cvs_file)
+            measurements.append(m)
+    errors += collect_data.fatal_errors
+    if not measurements:
+        sys.stderr.write('None of the sampled files could be parsed.\n')
+        sys.exit(1)
+    estimator = Estimator(cvs_files, measurements)
+
+    conversions = []
+    if not options.no_convert:
+        if os.path.exists(options.workdir):
+            parser.error('%r already exists' % (options.workdir,))
+        os.makedirs(options.workdir)
+        try:
+            sizes = [len(measured_files)]
+            if len(measured_files) >= 4:
+                sizes.insert(0, len(measured_files) // 2)
+            for n in sizes:
+                sys.stderr.write('Converting %d sampled files...\n' % (n,))
+                results = convert_sample(
+                    options.tool, project, measured_files[:n],
+                    options.workdir, 'sample-%d' % (n,), options.tool_option,
+                    )
+                if results is None:
+                    conversions = []
+                    break
+                conversions.append((n, results))
+        finally:
+            shutil.rmtree(options.workdir, True)
+
+    write_report(
+        sys.stdout, cvsrepo, seed, estimator, errors, conversions, options.tool
+        )
+
+
+if __name__ == '__main__':
+    main()
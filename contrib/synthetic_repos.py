@@ -0,0 +1,514 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Generate synthetic CVS repositories for benchmarking cvs2svn.
+
+The repositories are generated deterministically from the parameters
+(including a random seed), so the same parameters always produce
+byte-for-byte identical repositories.  The RCS files are written
+directly, so neither CVS nor RCS needs to be installed.
+
+The history of the repository consists of a sequence of commits, one
+per hour.  Each file is modified in a random subset of the commits, so
+that changes to several files share a commit time, author and log
+message as they would in a real repository.  Branches and tags are
+created at random points in the history, and each of them includes a
+random subset of the files that exist at that point.  Optionally, some
+of the files are created by vendor imports, in which case they live on
+the vendor branch 1.1.1 (which is the default branch) and every import
+is tagged."""
+
+
+import sys
+import os
+import random
+import difflib
+import optparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contrib.rcs_file_filter import WriteRCSFileSink
+
+
+usage = 'USAGE: %prog [options] CVSREPO'
+description = """\
+Write a synthetic CVS repository to the directory CVSREPO, which must
+not exist yet.  The repository contains a single module, 'proj'.
+"""
+
+
+# The time of the first commit in the synthetic history:
+START_TIME = 946684800 # 2000-01-01 00:00:00 UTC
+
+# The time between consecutive commits:
+COMMIT_INTERVAL = 3600
+
+AUTHORS = ['alice', 'bob', 'carol', 'dave', 'eve']
+
+# The default parameters of a synthetic repository:
+DEFAULTS = {
+    'files' : 100,
+    'dirs' : 10,
+    'commits' : 200,
+    'revisions' : 10,
+    'branches' : 5,
+    'branch_revisions' : 3,
+    'tags' : 10,
+    'vendor_imports' : 0,
+    'vendor_fraction' : 0.2,
+    'binary_fraction' : 0.05,
+    'file_size' : 100,
+    'symbol_fraction' : 0.7,
+    'seed' : 1,
+    }
+
+
+class SyntheticFile:
+    """The history of one synthetic RCS file."""
+
+    def __init__(self, rng, path, binary, params):
+        self.rng = rng
+        self.path = path
+        self.binary = binary
+        self.params = params
+
+        # A map { revision : (commit_index, author, log, state, text) },
+        # where TEXT is a list of lines:
+        self.revisions = {}
+
+        # The numbers of the trunk revisions, in order:
+        self.trunk = []
+
+        # A map { trunk_revision : [branch_number, ...] }:
+        self.branch_points = {}
+
+        # A map { branch_number : [revision, ...] } listing the revisions
+        # on each branch, in order:
+        self.branch_revisions = {}
+
+        # A list of (name, revision) of the symbols defined in this file:
+        self.symbols = []
+
+        # The default branch, or None:
+        self.principal_branch = None
+
+    def _gen_line(self):
+        if self.binary:
+            return ''.join([
+                chr(self.rng.randrange(256))
+                for i in range(self.rng.randrange(20, 80))
+                ]).replace('\n', '\0') + '\n'
+        else:
+            return 'line %08x: %s\n' % (
+                self.rng.randrange(1 << 32),
+                ' '.join([
+                    self.rng.choice(AUTHORS)
+                    for i in range(self.rng.randrange(1, 12))
+                    ]),
+                )
+
+    def _gen_text(self):
+        size = max(1, int(self.rng.expovariate(1.0 / self.params['file_size'])))
+        return [self._gen_line() for i in range(size)]
+
+    def _modify(self, text):
+        """Return a modified copy of TEXT."""
+
+        text = text[:]
+        for i in range(self.rng.randrange(1, 6)):
+            action = self.rng.randrange(3)
+            pos = self.rng.randrange(len(text) + 1)
+            if action == 0 or not text:
+                text[pos:pos] = [
+                    self._gen_line() for j in range(self.rng.randrange(1, 5))
+                    ]
+            elif action == 1 and len(text) > 1:
+                del text[pos:pos + self.rng.randrange(1, 3)]
+            else:
+                text[pos:pos + 1] = [self._gen_line()]
+        return text
+
+    def _add_revision(self, revision, commit_index, log, text):
+        self.revisions[revision] = (
+            commit_index,
+            AUTHORS[commit_index % len(AUTHORS)],
+            log,
+            'Exp',
+            text,
+            )
+
+    def _latest_trunk_revision(self, commit_index):
+        """Return the last trunk revision committed before COMMIT_INDEX."""
+
+        retval = None
+        for revision in self.trunk:
+            if self.revisions[revision][0] < commit_index:
+                retval = revision
+        return retval
+
+    def generate_trunk(self, commit_indexes):
+        text = self._gen_text()
+        for (i, commit_index) in enumerate(commit_indexes):
+            if i > 0:
+                text = self._modify(text)
+            revision = '1.%d' % (i + 1,)
+            self._add_revision(
+                revision, commit_index, 'Commit %d.' % (commit_index,), text
+                )
+            self.trunk.append(revision)
+
+    def generate_vendor_branch(self, import_indexes):
+        """Create the file via vendor imports at IMPORT_INDEXES."""
+
+        text = self._gen_text()
+        self._add_revision('1.1', import_indexes[0], 'Initial revision\n', text)
+        self.trunk.append('1.1')
+        self.branch_points['1.1'] = ['1.1.1']
+        self.branch_revisions['1.1.1'] = []
+        self.principal_branch = '1.1.1'
+        self.symbols.append(('VENDOR', '1.1.1'))
+        for (i, commit_index) in enumerate(import_indexes):
+            if i > 0:
+                text = self._modify(text)
+            revision = '1.1.1.%d' % (i + 1,)
+            self._add_revision(
+                revision, commit_index, 'Import %d.' % (i + 1,), text
+                )
+            self.branch_revisions['1.1.1'].append(revision)
+            self.symbols.append(('release_%d' % (i + 1,), revision))
+
+    def add_branch(self, name, commit_index, branch_commit_indexes):
+        """Add a branch called NAME, created at COMMIT_INDEX.
+
+        Commit to the branch at each of BRANCH_COMMIT_INDEXES.  Do
+        nothing if the file did not exist at COMMIT_INDEX."""
+
+        base = self._latest_trunk_revision(commit_index)
+        if base is None:
+            return
+
+        branches = self.branch_points.setdefault(base, [])
+        branch_number = '%s.%d' % (base, 2 * len(branches) + 2,)
+        branches.append(branch_number)
+        (base_index, author, log, state, text) = self.revisions[base]
+        revisions = self.branch_revisions[branch_number] = []
+        for (i, branch_commit_index) in enumerate(branch_commit_indexes):
+            text = self._modify(text)
+            revision = '%s.%d' % (branch_number, i + 1,)
+            self._add_revision(
+                revision, branch_commit_index,
+                'Commit %d on branch %s.' % (branch_commit_index, name,),
+                text,
+                )
+            revisions.append(revision)
+
+        (prefix, last) = branch_number.rsplit('.', 1)
+        self.symbols.append((name, '%s.0.%s' % (prefix, last,)))
+
+    def add_tag(self, name, commit_index):
+        revision = self._latest_trunk_revision(commit_index)
+        if revision is not None:
+            self.symbols.append((name, revision))
+
+    def _delta(self, old, new):
+        """Return the RCS delta that converts OLD into NEW."""
+
+        delta = []
+        matcher = difflib.SequenceMatcher(None, old, new)
+        for (tag, i1, i2, j1, j2) in matcher.get_opcodes():
+            if tag in ('delete', 'replace'):
+                delta.append('d%d %d\n' % (i1 + 1, i2 - i1,))
+            if tag in ('insert', 'replace'):
+                delta.append('a%d %d\n' % (i2, j2 - j1,))
+                delta.extend(new[j1:j2])
+        return ''.join(delta)
+
+    def write(self, f):
+        """Write this file in RCS format to file object F."""
+
+        sink = WriteRCSFileSink(f)
+        sink.set_head_revision(self.trunk[-1])
+        if self.principal_branch is not None:
+            sink.set_principal_branch(self.principal_branch)
+        sink.set_access([])
+        symbols = self.symbols[:]
+        symbols.reverse()
+        for (name, revision) in symbols:
+            sink.define_tag(name, revision)
+        sink.set_locking('strict')
+        sink.set_comment('# ')
+        if self.binary:
+            sink.set_expansion('b')
+        sink.admin_completed()
+
+        # The order in which the revisions are written, and their
+        # predecessors in the delta chain:
+        order = []
+        trunk = self.trunk[:]
+        trunk.reverse()
+        for (i, revision) in enumerate(trunk):
+            if i + 1 < len(trunk):
+                next = trunk[i + 1]
+            else:
+                next = None
+            order.append((revision, next, self.branch_points.get(revision, [])))
+        branches = self.branch_revisions.keys()
+        branches.sort()
+        for branch_number in branches:
+            revisions = self.branch_revisions[branch_number]
+            for (i, revision) in enumerate(revisions):
+                if i + 1 < len(revisions):
+                    next = revisions[i + 1]
+                else:
+                    next = None
+                order.append((revision, next, self.branch_points.get(revision, [])))
+
+        for (revision, next, branches) in order:
+            (commit_index, author, log, state, text) = self.revisions[revision]
+            sink.define_revision(
+                revision, START_TIME + commit_index * COMMIT_INTERVAL,
+                author, state,
+                [
+                    branch_number + '.1'
+                    for branch_number in branches
+                    if self.branch_revisions[branch_number]
+                    ],
+                next,
+                )
+        sink.tree_completed()
+        sink.set_description('')
+
+        for (revision, next, branches) in order:
+            (commit_index, author, log, state, text) = self.revisions[revision]
+            if revision == self.trunk[-1]:
+                # The head revision is stored in full:
+                delta = ''.join(text)
+            elif revision.count('.') == 1:
+                # Trunk revisions are stored as deltas from their
+                # successor:
+                successor = self.revisions[self.trunk[self.trunk.index(revision) + 1]]
+                delta = self._delta(successor[4], text)
+            else:
+                # Branch revisions are stored as deltas from their
+                # predecessor:
+                (prefix, last) = revision.rsplit('.', 1)
+                if last == '1':
+                    predecessor = prefix.rsplit('.', 1)[0]
+                else:
+                    predecessor = '%s.%d' % (prefix, int(last) - 1,)
+                delta = self._delta(self.revisions[predecessor][4], text)
+            sink.set_revision_info(revision, log, delta)
+        sink.parse_completed()
+
+
+def generate_repository(cvsrepo, **kw):
+    """Write a synthetic CVS repository to the directory CVSREPO.
+
+    The keyword arguments override the parameters in DEFAULTS:
+
+        files -- the number of files.
+
+        dirs -- the number of directories that the files are
+            distributed across.
+
+        commits -- the number of commits in the history of trunk.
+
+        revisions -- the average number of trunk revisions per file.
+
+        branches -- the number of branches.
+
+        branch_revisions -- the average number of revisions per file
+            on each branch.
+
+        tags -- the number of tags.
+
+        vendor_imports -- the number of vendor imports.  If nonzero,
+            then about VENDOR_FRACTION of the files are created and
+            updated only by vendor imports.
+
+        binary_fraction -- the fraction of the files that are binary.
+
+        file_size -- the average number of lines per file.
+
+        symbol_fraction -- the fraction of the existing files that are
+            included in each branch and tag.
+
+        seed -- the seed for the random number generator."""
+
+    params = DEFAULTS.copy()
+    for (key, value) in kw.items():
+        if key not in params:
+            raise TypeError('Unknown parameter %r' % (key,))
+        params[key] = value
+
+    rng = random.Random(params['seed'])
+    commits = max(1, params['commits'])
+
+    # The commit indexes at which each branch and tag are created:
+    branches = [
+        ('BRANCH_%d' % (i + 1,), rng.randrange(1, commits + 1))
+        for i in range(params['branches'])
+        ]
+    tags = [
+        ('TAG_%d' % (i + 1,), rng.randrange(1, commits + 1))
+        for i in range(params['tags'])
+        ]
+
+    # Vendor imports are spread evenly through the history:
+    import_indexes = [
+        i * commits // max(1, params['vendor_imports'])
+        for i in range(params['vendor_imports'])
+        ]
+
+    os.makedirs(os.path.join(cvsrepo, 'CVSROOT'))
+    for i in range(params['files']):
+        dirname = os.path.join(
+            cvsrepo, 'proj', 'dir%03d' % (i % max(1, params['dirs']),)
+            )
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        binary = rng.random() < params['binary_fraction']
+        if binary:
+            basename = 'file%05d.bin' % (i,)
+        else:
+            basename = 'file%05d.txt' % (i,)
+        synthetic_file = SyntheticFile(
+            rng, os.path.join(dirname, basename), binary, params
+            )
+
+        if import_indexes and rng.random() < params['vendor_fraction']:
+            synthetic_file.generate_vendor_branch(import_indexes)
+        else:
+            num_revisions = min(
+                commits, max(1, int(rng.expovariate(1.0 / params['revisions'])))
+                )
+            commit_indexes = rng.sample(range(commits), num_revisions)
+            commit_indexes.sort()
+            synthetic_file.generate_trunk(commit_indexes)
+
+            for (name, commit_index) in branches:
+                if rng.random() < params['symbol_fraction']:
+                    num_revisions = min(
+                        commits - commit_index,
+                        int(rng.expovariate(1.0 / max(0.1, params['branch_revisions']))),
+                        )
+                    branch_commit_indexes = rng.sample(
+                        range(commit_index, commits), max(0, num_revisions)
+                        )
+                    branch_commit_indexes.sort()
+                    synthetic_file.add_branch(
+                        name, commit_index, branch_commit_indexes
+                        )
+
+        for (name, commit_index) in tags:
+            if rng.random() < params['symbol_fraction']:
+                synthetic_file.add_tag(name, commit_index)
+
+        f = open(synthetic_file.path + ',v', 'wb')
+        synthetic_file.write(f)
+        f.close()
+
+
+class MyHelpFormatter(optparse.IndentedHelpFormatter):
+    """A HelpFormatter for optparse that doesn't reformat the description."""
+
+    def format_description(self, description):
+        return description
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage=usage, description=description,
+        formatter=MyHelpFormatter(),
+        )
+    parser.set_defaults(**DEFAULTS)
+    parser.add_option(
+        '--files', type='int', help='number of files (default %default)',
+        )
+    parser.add_option(
+        '--dirs', type='int',
+        help='number of directories (default %default)',
+        )
+    parser.add_option(
+        '--commits', type='int',
+        help='number of commits in the history (default %default)',
+        )
+    parser.add_option(
+        '--revisions', type='int',
+        help='average number of trunk revisions per file (default %default)',
+        )
+    parser.add_option(
+        '--branches', type='int', help='number of branches (default %default)',
+        )
+    parser.add_option(
+        '--branch-revisions', type='int',
+        help=(
+            'average number of revisions per file on each branch '
+            '(default %default)'
+            ),
+        )
+    parser.add_option(
+        '--tags', type='int', help='number of tags (default %default)',
+        )
+    parser.add_option(
+        '--vendor-imports', type='int',
+        help='number of vendor imports (default %default)',
+        )
+    parser.add_option(
+        '--vendor-fraction', type='float',
+        help=(
+            'fraction of files that come from vendor imports '
+            '(default %default)'
+            ),
+        )
+    parser.add_option(
+        '--binary-fraction', type='float',
+        help='fraction of files that are binary (default %default)',
+        )
+    parser.add_option(
+        '--file-size', type='int',
+        help='average number of lines per file (default %default)',
+        )
+    parser.add_option(
+        '--symbol-fraction', type='float',
+        help=(
+            'fraction of files included in each branch and tag '
+            '(default %default)'
+            ),
+        )
+    parser.add_option(
+        '--seed', type='int',
+        help='seed for the random number generator (default %default)',
+        )
+
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('exactly one CVSREPO argument is required')
+    if os.path.exists(args[0]):
+        parser.error('%r already exists' % (args[0],))
+
+    kw = {}
+    for key in DEFAULTS:
+        kw[key] = getattr(options, key)
+    generate_repository(args[0], **kw)
+
+
+if __name__ == '__main__':
+    main()
+
+
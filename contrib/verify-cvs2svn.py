@@ -23,6 +23,11 @@
 #    repository are checked, i.e. there are no checks to verify that
 #    all tags and branches in the CVS repository are present.
 #
+# By default, each tree is exported from both repositories and the
+# exports are compared using a recursive diff.  With --checksums, the
+# CVS side is instead computed by reading the RCS files directly, and
+# only per-file content hashes are compared (see verify_checksums()).
+#
 # This program only works if you converted a subdirectory of a CVS
 # repository, and not the whole repository.  If you really did convert
 # a whole repository and need to check it, you must create a CVSROOT
@@ -36,12 +41,34 @@ import optparse
 import subprocess
 import shutil
 import re
+import itertools
+import tarfile
+import tempfile
+
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+try:
+  import multiprocessing
+except ImportError:
+  # Not available before Python 2.6:
+  multiprocessing = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib.rcs_stream import RCSStream
+from cvs2svn_lib.rcs_stream import MalformedDeltaException
+
+import cvs2svn_rcsparse
 
 
 # CVS and Subversion command line client commands
 CVS_CMD = 'cvs'
 SVN_CMD = 'svn'
 HG_CMD = 'hg'
+GIT_CMD = 'git'
 
 
 def pipe(cmd):
@@ -98,6 +125,36 @@ class CvsRepos:
     if status or output:
       cmd_failed(cmd, output, status)
 
+  def rcs_files(self):
+    """Return a list of (RCS_PATH, REL_PATH) for the ,v files in the module.
+
+    REL_PATH is the path of the file in a checkout, relative to the
+    module and using '/' as separator.  Files in an Attic directory are
+    skipped if there is also a file with the same name outside of the
+    Attic."""
+
+    top = os.path.normpath(os.path.join(self.cvsroot, self.module))
+    files = []
+    for (dirpath, dirnames, filenames) in os.walk(top):
+      if dirpath == top and 'CVSROOT' in dirnames:
+        dirnames.remove('CVSROOT')
+      dirnames.sort()
+      if os.path.basename(dirpath) == 'Attic':
+        parent = os.path.dirname(dirpath)
+      else:
+        parent = dirpath
+      for filename in sorted(filenames):
+        if not filename.endswith(',v'):
+          continue
+        if parent != dirpath \
+               and os.path.exists(os.path.join(parent, filename)):
+          continue
+        rel_path = os.path.join(parent, filename[:-2])[len(top) + 1:]
+        files.append(
+            (os.path.join(dirpath, filename), rel_path.replace(os.sep, '/'))
+            )
+    return files
+
 
 class SvnRepos:
   name = 'svn'
@@ -246,8 +303,121 @@ class HgRepos:
 class GitRepos:
   name = 'git'
 
+  # The branch that cvs2git uses for trunk:
+  trunk_branch = 'master'
+
   def __init__(self, path):
-    raise NotImplementedError()
+    self.path = path
+    if os.path.isdir(os.path.join(path, '.git')):
+      git_dir = os.path.join(path, '.git')
+    else:
+      git_dir = path
+    self.base_cmd = [GIT_CMD, '--git-dir=' + git_dir]
+
+    self._heads = self._list_refs('refs/heads/')
+    self._tags = self._list_refs('refs/tags/')
+
+    # The "git cat-file --batch" process used by manifest(), and a
+    # cache { BLOB_SHA1 : DIGEST } of the blobs that it has read:
+    self._cat_file = None
+    self._digests = {}
+
+  def __str__(self):
+    return os.path.basename(os.path.abspath(self.path))
+
+  def _list_refs(self, prefix):
+    cmd = self.base_cmd + ['for-each-ref', '--format=%(refname)', prefix]
+    (output, status) = pipe(cmd)
+    if status:
+      cmd_failed(cmd, output, status)
+    return [line[len(prefix):] for line in output.split('\n') if line]
+
+  def _get_ref(self, kind, label):
+    """Return the ref for KIND and LABEL, or None if trunk is missing."""
+
+    if kind == 'trunk':
+      if self.trunk_branch not in self._heads:
+        return None
+      return 'refs/heads/' + self.trunk_branch
+    elif kind == 'tag':
+      return 'refs/tags/' + label
+    else:
+      return 'refs/heads/' + label
+
+  def _export(self, dest_path, ref):
+    os.mkdir(dest_path)
+    if ref is None:
+      # same as CVS does when exporting empty trunk
+      return
+    cmd = self.base_cmd + ['archive', '--format=tar', ref]
+    child = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    tar = tarfile.open(fileobj=child.stdout, mode='r|')
+    for member in tar:
+      tar.extract(member, dest_path)
+    tar.close()
+    if child.wait():
+      cmd_failed(cmd, '', child.returncode)
+
+  def export_trunk(self, dest_path):
+    self._export(dest_path, self._get_ref('trunk', None))
+
+  def export_tag(self, dest_path, tag):
+    self._export(dest_path, self._get_ref('tag', tag))
+
+  def export_branch(self, dest_path, branch):
+    self._export(dest_path, self._get_ref('branch', branch))
+
+  def tags(self):
+    return self._tags
+
+  def branches(self):
+    return [head for head in self._heads if head != self.trunk_branch]
+
+  def _get_digest(self, sha1):
+    """Return the content digest of the blob SHA1, reading it if needed."""
+
+    try:
+      return self._digests[sha1]
+    except KeyError:
+      pass
+
+    if self._cat_file is None:
+      self._cat_file = subprocess.Popen(
+          self.base_cmd + ['cat-file', '--batch'],
+          stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+          )
+    self._cat_file.stdin.write(sha1 + '\n')
+    self._cat_file.stdin.flush()
+    header = self._cat_file.stdout.readline().split()
+    if len(header) != 3 or header[1] != 'blob':
+      raise RuntimeError('Cannot read git blob %s' % (sha1,))
+    text = self._cat_file.stdout.read(int(header[2]))
+    self._cat_file.stdout.read(1)
+    digest = self._digests[sha1] = get_digest(text)
+    return digest
+
+  def manifest(self, kind, label):
+    """Return the manifest of KIND and LABEL without exporting the tree.
+
+    The blobs are read using "git cat-file", and each blob is only read
+    once, however many trees it occurs in."""
+
+    ref = self._get_ref(kind, label)
+    if ref is None:
+      return {}
+    cmd = self.base_cmd + ['ls-tree', '-r', '-z', ref]
+    (output, status) = pipe(cmd)
+    if status:
+      cmd_failed(cmd, output, status)
+    manifest = {}
+    for entry in output.split('\0'):
+      if not entry:
+        continue
+      (info, path) = entry.split('\t', 1)
+      (mode, type, sha1) = info.split()
+      if type == 'blob':
+        manifest[path] = (self._get_digest(sha1), mode == '100755')
+    return manifest
 
 def transform_symbol(ctx, name):
   """Transform the symbol NAME using the renaming rules specified
@@ -464,6 +634,362 @@ def verify_contents(failures, cvsrepos, verifyrepos, ctx):
   else:
     sys.stdout.write('PASS: %s == %s\n' % (cvsrepos, verifyrepos))
 
+
+# The keywords that are collapsed before file contents are hashed (the
+# same list that cvs2svn's InternalRevisionReader uses):
+_kws = 'Author|Date|Header|Id|Locker|Log|Name|RCSfile|Revision|Source|State'
+_kw_re = re.compile(r'\$(' + _kws + r'):[^$\n]*\$')
+
+
+def get_digest(text):
+  """Return the hex digest of TEXT with its RCS keywords collapsed.
+
+  Collapsing the keywords on both sides makes the comparison
+  independent of how the conversion handled keywords."""
+
+  return md5(_kw_re.sub(r'$\1$', text)).hexdigest()
+
+
+def hash_tree(path):
+  """Return the manifest of the exported tree at PATH.
+
+  The manifest is a map { REL_PATH : (DIGEST, EXECUTABLE) } of all of
+  the files in the tree.  Directories are not included."""
+
+  manifest = {}
+  for (dirpath, dirnames, filenames) in os.walk(path):
+    for filename in filenames:
+      file_path = os.path.join(dirpath, filename)
+      f = open(file_path, 'rb')
+      text = f.read()
+      f.close()
+      rel_path = file_path[len(path) + 1:].replace(os.sep, '/')
+      manifest[rel_path] = (
+          get_digest(text), bool(os.stat(file_path).st_mode & 0100),
+          )
+  return manifest
+
+
+class _RCSManifestSink(cvs2svn_rcsparse.Sink):
+  """Compute the digests of selected revisions of a single RCS file.
+
+  The revisions that are selected are the ones that 'cvs export' would
+  write for trunk and for each of a set of symbols.  Only the
+  deltatexts that are needed to reconstruct those revisions are kept
+  in memory."""
+
+  def __init__(self, symbols, want_trunk):
+    # The names of the symbols to compute digests for, or None for all:
+    self.symbols = symbols
+    self.want_trunk = want_trunk
+
+    self.head = None
+    self.principal_branch = None
+
+    # { SYMBOL_NAME : REVISION } for the symbols of interest:
+    self.tags = {}
+
+    # { REVISION : (STATE, BRANCHES, NEXT) }:
+    self.revs = {}
+
+    # { KEY : REVISION } for the live revisions of interest, where KEY
+    # is None for trunk or a symbol name:
+    self.selected = {}
+
+    # The set of revisions whose deltatexts are needed:
+    self.needed = set()
+
+    # { REVISION : DELTATEXT } for the revisions in self.needed:
+    self.texts = {}
+
+  def set_head_revision(self, revision):
+    self.head = revision
+
+  def set_principal_branch(self, branch_name):
+    self.principal_branch = branch_name
+
+  def define_tag(self, name, revision):
+    if self.symbols is None or name in self.symbols:
+      self.tags[name] = revision
+
+  def define_revision(self, revision, timestamp, author, state,
+                      branches, next):
+    self.revs[revision] = (state, branches, next)
+
+  def _resolve(self, revision):
+    """Return the revision that 'cvs export -r REVISION' would write.
+
+    REVISION can be a revision number or a (possibly magic) branch
+    number.  For a branch, return the last revision on the branch, or
+    the revision that it sprouts from if it has no revisions.  Return
+    None if there is no such revision."""
+
+    components = revision.split('.')
+    if len(components) % 2 == 0 and components[-2] == '0':
+      del components[-2]
+    if len(components) % 2 == 0:
+      if revision in self.revs:
+        return revision
+      return None
+
+    branch = '.'.join(components)
+    rev = '.'.join(components[:-1])
+    if rev not in self.revs:
+      return None
+    for first in self.revs[rev][1]:
+      if first[:first.rindex('.')] == branch:
+        rev = first
+        while self.revs.get(rev, (None, None, None))[2]:
+          rev = self.revs[rev][2]
+        break
+    return rev
+
+  def tree_completed(self):
+    revisions = {}
+    if self.want_trunk and self.head is not None:
+      if self.principal_branch:
+        revisions[None] = self._resolve(self.principal_branch)
+      else:
+        revisions[None] = self.head
+    for (name, revision) in self.tags.items():
+      revisions[name] = self._resolve(revision)
+
+    for (key, rev) in revisions.items():
+      if rev in self.revs and self.revs[rev][0] != 'dead':
+        self.selected[key] = rev
+
+    # Each revision's text is derived from the text of its parent by
+    # applying the revision's own deltatext:
+    parents = {}
+    for (rev, (state, branches, next)) in self.revs.items():
+      for child in branches + [next]:
+        if child:
+          parents[child] = rev
+
+    for rev in self.selected.values():
+      while rev is not None and rev not in self.needed:
+        self.needed.add(rev)
+        rev = parents.get(rev)
+
+  def set_revision_info(self, revision, log, text):
+    if revision in self.needed:
+      self.texts[revision] = text
+
+  def get_digests(self):
+    """Return a map { KEY : DIGEST } for the selected revisions."""
+
+    digests = {}
+    wanted = set(self.selected.values())
+    if not wanted:
+      return {}
+
+    stack = [(self.head, RCSStream(self.texts[self.head]))]
+    while stack:
+      (rev, stream) = stack.pop()
+      if rev in wanted:
+        digests[rev] = get_digest(stream.get_text())
+      (state, branches, next) = self.revs[rev]
+      children = [
+          child
+          for child in branches + [next]
+          if child in self.needed
+          ]
+      for i in range(len(children)):
+        if i < len(children) - 1:
+          child_stream = RCSStream(stream.get_text())
+        else:
+          child_stream = stream
+        child_stream.apply_diff(self.texts[children[i]])
+        stack.append((children[i], child_stream))
+
+    retval = {}
+    for (key, rev) in self.selected.items():
+      retval[key] = digests[rev]
+    return retval
+
+
+# The symbols that the worker processes compute digests for (set by
+# _init_worker()):
+_worker_symbols = None
+_worker_want_trunk = True
+
+
+def _init_worker(symbols, want_trunk):
+  global _worker_symbols, _worker_want_trunk
+  _worker_symbols = symbols
+  _worker_want_trunk = want_trunk
+
+
+def _get_rcs_digests(rcs_file):
+  """Return (REL_PATH, EXECUTABLE, DIGESTS) for RCS_FILE.
+
+  RCS_FILE is an (RCS_PATH, REL_PATH) pair as returned by
+  CvsRepos.rcs_files().  DIGESTS is the map returned by
+  _RCSManifestSink.get_digests()."""
+
+  (rcs_path, rel_path) = rcs_file
+  sink = _RCSManifestSink(_worker_symbols, _worker_want_trunk)
+  try:
+    f = open(rcs_path, 'rb')
+    try:
+      cvs2svn_rcsparse.parse(f, sink)
+    finally:
+      f.close()
+    digests = sink.get_digests()
+  except (cvs2svn_rcsparse.RCSParseError, MalformedDeltaException), e:
+    raise RuntimeError('Cannot read %s: %s' % (rcs_path, e,))
+  return (rel_path, bool(os.stat(rcs_path).st_mode & 0100), digests)
+
+
+def _get_export_manifest(args):
+  """Export KIND and LABEL from VERIFYREPOS and return its manifest.
+
+  ARGS is a tuple (VERIFYREPOS, KIND, LABEL, TMPDIR)."""
+
+  (verifyrepos, kind, label, tmpdir) = args
+  export_dir = tempfile.mkdtemp(
+      prefix='%s-export-' % (verifyrepos.name,), dir=tmpdir or None
+      )
+  try:
+    dest_path = os.path.join(export_dir, 'export')
+    if kind == 'trunk':
+      verifyrepos.export_trunk(dest_path)
+    elif kind == 'tag':
+      verifyrepos.export_tag(dest_path, label)
+    else:
+      verifyrepos.export_branch(dest_path, label)
+    if not os.path.exists(dest_path):
+      return {}
+    return hash_tree(dest_path)
+  finally:
+    shutil.rmtree(export_dir)
+
+
+def compare_manifests(failures, cvs_manifest, vrf_manifest):
+  """Compare two manifests, as returned by hash_tree().
+
+  Return True iff they are identical."""
+
+  ok = True
+
+  missing = [path for path in cvs_manifest if path not in vrf_manifest]
+  extra = [path for path in vrf_manifest if path not in cvs_manifest]
+  if missing:
+    missing.sort()
+    failures.report('%d file(s) missing' % (len(missing),), details=missing)
+    ok = False
+  if extra:
+    extra.sort()
+    failures.report('%d extra file(s)' % (len(extra),), details=extra)
+    ok = False
+
+  paths = [path for path in cvs_manifest if path in vrf_manifest]
+  paths.sort()
+  for path in paths:
+    (cvs_digest, cvs_executable) = cvs_manifest[path]
+    (vrf_digest, vrf_executable) = vrf_manifest[path]
+    if cvs_executable != vrf_executable:
+      failures.report('File modes differ for %s' % (path,))
+      ok = False
+    if cvs_digest != vrf_digest:
+      failures.report('File contents differ for %s' % (path,),
+                      details=['%s != %s' % (cvs_digest, vrf_digest)])
+      ok = False
+
+  return ok
+
+
+def verify_checksums(failures, cvsrepos, verifyrepos, items, ctx):
+  """Verify the contents of ITEMS by comparing per-file checksums.
+
+  ITEMS is a list of (KIND, LABEL) as for verify_contents_single().
+  Rather than exporting from CVS, the digests of the file contents for
+  trunk and every symbol are computed by reading each RCS file once,
+  using up to CTX.jobs worker processes.  The trees in VERIFYREPOS are
+  also hashed in worker processes, unless VERIFYREPOS has a manifest()
+  method that computes them cheaply.  RCS keywords are collapsed on
+  both sides before hashing, so the comparison is independent of
+  keyword handling (see get_digest())."""
+
+  # The CVS symbol name for each item (None for trunk):
+  keys = []
+  for (kind, label) in items:
+    if kind == 'trunk':
+      keys.append(None)
+    else:
+      keys.append(transform_symbol(ctx, label))
+  symbols = set([key for key in keys if key is not None])
+  want_trunk = None in keys
+
+  if ctx.jobs > 1 and multiprocessing is not None:
+    pool = multiprocessing.Pool(
+        ctx.jobs, _init_worker, (symbols, want_trunk,)
+        )
+    imap = pool.imap
+    imap_unordered = pool.imap_unordered
+  else:
+    pool = None
+    _init_worker(symbols, want_trunk)
+    imap = itertools.imap
+    imap_unordered = lambda function, iterable, chunksize: \
+        itertools.imap(function, iterable)
+
+  try:
+    rcs_files = cvsrepos.rcs_files()
+    print 'Computing checksums for %d CVS files' % (len(rcs_files),)
+
+    # { KEY : { REL_PATH : (DIGEST, EXECUTABLE) } }, where KEY is None
+    # for trunk or a CVS symbol name:
+    cvs_manifests = {}
+    for (rel_path, executable, digests) in imap_unordered(
+          _get_rcs_digests, rcs_files, 16
+          ):
+      for (key, digest) in digests.items():
+        cvs_manifests.setdefault(key, {})[rel_path] = (digest, executable)
+
+    if hasattr(verifyrepos, 'manifest'):
+      vrf_manifests = (
+          verifyrepos.manifest(kind, label) for (kind, label) in items
+          )
+    else:
+      vrf_manifests = imap(
+          _get_export_manifest,
+          [
+              (verifyrepos, kind, label, ctx.tmpdir)
+              for (kind, label) in items
+              ],
+          )
+
+    # branches/tags that failed:
+    locations = []
+
+    for ((kind, label), key, vrf_manifest) in itertools.izip(
+          items, keys, vrf_manifests
+          ):
+      if kind == 'trunk':
+        print 'Verifying trunk'
+        location = 'trunk'
+      else:
+        print 'Verifying %s %s' % (kind, label,)
+        location = '%s:%s' % (kind, label,)
+      if not compare_manifests(
+            failures, cvs_manifests.get(key, {}), vrf_manifest
+            ):
+        locations.append(location)
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+  if failures:
+    sys.stdout.write('FAIL: %s != %s: %d failure(s) in:\n'
+                     % (cvsrepos, verifyrepos, failures.count))
+    for location in locations:
+      sys.stdout.write('  %s\n' % location)
+  else:
+    sys.stdout.write('PASS: %s == %s\n' % (cvsrepos, verifyrepos))
+
+
 class OptionContext:
   pass
 
@@ -483,7 +1009,7 @@ def main(argv):
   parser.add_option('--trunk', action='store_true',
                     help='verify contents of trunk only')
   parser.add_option('--symbol-transform', action='append',
-                    metavar='P:S',
+                    dest='symbol_transforms', metavar='P:S',
                     help='transform symbol names from P to S like cvs2svn, '
                          'except transforms SVN symbol to CVS symbol')
   parser.add_option('--svn',
@@ -494,7 +1020,17 @@ def main(argv):
                     help='assume verify-repos is hg')
   parser.add_option('--git',
                     action='store_const', dest='repos_type', const='git',
-                    help='assume verify-repos is git (not implemented!)')
+                    help='assume verify-repos is git (trunk is "master")')
+  parser.add_option('--checksums', action='store_true',
+                    help='compare per-file checksums computed by reading '
+                         'the RCS files directly, rather than exporting and '
+                         'diffing trees; RCS keywords are collapsed on both '
+                         'sides, and --diff and the keyword options are '
+                         'ignored')
+  parser.add_option('--jobs', type='int',
+                    metavar='N',
+                    help='with --checksums, use up to N worker processes '
+                         '(default 1)')
   parser.add_option('--suppress-keywords',
                     action='store_const', dest='keyword_opt', const='-kk',
                     help='suppress CVS keyword expansion '
@@ -508,18 +1044,23 @@ def main(argv):
                       tmpdir='',
                       skip_cleanup=False,
                       symbol_transforms=[],
-                      repos_type='svn')
+                      repos_type='svn',
+                      checksums=False,
+                      jobs=1)
   (options, args) = parser.parse_args()
 
   symbol_transforms = []
   for value in options.symbol_transforms:
-    # This is broken!
     [pattern, replacement] = value.split(":")
     try:
       symbol_transforms.append(
-          RegexpSymbolTransform(pattern, replacement))
+          (re.compile('^' + pattern + '$'), replacement))
     except re.error:
       parser.error("'%s' is not a valid regexp." % (pattern,))
+  options.symbol_transforms = symbol_transforms
+
+  if options.jobs < 1:
+    parser.error('--jobs must be at least 1')
 
   def error(msg):
     """Print an error to sys.stderr."""
@@ -546,7 +1087,23 @@ def main(argv):
     verifyrepos = verify_klass(verify_path)
 
     # Do our thing...
-    if verify_branch:
+    if options.checksums:
+      if verify_branch:
+        items = [('branch', verify_branch)]
+      elif verify_tag:
+        items = [('tag', verify_tag)]
+      elif verify_trunk:
+        items = [('trunk', None)]
+      else:
+        items = [('trunk', None)]
+        items.extend([('tag', tag) for tag in verifyrepos.tags()])
+        for branch in verifyrepos.branches():
+          if branch[:10] == 'unlabeled-':
+            print 'Skipped branch', branch
+          else:
+            items.append(('branch', branch))
+      verify_checksums(failures, cvsrepos, verifyrepos, items, options)
+    elif verify_branch:
       print 'Verifying branch', verify_branch
       verify_contents_single(
           failures, cvsrepos, verifyrepos, 'branch', verify_branch, options
@@ -31,11 +31,21 @@ class Artifact(object):
     # maintained by ArtifactManager.
     self._passes_needed = set()
 
+    # The set of passes that read this artifact only once,
+    # sequentially, and can therefore consume it while it is still
+    # being written.  This field is maintained by ArtifactManager.
+    self._streaming_passes = set()
+
   def cleanup(self):
     """This artifact is no longer needed; clean it up."""
 
     pass
 
+  def get_size(self):
+    """Return the size of this artifact in bytes, or None if unknown."""
+
+    return None
+
 
 class TempFile(Artifact):
   """A temporary file that can be used across cvs2svn passes."""
@@ -53,6 +63,13 @@ class TempFile(Artifact):
     logger.verbose("Deleting", self.filename)
     os.unlink(self.filename)
 
+  def get_size(self):
+    # Named pipes (see PassManager._run_pipelined()) have no size:
+    if os.path.isfile(self.filename):
+      return os.path.getsize(self.filename)
+    else:
+      return None
+
   def __str__(self):
     return 'Temporary file %r' % (self.filename,)
 
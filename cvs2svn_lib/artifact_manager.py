@@ -18,6 +18,7 @@
 
 
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 from cvs2svn_lib.artifact import TempFile
 
 
@@ -49,8 +50,8 @@ class ArtifactManager:
     WHICH_PASS needs to use ARTIFACT.
 
   There are also helper methods register_temp_file(),
-  register_artifact_needed(), and register_temp_file_needed() which
-  combine some useful operations.
+  register_artifact_needed(), register_temp_file_needed(), and
+  register_temp_file_streamed() which combine some useful operations.
 
   Then, in pass order:
 
@@ -72,7 +73,15 @@ class ArtifactManager:
   Finally:
 
   - Call check_clean() to verify that all artifacts have been
-    accounted for."""
+    accounted for.
+
+  This class also keeps a registry of resident objects; i.e., objects
+  loaded from read-only artifacts that can be kept in memory from one
+  pass to the next instead of being loaded again by each pass (see
+  open_resident()).  It records when each artifact was last written
+  (i.e., when a pass that creates it was last started) and discards a
+  resident object as soon as its artifact is written again or is no
+  longer needed."""
 
   def __init__(self):
     # A map { artifact_name : artifact } of known artifacts.
@@ -82,9 +91,31 @@ class ArtifactManager:
     # set of artifacts needed by the pass.
     self._pass_needs = { }
 
+    # A map { pass : set_of_artifacts }, where set_of_artifacts is a
+    # set of artifacts created by the pass.
+    self._pass_creates = { }
+
     # A set of passes that are currently being executed.
     self._active_passes = set()
 
+    # True iff objects loaded via open_resident() should be kept:
+    self._keep_resident = False
+
+    # A counter that is incremented each time a pass is started, and a
+    # map { artifact : generation } recording the value of the counter
+    # when each artifact was last written.  Artifacts that were written
+    # by an earlier cvs2svn run have generation 0.
+    self._generation = 0
+    self._last_written = { }
+
+    # A map { artifact : (obj, generation) } of the resident
+    # objects and the generation of the artifact they were loaded from.
+    self._resident = { }
+
+    # A map { artifact : size } of the sizes of the artifacts needed by
+    # the active passes when those passes were started:
+    self._start_sizes = { }
+
   def set_artifact(self, name, artifact):
     """Add ARTIFACT to the list of artifacts that we manage.
 
@@ -116,6 +147,10 @@ class ArtifactManager:
     # An artifact is automatically "needed" in the pass in which it is
     # created:
     self.uses(which_pass, artifact)
+    if which_pass in self._pass_creates:
+      self._pass_creates[which_pass].add(artifact)
+    else:
+      self._pass_creates[which_pass] = set([artifact])
 
   def uses(self, which_pass, artifact):
     """Register that WHICH_PASS uses ARTIFACT.
@@ -165,6 +200,168 @@ class ArtifactManager:
 
     self.register_artifact_needed(basename, which_pass)
 
+  def register_temp_file_streamed(self, basename, which_pass):
+    """Register that a temporary file is read as a stream by WHICH_PASS.
+
+    This is like register_temp_file_needed(), but additionally records
+    that WHICH_PASS reads the temporary file with base name BASENAME
+    exactly once, sequentially, from beginning to end.  This allows
+    WHICH_PASS to run concurrently with the pass that creates the
+    file, reading the data from a pipe as it is written."""
+
+    self.register_artifact_needed(basename, which_pass)
+    self._artifacts[basename]._streaming_passes.add(which_pass)
+
+  def get_streamed_artifacts(self, producer, consumer, ignore=[]):
+    """Return the artifacts that CONSUMER can stream from PRODUCER.
+
+    Return a list of the artifacts created by PRODUCER that are needed
+    by CONSUMER.  If any of those artifacts is not registered as being
+    streamed by CONSUMER, or is needed by any pass other than PRODUCER
+    and CONSUMER, or if there are no such artifacts at all, return
+    None, because the two passes cannot be run concurrently.
+    Artifacts whose names are listed in IGNORE are left out of
+    consideration."""
+
+    ignored = set([self._artifacts[name] for name in ignore])
+    artifacts = [
+        artifact
+        for artifact in self._pass_creates.get(producer, [])
+        if artifact in self._pass_needs.get(consumer, [])
+        and artifact not in ignored
+        ]
+    if not artifacts:
+      return None
+
+    for artifact in artifacts:
+      if consumer not in artifact._streaming_passes \
+             or artifact._passes_needed != set([producer, consumer]):
+        return None
+
+    return artifacts
+
+  def get_artifact_sizes(self, which_pass):
+    """Return the total sizes of the artifacts used by WHICH_PASS.
+
+    Return a tuple (created, needed), where CREATED is the total size
+    in bytes of the artifacts that WHICH_PASS creates and NEEDED is the
+    total size of the other artifacts that it needs.  Artifacts whose
+    size cannot be determined are not counted.  This method must be
+    called before pass_done() is called for WHICH_PASS."""
+
+    created_artifacts = self._pass_creates.get(which_pass, set())
+    created = needed = 0
+    for artifact in self._pass_needs.get(which_pass, []):
+      size = artifact.get_size()
+      if size is None:
+        pass
+      elif artifact in created_artifacts:
+        created += size
+      else:
+        needed += size
+
+    return (created, needed,)
+
+  def get_artifact_io(self, which_pass, file_io):
+    """Return the I/O done by WHICH_PASS on each of its artifacts.
+
+    FILE_IO is a map { filename : (bytes_read, bytes_written) } of the
+    I/O counted by the databases during the pass (see
+    instrumentation.counters).  Return a map { artifact_name : stats }
+    for the artifacts needed by WHICH_PASS, where stats is a map with
+    the keys 'size' (the size of the artifact after the pass),
+    'bytes_read', and 'bytes_written'.  Artifacts that are not accessed
+    through the databases (for example, files that are written or read
+    sequentially) have no counts; for those, 'bytes_written' is the
+    growth of the file during the pass, and 'bytes_read' is omitted.
+    This method must be called before pass_done() is called for
+    WHICH_PASS."""
+
+    created_artifacts = self._pass_creates.get(which_pass, set())
+    retval = { }
+    for (name, artifact) in self._artifacts.iteritems():
+      if artifact not in self._pass_needs.get(which_pass, []):
+        continue
+      size = artifact.get_size()
+      stats = { }
+      if size is not None:
+        stats['size'] = size
+      filename = getattr(artifact, 'filename', None)
+      if filename in file_io:
+        (stats['bytes_read'], stats['bytes_written'],) = file_io[filename]
+      elif size is not None:
+        if artifact in created_artifacts:
+          stats['bytes_written'] = size
+        else:
+          stats['bytes_written'] = max(
+              0, size - self._start_sizes.get(artifact, size)
+              )
+      retval[name] = stats
+
+    return retval
+
+  def set_keep_resident(self, keep_resident):
+    """Set whether objects loaded via open_resident() should be kept.
+
+    If KEEP_RESIDENT is False, discard any objects that are resident."""
+
+    self._keep_resident = keep_resident
+    if not keep_resident:
+      for artifact in self._resident.keys():
+        self._evict(artifact)
+
+  def open_resident(self, name, open_fn, *args):
+    """Return the object loaded from the artifact named NAME.
+
+    The object is loaded by calling OPEN_FN(*ARGS).  The artifact must
+    be needed by an active pass and must not be modified via the
+    object.  If set_keep_resident(True) was called, the object is kept
+    after the pass, and returned by later calls as long as the
+    artifact has not been written since.  The caller must pass the
+    object to close_resident() instead of closing it itself."""
+
+    artifact = self.get_artifact(name)
+    generation = self._last_written.get(artifact, 0)
+    try:
+      (obj, obj_generation) = self._resident[artifact]
+    except KeyError:
+      pass
+    else:
+      if obj_generation == generation:
+        counters.add('Resident objects reused', 1)
+        logger.debug('Reusing resident %s' % (artifact,))
+        return obj
+      self._evict(artifact)
+
+    obj = open_fn(*args)
+    if self._keep_resident:
+      self._resident[artifact] = (obj, generation)
+    return obj
+
+  def close_resident(self, obj):
+    """The current pass is done with OBJ, returned by open_resident().
+
+    Close OBJ (if it has a close() method) unless it is resident."""
+
+    for (resident_obj, generation) in self._resident.itervalues():
+      if resident_obj is obj:
+        return
+
+    if hasattr(obj, 'close'):
+      obj.close()
+
+  def _evict(self, artifact):
+    """Discard the resident object loaded from ARTIFACT, if any."""
+
+    try:
+      (obj, generation) = self._resident.pop(artifact)
+    except KeyError:
+      return
+
+    logger.debug('Discarding resident %s' % (artifact,))
+    if hasattr(obj, 'close'):
+      obj.close()
+
   def _unregister_artifacts(self, which_pass):
     """Unregister any artifacts that were needed for WHICH_PASS.
 
@@ -177,6 +374,7 @@ class ArtifactManager:
       return []
 
     del self._pass_needs[which_pass]
+    self._pass_creates.pop(which_pass, None)
 
     unneeded_artifacts = []
     for artifact in artifacts:
@@ -196,9 +394,22 @@ class ArtifactManager:
     self._unregister_artifacts(which_pass)
 
   def pass_started(self, which_pass):
-    """WHICH_PASS is starting."""
+    """WHICH_PASS is starting.
+
+    Record that the artifacts that it creates are being written, and
+    discard any resident objects that were loaded from them.  Also
+    record the sizes of the artifacts that it needs (see
+    get_artifact_io())."""
 
     self._active_passes.add(which_pass)
+    self._generation += 1
+    for artifact in self._pass_creates.get(which_pass, []):
+      self._last_written[artifact] = self._generation
+      self._evict(artifact)
+    for artifact in self._pass_needs.get(which_pass, []):
+      size = artifact.get_size()
+      if size is not None:
+        self._start_sizes[artifact] = size
 
   def pass_continued(self, which_pass):
     """WHICH_PASS will be continued during the next program run.
@@ -220,6 +431,9 @@ class ArtifactManager:
 
     self._active_passes.remove(which_pass)
     artifacts = self._unregister_artifacts(which_pass)
+    for artifact in artifacts:
+      self._evict(artifact)
+      self._start_sizes.pop(artifact, None)
     if not skip_cleanup:
       for artifact in artifacts:
         artifact.cleanup()
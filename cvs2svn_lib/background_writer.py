@@ -0,0 +1,211 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains a file-like object that writes in the background.
+
+The output of OutputPass is typically written to a pipe into 'svnadmin
+load'.  If it is written synchronously, cvs2svn has to wait whenever
+svnadmin is busy committing a revision, and svnadmin has to wait
+whenever cvs2svn is busy reconstructing file contents.  A
+BackgroundWriter decouples the two by queuing the output in memory and
+writing it to the underlying file from a separate thread."""
+
+
+import sys
+import time
+import Queue
+
+try:
+  import threading
+except ImportError:
+  # Python was built without thread support:
+  threading = None
+
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
+
+
+class BackgroundWriter(object):
+  """A file-like object that writes to another file from a thread.
+
+  Data passed to write() are collected into chunks of approximately
+  CHUNK_SIZE bytes, which are queued to be written to the underlying
+  file by a writer thread.  At most BUFFER_SIZE bytes are queued; if
+  the queue is full, write() blocks until the writer thread has caught
+  up.  The number and duration of such stalls (and of the times that
+  the writer thread had to wait for data) are logged when the object
+  is closed and recorded in instrumentation.counters.
+
+  Any exception raised by the underlying file is re-raised by the next
+  call to write() or close()."""
+
+  CHUNK_SIZE = 64 * 1024
+
+  def __init__(self, f, buffer_size):
+    """Write to file-like object F, buffering up to BUFFER_SIZE bytes.
+
+    F must support write() and close() (and flush(), if this object's
+    flush() method is used); it is closed when this object is
+    closed."""
+
+    self._f = f
+
+    # The list of strings that have been written but not yet queued,
+    # and their total length:
+    self._pending = []
+    self._pending_size = 0
+
+    # The (type, value, traceback) of an exception raised by the writer
+    # thread, or None:
+    self._exc_info = None
+
+    # Stall statistics: the number of times that write() had to wait
+    # for the writer thread and vice versa, and the total times:
+    self._producer_stalls = 0
+    self._producer_stall_time = 0.0
+    self._writer_stalls = 0
+    self._writer_stall_time = 0.0
+
+    self._queue = Queue.Queue(max(1, buffer_size // self.CHUNK_SIZE))
+    self._thread = threading.Thread(target=self._run)
+    self._thread.setDaemon(True)
+    self._thread.start()
+
+  def _run(self):
+    """Write the queued chunks to the underlying file.
+
+    A chunk of None indicates the end of the data.  A threading.Event
+    is set as soon as the chunks before it have been written (see
+    flush()).  After an error, continue to consume the queue
+    (discarding the data) so that the producer cannot block
+    forever."""
+
+    while True:
+      try:
+        chunk = self._queue.get(False)
+      except Queue.Empty:
+        start = time.time()
+        chunk = self._queue.get()
+        self._writer_stalls += 1
+        self._writer_stall_time += time.time() - start
+
+      if chunk is None:
+        break
+      elif not isinstance(chunk, str):
+        chunk.set()
+      elif self._exc_info is None:
+        try:
+          self._f.write(chunk)
+        except:
+          self._exc_info = sys.exc_info()
+
+  def _check_error(self):
+    if self._exc_info is not None:
+      (exc_type, exc_value, exc_traceback) = self._exc_info
+      raise exc_type, exc_value, exc_traceback
+
+  def _put(self, chunk):
+    try:
+      self._queue.put(chunk, False)
+    except Queue.Full:
+      start = time.time()
+      self._queue.put(chunk)
+      self._producer_stalls += 1
+      self._producer_stall_time += time.time() - start
+
+  def _flush_pending(self):
+    if self._pending:
+      self._put(''.join(self._pending))
+      self._pending = []
+      self._pending_size = 0
+
+  def write(self, s):
+    self._check_error()
+    if len(s) >= self.CHUNK_SIZE:
+      self._flush_pending()
+      self._put(s)
+    else:
+      self._pending.append(s)
+      self._pending_size += len(s)
+      if self._pending_size >= self.CHUNK_SIZE:
+        self._flush_pending()
+
+  def flush(self):
+    """Wait for the queued data to be written, then flush the file."""
+
+    self._flush_pending()
+    event = threading.Event()
+    self._put(event)
+    event.wait()
+    self._check_error()
+    self._f.flush()
+
+  def close(self):
+    """Wait for the queued data to be written, then close the file.
+
+    The underlying file is closed even if the writer thread failed; in
+    that case, the writer thread's exception is re-raised and any
+    exception raised by closing the file is suppressed."""
+
+    self._flush_pending()
+    self._put(None)
+    self._thread.join()
+    self._thread = None
+    try:
+      self._check_error()
+    finally:
+      if self._exc_info is None:
+        self._f.close()
+      else:
+        try:
+          self._f.close()
+        except:
+          # Don't let this mask the original exception:
+          pass
+
+    logger.verbose(
+        'Output buffer: writer waited %d times (%.3f seconds) for output; '
+        'output waited %d times (%.3f seconds) for writer.'
+        % (
+            self._writer_stalls, self._writer_stall_time,
+            self._producer_stalls, self._producer_stall_time,
+            )
+        )
+    counters.add('BackgroundWriter writer stalls', self._writer_stalls)
+    counters.add(
+        'BackgroundWriter writer stall ms',
+        int(1000 * self._writer_stall_time),
+        )
+    counters.add('BackgroundWriter producer stalls', self._producer_stalls)
+    counters.add(
+        'BackgroundWriter producer stall ms',
+        int(1000 * self._producer_stall_time),
+        )
+
+
+def get_buffered_writer(f, buffer_size):
+  """Return a file-like object that writes to F.
+
+  If BUFFER_SIZE is positive and threads are available, return a
+  BackgroundWriter that buffers up to BUFFER_SIZE bytes.  Otherwise,
+  return F itself."""
+
+  if buffer_size > 0 and threading is not None:
+    return BackgroundWriter(f, buffer_size)
+  else:
+    return f
+
+
@@ -17,17 +17,18 @@
 """This module contains classes to store changesets."""
 
 
-from cvs2svn_lib.changeset import Changeset
+import struct
+from array import array
+
 from cvs2svn_lib.changeset import RevisionChangeset
 from cvs2svn_lib.changeset import OrderedChangeset
-from cvs2svn_lib.changeset import SymbolChangeset
 from cvs2svn_lib.changeset import BranchChangeset
 from cvs2svn_lib.changeset import TagChangeset
 from cvs2svn_lib.record_table import UnsignedIntegerPacker
 from cvs2svn_lib.record_table import MmapRecordTable
 from cvs2svn_lib.record_table import RecordTable
 from cvs2svn_lib.database import IndexedStore
-from cvs2svn_lib.serializer import PrimedPickleSerializer
+from cvs2svn_lib.serializer import Serializer
 
 
 # Should the CVSItemToChangesetTable database files be memory mapped?
@@ -45,18 +46,212 @@ def CVSItemToChangesetTable(filename, mode):
     return RecordTable(filename, mode, UnsignedIntegerPacker())
 
 
-class ChangesetDatabase(IndexedStore):
-  def __init__(self, filename, index_filename, mode):
-    primer = (
-        Changeset,
-        RevisionChangeset,
-        OrderedChangeset,
-        SymbolChangeset,
-        BranchChangeset,
-        TagChangeset,
+def _encode_varints(values, out):
+  """Append the unsigned integers VALUES to OUT as varints.
+
+  OUT is an array of unsigned chars.  Each integer is written in
+  groups of seven bits, least significant group first; the high bit of
+  each byte is set if more bytes follow."""
+
+  if not values:
+    return
+  elif max(values) < 0x80:
+    # Fast path: every value fits into a single byte.
+    out.extend(values)
+    return
+
+  append = out.append
+  for value in values:
+    while value >= 0x80:
+      append((value & 0x7f) | 0x80)
+      value >>= 7
+    append(value)
+
+
+def _decode_varints(data):
+  """Return a list of the unsigned integers encoded as varints in DATA.
+
+  DATA is an array of unsigned chars."""
+
+  if not data or max(data) < 0x80:
+    # Fast path: every value is stored in a single byte.
+    return data.tolist()
+
+  values = []
+  append = values.append
+  value = 0
+  shift = 0
+  for b in data:
+    if b & 0x80:
+      value |= (b & 0x7f) << shift
+      shift += 7
+    else:
+      append(value | (b << shift))
+      value = 0
+      shift = 0
+  return values
+
+
+def _encode_optional_id(id):
+  """Encode ID, which may be None, as an unsigned integer."""
+
+  if id is None:
+    return 0
+  else:
+    return id + 1
+
+
+def _decode_optional_id(value):
+  """Return the id encoded by _encode_optional_id()."""
+
+  if value == 0:
+    return None
+  else:
+    return value - 1
+
+
+class ChangesetSerializer(Serializer):
+  """A Serializer specialized for the Changeset classes.
+
+  Each record consists of a header and a body.  The header holds the
+  type of the changeset, a flag that tells whether its cvs_item_ids are
+  sorted, and the length of the body.  The body holds the changeset's
+  id and type-specific fields (the ordinal, prev_id and next_id of an
+  OrderedChangeset, or the symbol id of a SymbolChangeset) followed by
+  the number of cvs_item_ids and the cvs_item_ids themselves, all as
+  varints.  The cvs_item_ids are delta-encoded: if they are sorted,
+  each is stored as its difference from the previous one; otherwise
+  the differences are zigzag-encoded so that they are unsigned.  (The
+  order of the ids is preserved either way.)
+
+  Unserialized Changesets hold their cvs_item_ids in an array of
+  unsigned ints rather than a list, which takes much less memory for
+  big changesets."""
+
+  # The format of the record header (type_code, body_length):
+  HEADER_FORMAT = '=BI'
+  HEADER_LEN = struct.calcsize(HEADER_FORMAT)
+
+  # Type codes, which are ORed with _SORTED if the cvs_item_ids are
+  # sorted:
+  _REVISION = 1
+  _ORDERED = 2
+  _BRANCH = 3
+  _TAG = 4
+  _SORTED = 0x80
+
+  _type_codes = {
+      RevisionChangeset : _REVISION,
+      OrderedChangeset : _ORDERED,
+      BranchChangeset : _BRANCH,
+      TagChangeset : _TAG,
+      }
+
+  _classes = {
+      _REVISION : RevisionChangeset,
+      _ORDERED : OrderedChangeset,
+      _BRANCH : BranchChangeset,
+      _TAG : TagChangeset,
+      }
+
+  def dumps(self, changeset):
+    type_code = self._type_codes[changeset.__class__]
+    if type_code == self._REVISION:
+      fields = [changeset.id]
+    elif type_code == self._ORDERED:
+      fields = [
+          changeset.id, changeset.ordinal,
+          _encode_optional_id(changeset.prev_id),
+          _encode_optional_id(changeset.next_id),
+          ]
+    else:
+      fields = [changeset.id, changeset.symbol.id]
+
+    fields.append(len(changeset.cvs_item_ids))
+
+    deltas = []
+    last = 0
+    for id in changeset.cvs_item_ids:
+      deltas.append(id - last)
+      last = id
+    if deltas and min(deltas) < 0:
+      # Zigzag-encode the deltas, mapping 0, -1, 1, -2, 2... to 0, 1,
+      # 2, 3, 4...:
+      deltas = [(delta << 1) ^ -(delta < 0) for delta in deltas]
+    else:
+      type_code |= self._SORTED
+
+    body = array('B')
+    _encode_varints(fields, body)
+    _encode_varints(deltas, body)
+    return struct.pack(self.HEADER_FORMAT, type_code, len(body)) \
+           + body.tostring()
+
+  def dumpf(self, f, changeset):
+    f.write(self.dumps(changeset))
+
+  def _decode(self, type_code, body):
+    """Return the Changeset encoded as TYPE_CODE and the string BODY."""
+
+    values = _decode_varints(array('B', body))
+
+    cls = self._classes[type_code & ~self._SORTED]
+    if cls is RevisionChangeset:
+      (id, count) = values[:2]
+      del values[:2]
+    elif cls is OrderedChangeset:
+      (id, ordinal, prev_id, next_id, count) = values[:5]
+      del values[:5]
+    else:
+      (id, symbol_id, count) = values[:3]
+      del values[:3]
+    assert len(values) == count
+
+    cvs_item_ids = array('I')
+    append = cvs_item_ids.append
+    last = 0
+    if type_code & self._SORTED:
+      for delta in values:
+        last += delta
+        append(last)
+    else:
+      for delta in values:
+        last += (delta >> 1) ^ -(delta & 1)
+        append(last)
+
+    changeset = cls.__new__(cls)
+    if cls is RevisionChangeset:
+      changeset.__setstate__((id, cvs_item_ids,))
+    elif cls is OrderedChangeset:
+      changeset.__setstate__((
+          (id, cvs_item_ids,), ordinal,
+          _decode_optional_id(prev_id), _decode_optional_id(next_id),
+          ))
+    else:
+      changeset.__setstate__(((id, cvs_item_ids,), symbol_id,))
+    return changeset
+
+  def loads(self, s):
+    (type_code, body_length) = struct.unpack(
+        self.HEADER_FORMAT, s[:self.HEADER_LEN]
+        )
+    return self._decode(
+        type_code, s[self.HEADER_LEN:self.HEADER_LEN + body_length]
         )
+
+  def loadf(self, f):
+    (type_code, body_length) = struct.unpack(
+        self.HEADER_FORMAT, f.read(self.HEADER_LEN)
+        )
+    return self._decode(type_code, f.read(body_length))
+
+
+class ChangesetDatabase(IndexedStore):
+  def __init__(self, filename, index_filename, mode, track_dead_records=False):
     IndexedStore.__init__(
-        self, filename, index_filename, mode, PrimedPickleSerializer(primer))
+        self, filename, index_filename, mode, ChangesetSerializer(),
+        track_dead_records=track_dead_records,
+        )
 
   def store(self, changeset):
     self.add(changeset)
@@ -49,11 +49,16 @@ class CheckDependenciesPass(Pass):
     raise NotImplementedError()
 
   def run(self, run_options, stats_keeper):
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    self.symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    self.symbol_db = SymbolDatabase()
     Ctx()._symbol_db = self.symbol_db
 
     logger.quiet("Checking dependency consistency...")
@@ -81,9 +86,9 @@ class CheckDependenciesPass(Pass):
           % ('\n'.join(fatal_errors),)
           )
 
-    self.symbol_db.close()
+    artifact_manager.close_resident(self.symbol_db)
     self.symbol_db = None
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
     logger.quiet("Done")
 
 
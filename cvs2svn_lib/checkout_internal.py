@@ -76,12 +76,15 @@ recursively.  When a TextRecord is deleted at this stage, its
 deltatext is also deleted from the delta database."""
 
 
+import os
 import re
 import time
+import shutil
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import InternalError
@@ -93,6 +96,7 @@ from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_item import CVSRevisionModification
 from cvs2svn_lib.database import Database
 from cvs2svn_lib.database import IndexedDatabase
+from cvs2svn_lib.database import BlockCompressedIndexedDatabase
 from cvs2svn_lib.rcs_stream import RCSStream
 from cvs2svn_lib.rcs_stream import MalformedDeltaException
 from cvs2svn_lib.revision_manager import RevisionCollector
@@ -582,16 +586,17 @@ class InternalRevisionCollector(RevisionCollector):
     artifact_manager.register_temp_file(config.RCS_TREES_STORE, which_pass)
 
   def start(self):
-    serializer = MarshalSerializer()
     if self._compress:
-      serializer = CompressingSerializer(serializer)
-    self._delta_db = IndexedDatabase(
+      db_class = BlockCompressedIndexedDatabase
+    else:
+      db_class = IndexedDatabase
+    self._delta_db = db_class(
         artifact_manager.get_temp_file(config.RCS_DELTAS_STORE),
         artifact_manager.get_temp_file(config.RCS_DELTAS_INDEX_TABLE),
-        DB_OPEN_NEW, serializer,
+        DB_OPEN_NEW, MarshalSerializer(),
         )
     primer = (FullTextRecord, DeltaTextRecord)
-    self._rcs_trees = IndexedDatabase(
+    self._rcs_trees = db_class(
         artifact_manager.get_temp_file(config.RCS_TREES_STORE),
         artifact_manager.get_temp_file(config.RCS_TREES_INDEX_TABLE),
         DB_OPEN_NEW, PrimedPickleSerializer(primer),
@@ -715,11 +720,24 @@ class InternalRevisionReader(RevisionReader):
   _kw_re = re.compile(r'\$(' + _kws + r'):[^$\n]*\$')
   _kwo_re = re.compile(r'\$(' + _kws + r')(:[^$\n]*)?\$')
 
+  # The key under which a token identifying the most recent checkpoint
+  # is stored in the checkout database.  (The other keys are
+  # hexadecimal numbers.)
+  _checkpoint_key = 'checkpoint'
+
   def __init__(self, compress):
     self._compress = compress
 
+    # The token of a checkpoint whose copy of the checkout database has
+    # not been moved to CVS_CHECKOUT_CHECKPOINT_DB yet, or None:
+    self._pending_token = None
+
   def register_artifacts(self, which_pass):
     artifact_manager.register_temp_file(config.CVS_CHECKOUT_DB, which_pass)
+    if Ctx().checkpoint_interval and not Ctx().dry_run:
+      artifact_manager.register_temp_file(
+          config.CVS_CHECKOUT_CHECKPOINT_DB, which_pass
+          )
     artifact_manager.register_temp_file_needed(
         config.RCS_DELTAS_STORE, which_pass
         )
@@ -733,14 +751,20 @@ class InternalRevisionReader(RevisionReader):
         config.RCS_TREES_INDEX_TABLE, which_pass
         )
 
-  def start(self):
-    self._delta_db = IndexedDatabase(
+  def _open(self, co_mode):
+    """Open the databases, opening the checkout database in CO_MODE."""
+
+    if self._compress:
+      db_class = BlockCompressedIndexedDatabase
+    else:
+      db_class = IndexedDatabase
+    self._delta_db = db_class(
         artifact_manager.get_temp_file(config.RCS_DELTAS_STORE),
         artifact_manager.get_temp_file(config.RCS_DELTAS_INDEX_TABLE),
         DB_OPEN_READ,
         )
     self._delta_db.__delitem__ = lambda id: None
-    self._tree_db = IndexedDatabase(
+    self._tree_db = db_class(
         artifact_manager.get_temp_file(config.RCS_TREES_STORE),
         artifact_manager.get_temp_file(config.RCS_TREES_INDEX_TABLE),
         DB_OPEN_READ,
@@ -750,9 +774,14 @@ class InternalRevisionReader(RevisionReader):
       serializer = CompressingSerializer(serializer)
     self._co_db = Database(
         artifact_manager.get_temp_file(config.CVS_CHECKOUT_DB),
-        DB_OPEN_NEW, serializer,
+        co_mode, serializer,
         )
 
+  def start(self):
+    self._open(DB_OPEN_NEW)
+    if Ctx().checkpoint_interval and not Ctx().dry_run:
+      self._remove_checkpoint_copies()
+
     # The set of CVSFile instances whose TextRecords have already been
     # read:
     self._loaded_files = set()
@@ -761,6 +790,105 @@ class InternalRevisionReader(RevisionReader):
     # revisions:
     self._text_record_db = TextRecordDatabase(self._delta_db, self._co_db)
 
+  def _get_checkpoint_copy_filename(self, token):
+    """Return the name of the checkout database copy for TOKEN."""
+
+    return '%s.%s' % (
+        artifact_manager.get_temp_file(config.CVS_CHECKOUT_CHECKPOINT_DB),
+        token,
+        )
+
+  def _commit_checkpoint_copy(self, token):
+    """Move the checkout database copy for TOKEN into place.
+
+    This may only be done once the checkpoint that refers to TOKEN has
+    been written; until then, the copy belonging to the previous
+    checkpoint has to be kept."""
+
+    filename = artifact_manager.get_temp_file(
+        config.CVS_CHECKOUT_CHECKPOINT_DB
+        )
+    if os.path.exists(filename):
+      # os.rename() cannot overwrite files on all platforms:
+      os.unlink(filename)
+    os.rename(self._get_checkpoint_copy_filename(token), filename)
+
+  def _remove_checkpoint_copies(self):
+    """Remove the checkout database copies of any unwritten checkpoints."""
+
+    (dirname, basename) = os.path.split(
+        artifact_manager.get_temp_file(config.CVS_CHECKOUT_CHECKPOINT_DB)
+        )
+    for name in os.listdir(dirname):
+      if name.startswith(basename + '.'):
+        os.unlink(os.path.join(dirname, name))
+
+  def get_checkpoint(self):
+    # This is only called again after the previous checkpoint has been
+    # written, so its copy of the checkout database can now replace
+    # the one before it:
+    if self._pending_token is not None:
+      self._commit_checkpoint_copy(self._pending_token)
+      self._pending_token = None
+
+    # The checkout database has to be closed to be copied.  The copy is
+    # marked with a token, so that resume() can verify that it belongs
+    # to the same checkpoint as the returned state.  It is written to a
+    # file named after the token, so that an interruption cannot damage
+    # the copy that belongs to the previous checkpoint:
+    token = '%.6f' % (time.time(),)
+    self._co_db[self._checkpoint_key] = token
+    self._co_db.close()
+    shutil.copyfile(
+        artifact_manager.get_temp_file(config.CVS_CHECKOUT_DB),
+        self._get_checkpoint_copy_filename(token),
+        )
+    self._pending_token = token
+    self._co_db = Database(
+        artifact_manager.get_temp_file(config.CVS_CHECKOUT_DB),
+        DB_OPEN_WRITE,
+        )
+    self._text_record_db.checkout_db = self._co_db
+
+    return (
+        token,
+        [cvs_file.id for cvs_file in self._loaded_files],
+        self._text_record_db,
+        )
+
+  def resume(self, checkpoint):
+    (token, loaded_file_ids, text_record_db) = checkpoint
+
+    filename = artifact_manager.get_temp_file(
+        config.CVS_CHECKOUT_CHECKPOINT_DB
+        )
+
+    # If the run was interrupted right after the checkpoint was
+    # written, its copy of the checkout database is still pending:
+    if os.path.exists(self._get_checkpoint_copy_filename(token)):
+      self._commit_checkpoint_copy(token)
+
+    # Any other copies belong to checkpoints that were never written:
+    self._remove_checkpoint_copies()
+
+    shutil.copyfile(
+        filename, artifact_manager.get_temp_file(config.CVS_CHECKOUT_DB)
+        )
+    self._open(DB_OPEN_WRITE)
+    if self._co_db.get(self._checkpoint_key) != token:
+      raise FatalError(
+          '%s does not belong to the OutputPass checkpoint.' % (filename,)
+          )
+
+    self._loaded_files = set([
+        Ctx()._cvs_path_db.get_path(id)
+        for id in loaded_file_ids
+        ])
+
+    text_record_db.delta_db = self._delta_db
+    text_record_db.checkout_db = self._co_db
+    self._text_record_db = text_record_db
+
   def _get_text_record(self, cvs_rev):
     """Return the TextRecord instance for CVS_REV.
 
@@ -835,3 +963,7 @@ class InternalRevisionReader(RevisionReader):
     self._tree_db.close()
     self._co_db.close()
 
+    if self._pending_token is not None:
+      self._commit_checkpoint_copy(self._pending_token)
+      self._pending_token = None
+
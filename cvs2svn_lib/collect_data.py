@@ -72,6 +72,7 @@ from cvs2svn_lib.cvs_file_items import CVSFileItems
 from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.cvs_item_database import NewCVSItemStore
 from cvs2svn_lib.symbol_statistics import SymbolStatisticsCollector
+from cvs2svn_lib.symbol_transform import CompiledSymbolTransform
 from cvs2svn_lib.metadata_database import MetadataDatabase
 from cvs2svn_lib.metadata_database import MetadataLogger
 from cvs2svn_lib.repository_walker import walk_repository
@@ -343,9 +344,7 @@ class _SymbolDataCollector(object):
 
     old_name = name
     # Apply any user-defined symbol transforms to the symbol name:
-    name = self.cvs_file.project.transform_symbol(
-        self.cvs_file, name, revision
-        )
+    name = self.pdc.symbol_transform.transform(self.cvs_file, name, revision)
 
     if name is None:
       # Ignore symbol:
@@ -975,6 +974,12 @@ class _ProjectDataCollector:
     # were affected by each each symbol name transformation:
     self.symbol_transform_counts = {}
 
+    # The project's symbol transforms, specialized per directory and
+    # memoized where possible:
+    self.symbol_transform = CompiledSymbolTransform(
+        self.project.symbol_transform
+        )
+
   def get_symbol(self, name):
     """Return the Symbol object for the symbol named NAME in this project.
 
@@ -97,6 +97,39 @@ def canonicalize_eol(text, eol):
   return text
 
 
+class CanonicalizeEOLStream(object):
+  """A stream that replaces end-of-line sequences in another stream.
+
+  Like canonicalize_eol(), replace any end-of-line sequences in the
+  contents of STREAM with EOL.  Take care of '\r\n' sequences that are
+  split between two reads."""
+
+  def __init__(self, stream, eol):
+    self._stream = stream
+    self._eol = eol
+
+    # True iff the last data read from STREAM ended with '\r', which
+    # has been held back to see whether it is followed by '\n':
+    self._pending_cr = False
+
+  def read(self, size=-1):
+    while True:
+      data = self._stream.read(size)
+      at_eof = size < 0 or not data
+      if self._pending_cr:
+        data = '\r' + data
+        self._pending_cr = False
+      if not at_eof and data.endswith('\r'):
+        data = data[:-1]
+        self._pending_cr = True
+      if data or at_eof:
+        return canonicalize_eol(data, self._eol)
+
+  def close(self):
+    self._stream.close()
+    self._stream = None
+
+
 def path_join(*components):
   """Join two or more pathname COMPONENTS, inserting '/' as needed.
   Empty component are skipped."""
@@ -360,6 +393,27 @@ class CVSTextDecoder:
     else:
       self.fallback_decoder = (encoding, codecs.lookup(encoding)[1])
 
+  def preserves_ascii(self):
+    """Return True iff pure ASCII strings are decoded unchanged.
+
+    This is the case if the first encoding that would be tried is a
+    superset of ASCII (e.g., 'ascii', 'utf8', or 'latin1').  Callers
+    can then skip decoding strings that only contain ASCII characters,
+    because decoding them would always succeed with the same result."""
+
+    if self.decoders:
+      (name, decoder) = self.decoders[0]
+    elif self.fallback_decoder is not None:
+      (name, decoder) = self.fallback_decoder
+    else:
+      return False
+
+    ascii_chars = ''.join([chr(i) for i in range(128)])
+    try:
+      return decoder(ascii_chars)[0] == unicode(ascii_chars)
+    except ValueError:
+      return False
+
   def __call__(self, s):
     """Try to decode string S using our configured source encodings.
 
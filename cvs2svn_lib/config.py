@@ -67,6 +67,11 @@ CVS_ITEM_TO_CHANGESET_ALLBROKEN = 'cvs-item-to-changeset-allbroken.dat'
 CHANGESETS_INDEX = 'changesets-index.dat'
 CHANGESETS_STORE = 'changesets.pck'
 
+# The passes that break changeset cycles compact the changeset
+# database that they write if at least this fraction of its records
+# have been overwritten or deleted (see IndexedDatabase.compact()):
+CHANGESETS_COMPACT_DEAD_FRACTION = 0.2
+
 # A mapping from id to Changeset, after the RevisionChangeset loops
 # have been broken.
 CHANGESETS_REVBROKEN_INDEX = 'changesets-revbroken-index.dat'
@@ -119,13 +124,20 @@ SYMBOL_OPENINGS_CLOSINGS_SORTED = 'symbolic-names-s.txt'
 MIRROR_NODES_INDEX_TABLE = 'mirror-nodes-index.dat'
 MIRROR_NODES_STORE = 'mirror-nodes.pck'
 
+# The state of OutputPass as of the most recent checkpoint (see
+# --checkpoint-interval).  OutputPass resumes from this checkpoint if
+# it is the first pass that is run.
+OUTPUT_CHECKPOINT = 'output-checkpoint.pck'
+
 # Offsets pointing to the beginning of each symbol's records in
 # SYMBOL_OPENINGS_CLOSINGS_SORTED.  This file contains a pickled map
 # from symbol_id to file offset.
 SYMBOL_OFFSETS_DB = 'symbol-offsets.pck'
 
-# Pickled map of CVSPath.id to instance.
-CVS_PATHS_DB = 'cvs-paths.pck'
+# A table of fixed-length records, indexed by CVSPath.id, followed by
+# a pool of basenames and pickled variable-length data.  See
+# cvs_path_database.py.
+CVS_PATHS_DB = 'cvs-paths.dat'
 
 # A series of records.  The first is a pickled serializer.  Each
 # subsequent record is a serialized list of all CVSItems applying to a
@@ -168,6 +180,31 @@ SVN_COMMITS_STORE = 'svn-commits.pck'
 # large enough to be efficient without wasting too much memory.
 PIPE_READ_SIZE = 128 * 1024
 
+# The default number of bytes of output that may be queued in memory
+# while a background thread writes them to the dumpfile or to
+# 'svnadmin load' (see BackgroundWriter).  If 0, the output is written
+# synchronously.
+OUTPUT_BUFFER_SIZE = 16 * 1024 * 1024
+
+# When writing a file's contents to a dumpfile, its length and checksum
+# have to be written first.  If the revision reader produces the
+# contents as a stream (e.g., from 'co -p'), contents up to this many
+# bytes are collected in memory; larger contents are spooled to a
+# temporary file.  Such large contents are never written as deltas.
+CONTENT_SPOOL_THRESHOLD = 16 * 1024 * 1024
+
+# The maximum total size, in bytes, of the file contents that are kept
+# in memory to serve as the bases of the deltas written by --dump-deltas
+# (see DeltaBaseCache).  A change to a file whose previous contents have
+# been discarded is written as a fulltext.
+SVN_DELTA_CACHE_SIZE = 64 * 1024 * 1024
+
+# OutputPass reads SVNCommits ahead in batches, and the CVSItems needed
+# by all of the commits in a batch are read together in file order
+# (see PersistenceManager.iter_svn_commits()).  A batch ends after this
+# many commits or once its commits need this many CVSItems.
+SVN_COMMIT_READ_AHEAD = 1000
+
 # Records the author and log message for each changeset.  The database
 # contains a map metadata_id -> (author, logmessage).  Each
 # CVSRevision that is eligible to be combined into the same SVN commit
@@ -202,8 +239,24 @@ RCS_TREES_STORE = 'rcs-trees.pck'
 # be checked out.
 CVS_CHECKOUT_DB = 'cvs-checkout.db'
 
+# A copy of CVS_CHECKOUT_DB as of the most recent OutputPass
+# checkpoint.
+CVS_CHECKOUT_CHECKPOINT_DB = 'cvs-checkout-checkpoint.db'
+
 # End of DBs related to --use-internal-co.
 
+# Records the blobs that generate_blobs.py did not write because they
+# were identical to an earlier blob.  Each line has the form "MARK
+# CANONICAL_MARK".
+GIT_BLOB_ALIASES = 'git-blob-aliases.txt'
+
+# The blob and alias files written by the second and subsequent
+# generate_blobs.py processes when cvs2git runs several of them (see
+# ExternalBlobGenerator).  They are appended to the main files at the
+# end of FilterSymbolsPass.
+GIT_BLOB_SHARD = 'git-blobs-%d.dat'
+GIT_BLOB_ALIASES_SHARD = 'git-blob-aliases-%d.txt'
+
 # flush a commit if a 5 minute gap occurs.
 COMMIT_THRESHOLD = 5 * 60
 
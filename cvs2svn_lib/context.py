@@ -46,6 +46,8 @@ class Ctx:
     self.revision_collector = None
     self.revision_reader = None
     self.svnadmin_executable = config.SVNADMIN_EXECUTABLE
+    self.output_buffer_size = config.OUTPUT_BUFFER_SIZE
+    self.dump_deltas = False
     self.trunk_only = False
     self.include_empty_directories = False
     self.prune = True
@@ -54,11 +56,17 @@ class Ctx:
     self.cvs_filename_decoder = CVSTextDecoder(['ascii'])
     self.decode_apple_single = False
     self.symbol_info_filename = None
+    self.stats_filename = None
     self.username = None
     self.file_property_setters = []
     self.revision_property_setters = []
     self.tmpdir = 'cvs2svn-tmp'
     self.skip_cleanup = False
+    self.pipeline_passes = False
+    self.jobs = 1
+    self.checkpoint_interval = 0
+    self.incremental_state_filename = None
+    self.keep_databases_loaded = False
     self.keep_cvsignore = False
     self.cross_project_commits = True
     self.cross_branch_commits = True
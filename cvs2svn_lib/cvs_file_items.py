@@ -122,6 +122,12 @@ class CVSFileItems(object):
     # The symbol that represents "Trunk" in this file.
     self.trunk = trunk
 
+    # A tuple (lods, root_lods) of lists of LODItems, as generated by
+    # iter_lods() and iter_root_lods(), or None if they have to be
+    # recomputed.  This index is discarded whenever the tree structure
+    # is changed.
+    self._lod_index = None
+
     # A map from CVSItem.id to CVSItem:
     self._cvs_items = {}
 
@@ -151,12 +157,21 @@ class CVSFileItems(object):
   def __setstate__(self, state):
     (cvs_file_id, cvs_items, original_ids,) = state
     cvs_file = Ctx()._cvs_path_db.get_path(cvs_file_id)
+    # The items are modified in place by the methods of this class:
+    for cvs_item in cvs_items:
+      cvs_item.make_mutable()
     CVSFileItems.__init__(
         self, cvs_file, cvs_file.project.get_trunk(), cvs_items,
         original_ids=original_ids,
         )
 
+  def _invalidate_lod_index(self):
+    """Discard the LOD index because the tree structure has changed."""
+
+    self._lod_index = None
+
   def add(self, cvs_item):
+    self._invalidate_lod_index()
     self._cvs_items[cvs_item.id] = cvs_item
 
   def __getitem__(self, id):
@@ -169,6 +184,7 @@ class CVSFileItems(object):
 
   def __delitem__(self, id):
     assert id not in self.root_ids
+    self._invalidate_lod_index()
     del self._cvs_items[id]
 
   def values(self):
@@ -234,21 +250,11 @@ class CVSFileItems(object):
     return self._get_lod(cvs_branch.symbol, cvs_branch, cvs_branch.next_id)
 
   def iter_root_lods(self):
-    """Iterate over the LODItems for all root LODs (non-recursively)."""
+    """Iterate over the LODItems for all root LODs (non-recursively).
 
-    for id in list(self.root_ids):
-      cvs_item = self[id]
-      if isinstance(cvs_item, CVSRevision):
-        # This LOD doesn't have a CVSBranch associated with it.
-        # Either it is Trunk, or it is a branch whose CVSBranch has
-        # been deleted.
-        yield self._get_lod(cvs_item.lod, None, id)
-      elif isinstance(cvs_item, CVSBranch):
-        # This is a Branch that has been severed from the rest of the
-        # tree.
-        yield self._get_lod(cvs_item.symbol, cvs_item, cvs_item.next_id)
-      else:
-        raise InternalError('Unexpected root item: %s' % (cvs_item,))
+    The same restrictions apply as for iter_lods()."""
+
+    return iter(self._get_lod_index()[1])
 
   def _iter_tree(self, lod, cvs_branch, start_id):
     """Iterate over the tree that starts at the specified line of development.
@@ -312,38 +318,78 @@ class CVSFileItems(object):
 
     yield LODItems(lod, cvs_branch, cvs_revisions, cvs_branches, cvs_tags)
 
-  def iter_lods(self):
+  def _iter_lods_live(self):
     """Iterate over LinesOfDevelopment in this file, in depth-first order.
 
     For each LOD, yield an LODItems instance.  The traversal starts at
     each root node but returns the LODs in depth-first order.
 
-    It is allowed to modify the CVSFileItems instance while the
-    traversal is occurring, but only in ways that don't affect the
-    tree structure above (i.e., towards the trunk from) the current
-    LOD."""
+    The LODItems are computed as the traversal proceeds, so it is
+    allowed to modify the CVSFileItems instance while the traversal is
+    occurring, but only in ways that don't affect the tree structure
+    above (i.e., towards the trunk from) the current LOD.  Such
+    modifications are reflected in the LODItems generated later."""
 
     # Make a list out of root_ids so that callers can change it:
     for id in list(self.root_ids):
-      cvs_item = self[id]
-      if isinstance(cvs_item, CVSRevision):
-        # This LOD doesn't have a CVSBranch associated with it.
-        # Either it is Trunk, or it is a branch whose CVSBranch has
-        # been deleted.
-        lod = cvs_item.lod
-        cvs_branch = None
-      elif isinstance(cvs_item, CVSBranch):
-        # This is a Branch that has been severed from the rest of the
-        # tree.
-        lod = cvs_item.symbol
-        id = cvs_item.next_id
-        cvs_branch = cvs_item
-      else:
-        raise InternalError('Unexpected root item: %s' % (cvs_item,))
-
+      (lod, cvs_branch, id) = self._get_root(id)
       for lod_items in self._iter_tree(lod, cvs_branch, id):
         yield lod_items
 
+  def _get_root(self, id):
+    """Return (lod, cvs_branch, id) for the root item with id ID.
+
+    LOD is the LOD rooted at ID, CVS_BRANCH is its CVSBranch or None,
+    and ID is the id of its first CVSRevision or None, as needed by
+    _iter_tree()."""
+
+    cvs_item = self[id]
+    if isinstance(cvs_item, CVSRevision):
+      # This LOD doesn't have a CVSBranch associated with it.
+      # Either it is Trunk, or it is a branch whose CVSBranch has
+      # been deleted.
+      return (cvs_item.lod, None, id)
+    elif isinstance(cvs_item, CVSBranch):
+      # This is a Branch that has been severed from the rest of the
+      # tree.
+      return (cvs_item.symbol, cvs_item, cvs_item.next_id)
+    else:
+      raise InternalError('Unexpected root item: %s' % (cvs_item,))
+
+  def _get_lod_index(self):
+    """Return the LOD index, computing it if necessary.
+
+    Return a tuple (lods, root_lods), where LODS is a list of the
+    LODItems for all LODs in the order generated by _iter_lods_live()
+    and ROOT_LODS is a list of the LODItems for the root LODs."""
+
+    if self._lod_index is None:
+      lods = []
+      root_lods = []
+      for id in self.root_ids:
+        (lod, cvs_branch, id) = self._get_root(id)
+        lods.extend(self._iter_tree(lod, cvs_branch, id))
+        # _iter_tree() generates the LOD where it started last:
+        root_lods.append(lods[-1])
+      self._lod_index = (lods, root_lods)
+
+    return self._lod_index
+
+  def iter_lods(self):
+    """Iterate over LinesOfDevelopment in this file, in depth-first order.
+
+    For each LOD, yield an LODItems instance.  The traversal starts at
+    each root node but returns the LODs in depth-first order.
+
+    The LODItems are computed once and then reused until the tree
+    structure is changed, so neither the LODItems nor the tree
+    structure may be modified during the iteration, except in ways
+    that only affect LODs that have already been generated (i.e., in
+    the direction away from the trunk).  Use _iter_lods_live() to
+    iterate while making other modifications."""
+
+    return iter(self._get_lod_index()[0])
+
   def iter_deltatext_ancestors(self, cvs_rev):
     """Generate the delta-dependency ancestors of CVS_REV.
 
@@ -695,6 +741,13 @@ class CVSFileItems(object):
     revision."""
 
     for lod_items in self.iter_lods():
+      if self._is_unneeded_initial_branch_delete(lod_items, metadata_db):
+        break
+    else:
+      # There is nothing to do, so the LOD index remains valid.
+      return
+
+    for lod_items in self._iter_lods_live():
       if self._is_unneeded_initial_branch_delete(lod_items, metadata_db):
         cvs_revision = lod_items.cvs_revisions[0]
         logger.debug(
@@ -803,6 +856,7 @@ class CVSFileItems(object):
         rev_1_2 = self.get(last_rev.ntdbr_next_id)
 
         self._sever_branch(lod_items)
+        self._invalidate_lod_index()
 
         if rev_1_1 is not None:
           rev_1_1.next_id = first_rev.id
@@ -844,7 +898,7 @@ class CVSFileItems(object):
     """Delete all tags and branches."""
 
     ntdbr_excluded = False
-    for lod_items in self.iter_lods():
+    for lod_items in self._iter_lods_live():
       for cvs_tag in lod_items.cvs_tags[:]:
         self._exclude_tag(cvs_tag)
         lod_items.cvs_tags.remove(cvs_tag)
@@ -860,8 +914,21 @@ class CVSFileItems(object):
   def filter_excluded_symbols(self):
     """Delete any excluded symbols and references to them."""
 
-    ntdbr_excluded = False
     for lod_items in self.iter_lods():
+      if isinstance(lod_items.lod, ExcludedSymbol):
+        break
+      for cvs_tag in lod_items.cvs_tags:
+        if isinstance(cvs_tag.symbol, ExcludedSymbol):
+          break
+      else:
+        continue
+      break
+    else:
+      # There is nothing to do, so the LOD index remains valid.
+      return
+
+    ntdbr_excluded = False
+    for lod_items in self._iter_lods_live():
       # Delete any excluded tags:
       for cvs_tag in lod_items.cvs_tags[:]:
         if isinstance(cvs_tag.symbol, ExcludedSymbol):
@@ -971,6 +1038,7 @@ class CVSFileItems(object):
     logger.debug('Grafting %s from %s (on %s) onto %s' % (
                 cvs_tag, source, source.lod, parent,))
     # Switch parent:
+    self._invalidate_lod_index()
     source.tag_ids.remove(cvs_tag.id)
     parent.tag_ids.append(cvs_tag.id)
     cvs_tag.source_lod = parent.symbol
@@ -1020,6 +1088,7 @@ class CVSFileItems(object):
     logger.debug('Grafting %s from %s (on %s) onto %s' % (
                 cvs_branch, source, source.lod, parent,))
     # Switch parent:
+    self._invalidate_lod_index()
     source.branch_ids.remove(cvs_branch.id)
     parent.branch_ids.append(cvs_branch.id)
     cvs_branch.source_lod = parent.symbol
@@ -48,12 +48,36 @@ CVSItem
       |
       +--CVSTagNoop
 
+To save memory, CVSItems that are unpickled store their lists of ids
+and symbols as tuples (so that empty ones all share the same empty
+tuple) and their revision and branch numbers as interned strings.
+Such instances must not be modified until make_mutable() has been
+called on them; CVSFileItems does this for the items that it holds.
+
 """
 
 
 from cvs2svn_lib.context import Ctx
 
 
+def _freeze(l):
+  """Return the list L as a tuple, or None if L is None."""
+
+  if l is None:
+    return None
+  else:
+    return tuple(l)
+
+
+def _thaw(t):
+  """Return the tuple T as a list, or None if T is None."""
+
+  if t is None:
+    return None
+  else:
+    return list(t)
+
+
 class CVSItem(object):
   __slots__ = [
       'id',
@@ -81,6 +105,14 @@ class CVSItem(object):
   def __setstate__(self, data):
     raise NotImplementedError()
 
+  def make_mutable(self):
+    """Make the members of this instance modifiable again.
+
+    Unpickled instances hold some of their members in a read-only
+    compact form; convert them back to their original types."""
+
+    pass
+
   def get_svn_path(self):
     """Return the SVN path associated with this CVSItem."""
 
@@ -308,18 +340,31 @@ class CVSRevision(CVSItem):
     (self.id, cvs_file_id,
      self.timestamp, self.metadata_id,
      self.prev_id, self.next_id,
-     self.rev,
+     rev,
      self.deltatext_exists,
      lod_id,
      self.first_on_branch_id,
      self.ntdbr,
      self.ntdbr_prev_id, self.ntdbr_next_id,
-     self.tag_ids, self.branch_ids, self.branch_commit_ids,
-     self.opened_symbols, self.closed_symbols,
+     tag_ids, branch_ids, branch_commit_ids,
+     opened_symbols, closed_symbols,
      self.properties, self.properties_changed,
      self.revision_reader_token) = data
     self.cvs_file = Ctx()._cvs_path_db.get_path(cvs_file_id)
+    self.rev = intern(rev)
     self.lod = Ctx()._symbol_db.get_symbol(lod_id)
+    self.tag_ids = tuple(tag_ids)
+    self.branch_ids = tuple(branch_ids)
+    self.branch_commit_ids = tuple(branch_commit_ids)
+    self.opened_symbols = _freeze(opened_symbols)
+    self.closed_symbols = _freeze(closed_symbols)
+
+  def make_mutable(self):
+    self.tag_ids = list(self.tag_ids)
+    self.branch_ids = list(self.branch_ids)
+    self.branch_commit_ids = list(self.branch_commit_ids)
+    self.opened_symbols = _thaw(self.opened_symbols)
+    self.closed_symbols = _thaw(self.closed_symbols)
 
   def get_properties(self):
     """Return all of the properties needed for this CVSRevision.
@@ -775,15 +820,27 @@ class CVSBranch(CVSSymbol):
   def __setstate__(self, data):
     (
         self.id, cvs_file_id,
-        symbol_id, self.branch_number,
+        symbol_id, branch_number,
         source_lod_id, self.source_id, self.next_id,
-        self.tag_ids, self.branch_ids,
-        self.opened_symbols,
+        tag_ids, branch_ids,
+        opened_symbols,
         self.revision_reader_token,
         ) = data
     self.cvs_file = Ctx()._cvs_path_db.get_path(cvs_file_id)
     self.symbol = Ctx()._symbol_db.get_symbol(symbol_id)
+    if branch_number is not None:
+      # (It is None for CVSBranches that were converted from CVSTags.)
+      branch_number = intern(branch_number)
+    self.branch_number = branch_number
     self.source_lod = Ctx()._symbol_db.get_symbol(source_lod_id)
+    self.tag_ids = tuple(tag_ids)
+    self.branch_ids = tuple(branch_ids)
+    self.opened_symbols = _freeze(opened_symbols)
+
+  def make_mutable(self):
+    self.tag_ids = list(self.tag_ids)
+    self.branch_ids = list(self.branch_ids)
+    self.opened_symbols = _thaw(self.opened_symbols)
 
   def get_pred_ids(self):
     return set([self.source_id])
@@ -56,6 +56,8 @@ class CVSPath(object):
       'basename',
       'ordinal',
       'filename',
+      # CVSPathDatabase keeps weak references to CVSPath instances:
+      '__weakref__',
       ]
 
   def __init__(self, id, project, parent_directory, basename):
@@ -78,10 +80,11 @@ class CVSPath(object):
   def __setstate__(self, state):
     (
         self.id, project_id,
-        self.parent_directory, self.basename,
+        self.parent_directory, basename,
         self.ordinal,
         ) = state
     self.project = Ctx()._projects[project_id]
+    self.basename = intern(basename)
     self.filename = os.path.normpath(self._calculate_filename())
 
   def get_filename(self):
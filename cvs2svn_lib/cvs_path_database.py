@@ -17,12 +17,44 @@
 """This module contains database facilities used by cvs2svn."""
 
 
+import struct
+import mmap
+import weakref
 import cPickle
+from collections import deque
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.cvs_path import CVSFile
+from cvs2svn_lib.cvs_path import CVSDirectory
+from cvs2svn_lib.instrumentation import counters
+
+
+# The file starts with a header (magic, number of records, offset of
+# the pool):
+_HEADER_FORMAT = '=8sIQ'
+_HEADER_LEN = struct.calcsize(_HEADER_FORMAT)
+_MAGIC = 'CVSPATH1'
+
+# Each record contains (flags, project_id, parent_id, ordinal,
+# file_size, basename_offset, basename_len, extra_offset, extra_len).
+# The offsets are relative to the start of the pool.  For a CVSFile,
+# the extra data are the pickled (mode, description, properties); for
+# a CVSDirectory, they are the pickled empty_subdirectory_ids (or
+# empty if there are none).
+_RECORD_FORMAT = '=BIIIQQIQI'
+_RECORD_LEN = struct.calcsize(_RECORD_FORMAT)
+
+# Bits in the flags field of a record.  A record whose flags are zero
+# is unused:
+_EXISTS = 0x01
+_IS_FILE = 0x02
+_IN_ATTIC = 0x04
+_EXECUTABLE = 0x08
+_HAS_PARENT = 0x10
 
 
 class CVSPathDatabase:
@@ -31,7 +63,21 @@ class CVSPathDatabase:
   All RCS files within every CVS project repository are recorded here
   as CVSFile instances, and all directories within every CVS project
   repository (including empty directories) are recorded here as
-  CVSDirectory instances."""
+  CVSDirectory instances.
+
+  The database is written as a table of fixed-length records indexed
+  by id, followed by a pool containing the basenames and the
+  variable-length members (each distinct value stored only once).  In
+  DB_OPEN_READ mode the file is memory-mapped and CVSPath instances
+  are only created when they are requested.  Because CVSPaths are
+  compared by identity, instances that are still referenced elsewhere
+  are found via a weak map, so that there is never more than one
+  instance for an id.  Additionally, the CACHE_SIZE most recently
+  created instances are kept alive."""
+
+  # The number of recently created CVSPath instances to keep alive in
+  # DB_OPEN_READ mode:
+  CACHE_SIZE = 20000
 
   def __init__(self, mode):
     """Initialize an instance, opening database in MODE (where MODE is
@@ -39,16 +85,30 @@ class CVSPathDatabase:
 
     self.mode = mode
 
-    # A map { id : CVSPath }
-    self._cvs_paths = {}
-
     if self.mode == DB_OPEN_NEW:
-      pass
+      # A map { id : CVSPath }
+      self._cvs_paths = {}
     elif self.mode == DB_OPEN_READ:
-      f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'rb')
-      cvs_paths = cPickle.load(f)
-      for cvs_path in cvs_paths:
-        self._cvs_paths[cvs_path.id] = cvs_path
+      # A map { id : CVSPath } containing the instances that are still
+      # in use:
+      self._cvs_paths = weakref.WeakValueDictionary()
+
+      # The most recently created instances, oldest first:
+      self._recent = deque()
+
+      self._f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'rb')
+      self._mmap = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+      (magic, self._limit, self._pool_offset) = struct.unpack(
+          _HEADER_FORMAT, self._mmap[:_HEADER_LEN]
+          )
+      if magic != _MAGIC:
+        raise RuntimeError(
+            'Unrecognized format of %s' % (config.CVS_PATHS_DB,)
+            )
+
+      # The number of CVSPath instances that were created from records:
+      self._loads = 0
+      counters.register(self)
     else:
       raise RuntimeError('Invalid mode %r' % self.mode)
 
@@ -61,19 +121,167 @@ class CVSPathDatabase:
     self._cvs_paths[cvs_path.id] = cvs_path
 
   def itervalues(self):
-    for value in self._cvs_paths.itervalues():
-      yield value
+    if self.mode == DB_OPEN_NEW:
+      for value in self._cvs_paths.itervalues():
+        yield value
+    else:
+      for id in xrange(self._limit):
+        if self._get_flags(id):
+          yield self.get_path(id)
+
+  def _get_flags(self, id):
+    offset = _HEADER_LEN + id * _RECORD_LEN
+    return ord(self._mmap[offset])
+
+  def _get_pool_string(self, offset, length):
+    start = self._pool_offset + offset
+    return self._mmap[start:start + length]
+
+  def _load_path(self, id):
+    """Create and return the CVSPath instance for ID from its record."""
+
+    if not 0 <= id < self._limit:
+      raise KeyError(id)
+    offset = _HEADER_LEN + id * _RECORD_LEN
+    (
+        flags, project_id, parent_id, ordinal, file_size,
+        basename_offset, basename_len, extra_offset, extra_len,
+        ) = struct.unpack(
+            _RECORD_FORMAT, self._mmap[offset:offset + _RECORD_LEN]
+            )
+    if not flags:
+      raise KeyError(id)
+
+    project = Ctx()._projects[project_id]
+    if flags & _HAS_PARENT:
+      parent_directory = self.get_path(parent_id)
+    else:
+      parent_directory = None
+    # Many files and directories have the same name:
+    basename = intern(self._get_pool_string(basename_offset, basename_len))
+    if extra_len:
+      extra = cPickle.loads(self._get_pool_string(extra_offset, extra_len))
+    else:
+      extra = None
+
+    if flags & _IS_FILE:
+      (mode, description, properties) = extra
+      cvs_path = CVSFile(
+          id, project, parent_directory, basename,
+          bool(flags & _IN_ATTIC), bool(flags & _EXECUTABLE),
+          file_size, mode, description,
+          )
+      cvs_path.properties = properties
+    else:
+      cvs_path = CVSDirectory(id, project, parent_directory, basename)
+      # Paths that are read from the database are not modified, so
+      # this list can be stored more compactly as a tuple:
+      if extra is None:
+        cvs_path.empty_subdirectory_ids = ()
+      else:
+        cvs_path.empty_subdirectory_ids = tuple(extra)
+    cvs_path.ordinal = ordinal
+
+    self._loads += 1
+    return cvs_path
 
   def get_path(self, id):
     """Return the CVSPath with the specified ID."""
 
-    return self._cvs_paths[id]
+    try:
+      return self._cvs_paths[id]
+    except KeyError:
+      if self.mode == DB_OPEN_NEW:
+        raise
+
+    cvs_path = self._load_path(id)
+    self._cvs_paths[id] = cvs_path
+    self._recent.append(cvs_path)
+    if len(self._recent) > self.CACHE_SIZE:
+      self._recent.popleft()
+    return cvs_path
+
+  def _write(self):
+    """Write the CVSPaths in self._cvs_paths to the database file."""
+
+    # The strings making up the pool, and its total length:
+    pool = []
+    pool_len = 0
+
+    # A map {string : offset} of the strings that are in the pool:
+    pool_offsets = {}
+
+    if self._cvs_paths:
+      limit = max(self._cvs_paths.iterkeys()) + 1
+    else:
+      limit = 0
+
+    f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'wb')
+    f.write(struct.pack(
+        _HEADER_FORMAT, _MAGIC, limit, _HEADER_LEN + limit * _RECORD_LEN
+        ))
+    empty_record = '\0' * _RECORD_LEN
+    for id in xrange(limit):
+      cvs_path = self._cvs_paths.get(id)
+      if cvs_path is None:
+        f.write(empty_record)
+        continue
+
+      flags = _EXISTS
+      if cvs_path.parent_directory is None:
+        parent_id = 0
+      else:
+        flags |= _HAS_PARENT
+        parent_id = cvs_path.parent_directory.id
+      if isinstance(cvs_path, CVSFile):
+        flags |= _IS_FILE
+        if cvs_path._in_attic:
+          flags |= _IN_ATTIC
+        if cvs_path.executable:
+          flags |= _EXECUTABLE
+        file_size = cvs_path.file_size
+        extra = cPickle.dumps(
+            (cvs_path.mode, cvs_path.description, cvs_path.properties), -1
+            )
+      else:
+        file_size = 0
+        if cvs_path.empty_subdirectory_ids:
+          extra = cPickle.dumps(cvs_path.empty_subdirectory_ids, -1)
+        else:
+          extra = ''
+
+      locations = []
+      for s in [cvs_path.basename, extra]:
+        try:
+          offset = pool_offsets[s]
+        except KeyError:
+          offset = pool_offsets[s] = pool_len
+          pool.append(s)
+          pool_len += len(s)
+        locations.extend([offset, len(s)])
+
+      f.write(struct.pack(
+          _RECORD_FORMAT, flags, cvs_path.project.id, parent_id,
+          cvs_path.ordinal, file_size, *locations
+          ))
+
+    for s in pool:
+      f.write(s)
+    f.close()
+
+  def get_counters(self):
+    return {'CVSPathDatabase paths loaded' : self._loads}
 
   def close(self):
     if self.mode == DB_OPEN_NEW:
-      f = open(artifact_manager.get_temp_file(config.CVS_PATHS_DB), 'wb')
-      cPickle.dump(self._cvs_paths.values(), f, -1)
-      f.close()
+      self._write()
+    else:
+      counters.unregister(self)
+      self._recent = None
+      self._mmap.close()
+      self._mmap = None
+      self._f.close()
+      self._f = None
 
     self._cvs_paths = None
 
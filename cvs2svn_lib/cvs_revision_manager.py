@@ -19,17 +19,22 @@
 
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import canonicalize_eol
+from cvs2svn_lib.common import CanonicalizeEOLStream
 from cvs2svn_lib.process import check_command_runs
 from cvs2svn_lib.process import get_command_output
+from cvs2svn_lib.process import PipeStream
 from cvs2svn_lib.process import CommandFailedException
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.revision_manager import RevisionReader
 from cvs2svn_lib.apple_single_filter import get_maybe_apple_single
+from cvs2svn_lib.apple_single_filter import get_maybe_apple_single_stream
 
 
 class CVSRevisionReader(RevisionReader):
   """A RevisionReader that reads the contents via CVS."""
 
+  supports_worker_processes = True
+
   # Different versions of CVS support different global options.  Here
   # are the global options that we try to use, in order of decreasing
   # preference:
@@ -96,7 +101,7 @@ class CVSRevisionReader(RevisionReader):
         self.cvs_executable,
         )
 
-  def get_content(self, cvs_rev):
+  def _get_pipe_command(self, cvs_rev):
     project = cvs_rev.cvs_file.project
     pipe_cmd = [
         self.cvs_executable
@@ -109,7 +114,10 @@ class CVSRevisionReader(RevisionReader):
     if cvs_rev.get_property('_keyword_handling') == 'collapsed':
       pipe_cmd.append('-kk')
     pipe_cmd.append(project.cvs_module + cvs_rev.cvs_path)
-    data = get_command_output(pipe_cmd)
+    return pipe_cmd
+
+  def get_content(self, cvs_rev):
+    data = get_command_output(self._get_pipe_command(cvs_rev))
 
     if Ctx().decode_apple_single:
       # Insert a filter to decode any files that are in AppleSingle
@@ -122,4 +130,16 @@ class CVSRevisionReader(RevisionReader):
 
     return data
 
+  def get_content_stream(self, cvs_rev):
+    stream = PipeStream(self._get_pipe_command(cvs_rev))
+
+    if Ctx().decode_apple_single:
+      stream = get_maybe_apple_single_stream(stream)
+
+    eol_fix = cvs_rev.get_property('_eol_fix')
+    if eol_fix:
+      stream = CanonicalizeEOLStream(stream, eol_fix)
+
+    return stream
+
 
@@ -20,6 +20,8 @@
 import sys
 import os
 import cPickle
+import struct
+import zlib
 
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_WRITE
@@ -27,7 +29,9 @@ from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import error_prefix
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 from cvs2svn_lib.record_table import FileOffsetPacker
+from cvs2svn_lib.record_table import BlockPositionPacker
 from cvs2svn_lib.record_table import RecordTable
 
 
@@ -199,31 +203,63 @@ class IndexedDatabase:
   advantage that one can create a modified version of a database that
   shares the main data file with an old version by copying the index
   file.  But it has the disadvantage that space is wasted whenever
-  objects are written multiple times."""
-
-  def __init__(self, filename, index_filename, mode, serializer=None):
+  objects are written multiple times.  If much of the space is wasted,
+  compact() can be used to rewrite the database without the dead
+  records."""
+
+  def __init__(
+        self, filename, index_filename, mode, serializer=None,
+        track_dead_records=False,
+        ):
     """Initialize an IndexedDatabase, writing the serializer if necessary.
 
     SERIALIZER is only used if MODE is DB_OPEN_NEW; otherwise the
-    serializer is read from the file."""
+    serializer is read from the file.  If TRACK_DEAD_RECORDS is True,
+    count the live and dead records so that get_dead_fraction() can be
+    used; this costs an index lookup for every write."""
 
     self.filename = filename
     self.index_filename = index_filename
     self.mode = mode
-    if self.mode == DB_OPEN_NEW:
+    self._track_dead_records = track_dead_records
+
+    # The number of records that were read and written:
+    self._reads = 0
+    self._writes = 0
+
+    # The number of bytes read from and written to the main file:
+    self._bytes_read = 0
+    self._bytes_written = 0
+
+    self._open(mode, serializer)
+    counters.register(self)
+
+  def _get_index_packer(self):
+    """Return the Packer to be used for the index table."""
+
+    return FileOffsetPacker()
+
+  def _open(self, mode, serializer=None):
+    """Open the files in MODE, as described for __init__()."""
+
+    if mode == DB_OPEN_NEW:
       self.f = open(self.filename, 'wb+')
-    elif self.mode == DB_OPEN_WRITE:
+    elif mode == DB_OPEN_WRITE:
       self.f = open(self.filename, 'rb+')
-    elif self.mode == DB_OPEN_READ:
+    elif mode == DB_OPEN_READ:
       self.f = open(self.filename, 'rb')
     else:
-      raise RuntimeError('Invalid mode %r' % self.mode)
+      raise RuntimeError('Invalid mode %r' % mode)
 
+    # The cache of the index table determines how often a lookup needs
+    # an extra disk access, so its hits and misses are reported as
+    # those of this database:
     self.index_table = RecordTable(
-        self.index_filename, self.mode, FileOffsetPacker()
+        self.index_filename, mode, self._get_index_packer(),
+        counter_prefix='IndexedDatabase index',
         )
 
-    if self.mode == DB_OPEN_NEW:
+    if mode == DB_OPEN_NEW:
       assert serializer is not None
       self.serializer = serializer
       cPickle.dump(self.serializer, self.f, -1)
@@ -236,27 +272,53 @@ class IndexedDatabase:
     self.fp = self.f.tell()
     self.eofp = self.fp
 
+    if self._track_dead_records:
+      # The number of records in the index table, and the number of
+      # records that have been overwritten or deleted since the
+      # database was opened:
+      self._live_records = 0
+      if mode != DB_OPEN_NEW:
+        for index in self.index_table.iterkeys():
+          self._live_records += 1
+      self._dead_records = 0
+
+  def _count_write(self, index):
+    """Update the record counts for a write of the record for INDEX."""
+
+    if self.index_table.get(index) is None:
+      self._live_records += 1
+    else:
+      self._dead_records += 1
+
   def __setitem__(self, index, item):
     """Write ITEM into the database indexed by INDEX."""
 
     # Make sure we're at the end of the file:
     if self.fp != self.eofp:
       self.f.seek(self.eofp)
+    if self._track_dead_records:
+      self._count_write(index)
     self.index_table[index] = self.eofp
     s = self.serializer.dumps(item)
     self.f.write(s)
     self.eofp += len(s)
     self.fp = self.eofp
+    self._writes += 1
+    self._bytes_written += len(s)
 
   def _fetch(self, offset):
     if self.fp != offset:
       self.f.seek(offset)
+    self._reads += 1
 
-    # There is no easy way to tell how much data will be read, so just
-    # indicate that we don't know the current file pointer:
+    # Indicate that we don't know the current file pointer.  (It could
+    # be determined after reading, but a read must not be followed by a
+    # write without an intervening seek().)
     self.fp = None
 
-    return self.serializer.loadf(self.f)
+    item = self.serializer.loadf(self.f)
+    self._bytes_read += self.f.tell() - offset
+    return item
 
   def iterkeys(self):
     return self.index_table.iterkeys()
@@ -295,13 +357,96 @@ class IndexedDatabase:
   def __delitem__(self, index):
     # We don't actually free the data in self.f.
     del self.index_table[index]
+    if self._track_dead_records:
+      self._live_records -= 1
+      self._dead_records += 1
 
-  def close(self):
+  def get_dead_fraction(self):
+    """Return the fraction of the records in the file that are dead.
+
+    Only records that were overwritten or deleted since the database
+    was opened are counted as dead.  The database must have been
+    opened with TRACK_DEAD_RECORDS set."""
+
+    if not self._track_dead_records:
+      raise RuntimeError('Dead records are not tracked for %s' % (self,))
+
+    if self._dead_records == 0:
+      return 0.0
+    return float(self._dead_records) / (
+        self._live_records + self._dead_records
+        )
+
+  def _create_new(self, filename, index_filename):
+    """Create an empty database like this one in the specified files."""
+
+    return IndexedDatabase(
+        filename, index_filename, DB_OPEN_NEW, self.serializer
+        )
+
+  def compact(self, indexes=None):
+    """Rewrite the database, omitting dead records.
+
+    The live records are written in the order of INDEXES, which must
+    list each index that is present in the database exactly once.  By
+    default, they are written in index order, which is the order in
+    which itervalues() reads them.  The index table is rebuilt to
+    match, and the database remains open for reading and writing."""
+
+    if self.mode == DB_OPEN_READ:
+      raise RuntimeError('Cannot compact a database opened read-only')
+
+    if indexes is None:
+      indexes = list(self.index_table.iterkeys())
+
+    old_size = self.eofp
+    new_filename = self.filename + '.new'
+    new_index_filename = self.index_filename + '.new'
+    new_db = self._create_new(new_filename, new_index_filename)
+    for index in indexes:
+      new_db[index] = self[index]
+    new_db.close()
+
+    self._close_files()
+    for (filename, new_filename) in [
+          (self.filename, new_filename),
+          (self.index_filename, new_index_filename),
+          ]:
+      # os.rename() cannot overwrite files on all platforms:
+      os.unlink(filename)
+      os.rename(new_filename, filename)
+    self._open(DB_OPEN_WRITE)
+
+    logger.verbose(
+        'Compacted %s from %d to %d bytes.' % (self, old_size, self.eofp,)
+        )
+    counters.add('IndexedDatabase bytes compacted away', old_size - self.eofp)
+
+  def flush(self):
+    """Write any buffered data to disk."""
+
+    self.f.flush()
+    self.index_table.flush()
+
+  def _close_files(self):
     self.index_table.close()
     self.index_table = None
     self.f.close()
     self.f = None
 
+  def get_counters(self):
+    return {
+        'IndexedDatabase reads' : self._reads,
+        'IndexedDatabase writes' : self._writes,
+        }
+
+  def get_file_io(self):
+    return {self.filename : (self._bytes_read, self._bytes_written)}
+
+  def close(self):
+    self._close_files()
+    counters.unregister(self)
+
   def __str__(self):
     return 'IndexedDatabase(%r)' % (self.filename,)
 
@@ -320,3 +465,183 @@ class IndexedStore(IndexedDatabase):
     self[item.id] = item
 
 
+class BlockCompressedIndexedDatabase(IndexedDatabase):
+  """An IndexedDatabase whose records are compressed in blocks.
+
+  Consecutive records are collected into blocks of about BLOCK_SIZE
+  bytes, and each block is compressed as a whole with zlib at the fast
+  COMPRESSION_LEVEL.  This compresses small records much better than
+  compressing each record separately (as CompressingSerializer does),
+  because similar records share a compression context.
+
+  After the pickled serializer, the main file consists of a sequence
+  of blocks, each of which is a 4-byte length followed by the
+  compressed data.  The index table maps each index to the file offset
+  of the block containing the record and the offset of the record
+  within the uncompressed block.  The last BLOCK_CACHE_SIZE blocks
+  that were read are kept decompressed in memory.
+
+  The block that is being filled is only written to the file when it
+  is full or when the database is closed, but its records can be read
+  in the meantime.  Its records are indexed with the offset where the
+  block will be written, namely the current end of the file."""
+
+  BLOCK_SIZE = 64 * 1024
+  COMPRESSION_LEVEL = 1
+  BLOCK_CACHE_SIZE = 8
+
+  BLOCK_HEADER_FORMAT = '=I'
+  BLOCK_HEADER_LEN = struct.calcsize(BLOCK_HEADER_FORMAT)
+
+  def __init__(
+        self, filename, index_filename, mode, serializer=None,
+        track_dead_records=False,
+        ):
+    # Block statistics:
+    self._block_cache_hits = 0
+    self._block_cache_misses = 0
+    self._uncompressed_bytes = 0
+    self._compressed_bytes = 0
+
+    IndexedDatabase.__init__(
+        self, filename, index_filename, mode, serializer,
+        track_dead_records,
+        )
+
+  def _get_index_packer(self):
+    return BlockPositionPacker()
+
+  def _open(self, mode, serializer=None):
+    IndexedDatabase._open(self, mode, serializer)
+
+    # The serialized records of the block that is being filled, and
+    # their total length:
+    self._block = []
+    self._block_len = 0
+
+    # A map {block_offset : data} of recently-read blocks, and a list
+    # of their offsets, least recently used first:
+    self._block_cache = {}
+    self._block_cache_order = []
+
+  def _write_block(self):
+    """Compress the pending block and write it to the end of the file."""
+
+    if not self._block:
+      return
+
+    data = ''.join(self._block)
+    compressed = zlib.compress(data, self.COMPRESSION_LEVEL)
+    if self.fp != self.eofp:
+      self.f.seek(self.eofp)
+    self.f.write(struct.pack(self.BLOCK_HEADER_FORMAT, len(compressed)))
+    self.f.write(compressed)
+    self.eofp += self.BLOCK_HEADER_LEN + len(compressed)
+    self._bytes_written += self.BLOCK_HEADER_LEN + len(compressed)
+    self.fp = self.eofp
+
+    self._uncompressed_bytes += len(data)
+    self._compressed_bytes += len(compressed)
+    self._block = []
+    self._block_len = 0
+
+  def __setitem__(self, index, item):
+    """Write ITEM into the database indexed by INDEX."""
+
+    if self._block_len >= self.BLOCK_SIZE:
+      self._write_block()
+    if self._track_dead_records:
+      self._count_write(index)
+    self.index_table[index] = (self.eofp, self._block_len)
+    s = self.serializer.dumps(item)
+    self._block.append(s)
+    self._block_len += len(s)
+    self._writes += 1
+
+  def _read_block(self, block_offset):
+    """Return the uncompressed contents of the block at BLOCK_OFFSET."""
+
+    try:
+      data = self._block_cache[block_offset]
+    except KeyError:
+      pass
+    else:
+      self._block_cache_hits += 1
+      if self._block_cache_order[-1] != block_offset:
+        self._block_cache_order.remove(block_offset)
+        self._block_cache_order.append(block_offset)
+      return data
+
+    if self.fp != block_offset:
+      self.f.seek(block_offset)
+    (length,) = struct.unpack(
+        self.BLOCK_HEADER_FORMAT, self.f.read(self.BLOCK_HEADER_LEN)
+        )
+    data = zlib.decompress(self.f.read(length))
+    self.fp = block_offset + self.BLOCK_HEADER_LEN + length
+    self._block_cache_misses += 1
+    self._bytes_read += self.BLOCK_HEADER_LEN + length
+
+    if len(self._block_cache_order) >= self.BLOCK_CACHE_SIZE:
+      del self._block_cache[self._block_cache_order.pop(0)]
+    self._block_cache[block_offset] = data
+    self._block_cache_order.append(block_offset)
+    return data
+
+  def _fetch(self, position):
+    (block_offset, record_offset) = position
+    self._reads += 1
+
+    if block_offset == self.eofp:
+      # The record is in the block that is being filled:
+      if len(self._block) > 1:
+        self._block = [''.join(self._block)]
+      data = self._block[0]
+    else:
+      data = self._read_block(block_offset)
+
+    # The serializers ignore any data following the serialized object:
+    return self.serializer.loads(data[record_offset:])
+
+  def _create_new(self, filename, index_filename):
+    return self.__class__(
+        filename, index_filename, DB_OPEN_NEW, self.serializer
+        )
+
+  def flush(self):
+    self._write_block()
+    IndexedDatabase.flush(self)
+
+  def get_counters(self):
+    retval = IndexedDatabase.get_counters(self)
+    retval.update({
+        'BlockCompressedIndexedDatabase block cache hits' :
+            self._block_cache_hits,
+        'BlockCompressedIndexedDatabase block cache misses' :
+            self._block_cache_misses,
+        'BlockCompressedIndexedDatabase uncompressed bytes' :
+            self._uncompressed_bytes,
+        'BlockCompressedIndexedDatabase compressed bytes' :
+            self._compressed_bytes,
+        })
+    return retval
+
+  def close(self):
+    self._write_block()
+    IndexedDatabase.close(self)
+
+  def __str__(self):
+    return 'BlockCompressedIndexedDatabase(%r)' % (self.filename,)
+
+
+class BlockCompressedIndexedStore(BlockCompressedIndexedDatabase):
+  """A BlockCompressedIndexedDatabase with an add() method.
+
+  See IndexedStore for more information."""
+
+  def add(self, item):
+    """Write ITEM into the database indexed by ITEM.id."""
+
+    self[item.id] = item
+
+
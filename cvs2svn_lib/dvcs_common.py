@@ -33,7 +33,7 @@ from cvs2svn_lib.cvs_item import CVSRevisionAdd
 from cvs2svn_lib.cvs_item import CVSRevisionChange
 from cvs2svn_lib.cvs_item import CVSRevisionDelete
 from cvs2svn_lib.cvs_item import CVSRevisionNoop
-from cvs2svn_lib.svn_revision_range import RevisionScores
+from cvs2svn_lib.svn_revision_range import RevisionCoverage
 from cvs2svn_lib.openings_closings import SymbolingsReader
 from cvs2svn_lib.repository_mirror import RepositoryMirror
 from cvs2svn_lib.output_option import OutputOption
@@ -202,6 +202,13 @@ class DVCSOutputOption(OutputOption):
     self._symbolings_reader = SymbolingsReader()
     self._mirror.open()
 
+  def get_checkpoint(self):
+    return self._mirror.get_checkpoint()
+
+  def resume(self, svn_rev_count, checkpoint):
+    self._symbolings_reader = SymbolingsReader()
+    self._mirror.resume(checkpoint)
+
   def cleanup(self):
     self._mirror.close()
     self._symbolings_reader.close()
@@ -240,15 +247,12 @@ class DVCSOutputOption(OutputOption):
         )
 
     for (lod, lod_range_map) in lod_ranges:
-      while lod_range_map:
-        revision_scores = RevisionScores(lod_range_map.values())
-        (source_lod, revnum, score) = revision_scores.get_best_revnum()
-        assert source_lod == lod
-        cvs_symbols = []
-        for (cvs_symbol, range) in lod_range_map.items():
-          if revnum in range:
-            cvs_symbols.append(cvs_symbol)
-            del lod_range_map[cvs_symbol]
+      # Greedily choose the revision that is the source of the most
+      # remaining symbols until all symbols are covered:
+      revision_coverage = RevisionCoverage(lod_range_map.items())
+      while revision_coverage:
+        (revnum, score) = revision_coverage.get_best_revnum()
+        cvs_symbols = revision_coverage.remove_covering(revnum)
         yield (lod, revnum, cvs_symbols)
 
   def _is_simple_copy(self, svn_commit, source_groups):
@@ -31,17 +31,33 @@ main program for several reasons:
   generated (git-fast-import doesn't care about their order).
 
 * The generate_blobs.py script runs in parallel to the main cvs2git
-  script, allowing benefits to be had from multiple CPUs.
+  script, allowing benefits to be had from multiple CPUs.  If
+  Ctx().jobs is greater than one, that many generate_blobs.py
+  processes are started, and each RCS file is handed to one of them
+  based on a hash of its filename.  Since the blob marks are chosen
+  by the main program, the processes can write their blobs to separate
+  files that are concatenated at the end.
+
+* Each generate_blobs.py process writes a blob only once for each
+  distinct file content.  The marks of the omitted duplicates are
+  recorded in a separate file (config.GIT_BLOB_ALIASES) that
+  GitRevisionMarkWriter uses to refer to the blob that was written
+  instead.
 
 """
 
 import sys
 import os
+import shutil
 import subprocess
+import zlib
 import cPickle as pickle
 
+from cvs2svn_lib import config
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_item import CVSRevisionDelete
 from cvs2svn_lib.revision_manager import RevisionCollector
 from cvs2svn_lib.key_generator import KeyGenerator
@@ -53,18 +69,53 @@ class ExternalBlobGenerator(RevisionCollector):
   def __init__(self, blob_filename):
     self.blob_filename = blob_filename
 
-  def start(self):
-    self._mark_generator = KeyGenerator()
-    logger.normal('Starting generate_blobs.py...')
-    self._popen = subprocess.Popen(
+  def register_artifacts(self, which_pass):
+    artifact_manager.register_temp_file(config.GIT_BLOB_ALIASES, which_pass)
+    for i in range(1, Ctx().jobs):
+      artifact_manager.register_temp_file(
+          config.GIT_BLOB_SHARD % (i,), which_pass
+          )
+      artifact_manager.register_temp_file(
+          config.GIT_BLOB_ALIASES_SHARD % (i,), which_pass
+          )
+
+  def _start_generator(self, blob_filename, alias_filename):
+    return subprocess.Popen(
         [
             sys.executable,
             os.path.join(os.path.dirname(__file__), 'generate_blobs.py'),
-            self.blob_filename,
+            blob_filename, alias_filename,
             ],
         stdin=subprocess.PIPE,
         )
 
+  def start(self):
+    self._mark_generator = KeyGenerator()
+
+    # A list of (blob_filename, alias_filename) to which the
+    # generate_blobs.py processes write.  The first process writes
+    # directly to the final files; the files of the others are
+    # appended to them in finish():
+    self._shard_filenames = [
+        (self.blob_filename,
+         artifact_manager.get_temp_file(config.GIT_BLOB_ALIASES),)
+        ] + [
+        (artifact_manager.get_temp_file(config.GIT_BLOB_SHARD % (i,)),
+         artifact_manager.get_temp_file(config.GIT_BLOB_ALIASES_SHARD % (i,)),)
+        for i in range(1, Ctx().jobs)
+        ]
+    if len(self._shard_filenames) == 1:
+      logger.normal('Starting generate_blobs.py...')
+    else:
+      logger.normal(
+          'Starting %d generate_blobs.py processes...'
+          % (len(self._shard_filenames),)
+          )
+    self._popens = [
+        self._start_generator(blob_filename, alias_filename)
+        for (blob_filename, alias_filename) in self._shard_filenames
+        ]
+
   def _process_symbol(self, cvs_symbol, cvs_file_items):
     """Record the original source of CVS_SYMBOL.
 
@@ -87,8 +138,12 @@ class ExternalBlobGenerator(RevisionCollector):
     # doesn't grow very large.  The default ASCII protocol is used so
     # that this works without changes on systems that distinguish
     # between text and binary files.
-    pickle.dump((cvs_file_items.cvs_file.filename, marks), self._popen.stdin)
-    self._popen.stdin.flush()
+    filename = cvs_file_items.cvs_file.filename
+    popen = self._popens[
+        (zlib.crc32(filename) & 0xffffffff) % len(self._popens)
+        ]
+    pickle.dump((filename, marks), popen.stdin)
+    popen.stdin.flush()
 
     # Now that all CVSRevisions' revision_reader_tokens are set,
     # iterate through symbols and set their tokens to those of their
@@ -100,14 +155,41 @@ class ExternalBlobGenerator(RevisionCollector):
         self._process_symbol(cvs_tag, cvs_file_items)
 
   def finish(self):
-    self._popen.stdin.close()
+    for popen in self._popens:
+      popen.stdin.close()
     logger.normal('Waiting for generate_blobs.py to finish...')
-    returncode = self._popen.wait()
-    if returncode:
-      raise FatalError(
-          'generate_blobs.py failed with return code %s.' % (returncode,)
-          )
-    else:
-      logger.normal('generate_blobs.py is done.')
+    returncodes = [popen.wait() for popen in self._popens]
+    self._popens = None
+    for returncode in returncodes:
+      if returncode:
+        raise FatalError(
+            'generate_blobs.py failed with return code %s.' % (returncode,)
+            )
+
+    if len(self._shard_filenames) > 1:
+      logger.normal('Concatenating the blob files...')
+      for i in range(2):
+        outfile = open(self._shard_filenames[0][i], 'ab')
+        for filenames in self._shard_filenames[1:]:
+          f = open(filenames[i], 'rb')
+          shutil.copyfileobj(f, outfile, 1024 * 1024)
+          f.close()
+        outfile.close()
+
+    logger.normal('generate_blobs.py is done.')
+
+
+def read_blob_aliases(filename):
+  """Return the map {mark : canonical_mark} stored in FILENAME.
+
+  FILENAME is an alias file written by generate_blobs.py."""
+
+  aliases = {}
+  f = open(filename, 'r')
+  for line in f:
+    (mark, canonical_mark) = line.split()
+    aliases[int(mark)] = int(canonical_mark)
+  f.close()
+  return aliases
 
 
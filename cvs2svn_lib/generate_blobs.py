@@ -17,7 +17,7 @@
 
 """Generate git blobs directly from RCS files.
 
-Usage: generate_blobs.py BLOBFILE
+Usage: generate_blobs.py BLOBFILE [ALIASFILE]
 
 To standard input should be written a series of pickles, each of which
 contains the following tuple:
@@ -33,6 +33,12 @@ program's standard input is opened in binary mode (e.g., using
 Python's '-u' option) or both can be in text mode *provided* that
 pickle protocol 0 is used.
 
+If ALIASFILE is specified, then a blob whose contents are identical to
+those of a blob that was already written is not written again.
+Instead, a line "MARK CANONICAL_MARK" is written to ALIASFILE, where
+CANONICAL_MARK is the mark of the blob that was written.  The SHA1
+digests of all blobs are kept in memory for this purpose.
+
 The program does most of its work in RAM, keeping at most one revision
 fulltext and one revision deltatext (plus perhaps one or two copies as
 scratch space) in memory at a time.  But there are times when the
@@ -48,6 +54,11 @@ import os
 import tempfile
 import cPickle as pickle
 
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(sys.argv[0])))
 
 from cvs2svn_rcsparse import Sink
@@ -126,9 +137,16 @@ class RevRecord(object):
 
 
 class WriteBlobSink(Sink):
-  def __init__(self, blobfile, marks):
+  def __init__(self, blobfile, marks, blob_digests=None, aliasfile=None):
     self.blobfile = blobfile
 
+    # A map {sha1_digest : mark} of the blobs that have been written
+    # (shared between the sinks for all RCS files), and the file to
+    # which aliases are written; or None if blobs are not to be
+    # deduplicated:
+    self.blob_digests = blob_digests
+    self.aliasfile = aliasfile
+
     # A map {rev : RevRecord} for all of the revisions whose fulltext
     # will still be needed:
     self.revrecs = {}
@@ -157,6 +175,27 @@ class WriteBlobSink(Sink):
       self.revrecs[rev] = revrec
       return revrec
 
+  def write_blob(self, revrec, text):
+    """Write TEXT as the blob for REVREC, unless it is a duplicate.
+
+    If a blob with the same contents has already been written, record
+    REVREC's mark as an alias of that blob's mark instead."""
+
+    if self.blob_digests is None:
+      revrec.write_blob(self.blobfile, text)
+      return
+
+    digest = sha1(text).digest()
+    canonical_mark = self.blob_digests.get(digest)
+    if canonical_mark is None:
+      self.blob_digests[digest] = revrec.mark
+      revrec.write_blob(self.blobfile, text)
+    else:
+      self.aliasfile.write('%s %s\n' % (revrec.mark, canonical_mark,))
+      # The fulltext was not written, so it will be written to
+      # fulltext_file if it is needed later:
+      revrec.mark = None
+
   def define_revision(self, rev, timestamp, author, state, branches, next):
     revrec = self[rev]
 
@@ -202,7 +241,7 @@ class WriteBlobSink(Sink):
       # fulltext is stored directly in the RCS file:
       assert self.last_revrec is None
       if revrec.mark is not None:
-        revrec.write_blob(self.blobfile, text)
+        self.write_blob(revrec, text)
       if revrec.is_needed():
         self.last_revrec = revrec
         self.last_rcsstream = RCSStream(text)
@@ -216,7 +255,7 @@ class WriteBlobSink(Sink):
               )
       self.last_rcsstream.apply_diff(text)
       if revrec.mark is not None:
-        revrec.write_blob(self.blobfile, self.last_rcsstream.get_text())
+        self.write_blob(revrec, self.last_rcsstream.get_text())
       if revrec.is_needed():
         self.last_revrec = revrec
       else:
@@ -240,7 +279,7 @@ class WriteBlobSink(Sink):
       base_revrec.refs.remove(rev)
       rcsstream.apply_diff(text)
       if revrec.mark is not None:
-        revrec.write_blob(self.blobfile, rcsstream.get_text())
+        self.write_blob(revrec, rcsstream.get_text())
       if revrec.is_needed():
         self.last_revrec = revrec
         self.last_rcsstream = rcsstream
@@ -251,16 +290,28 @@ class WriteBlobSink(Sink):
 
 
 def main(args):
-  [blobfilename] = args
+  if len(args) == 1:
+    [blobfilename] = args
+    aliasfile = None
+    blob_digests = None
+  else:
+    [blobfilename, aliasfilename] = args
+    aliasfile = open(aliasfilename, 'w')
+    blob_digests = {}
   blobfile = open(blobfilename, 'w+b')
   while True:
     try:
       (rcsfile, marks) = pickle.load(sys.stdin)
     except EOFError:
       break
-    parse(open(rcsfile, 'rb'), WriteBlobSink(blobfile, marks))
+    parse(
+        open(rcsfile, 'rb'),
+        WriteBlobSink(blobfile, marks, blob_digests, aliasfile),
+        )
 
   blobfile.close()
+  if aliasfile is not None:
+    aliasfile.close()
 
 
 if __name__ == '__main__':
@@ -22,19 +22,42 @@ For information about the format allowed by git-fast-import, see:
 
 """
 
+import os
+import sys
 import bisect
 import time
-
+from collections import deque
+
+try:
+  import multiprocessing
+except ImportError:
+  # Not available before Python 2.6:
+  multiprocessing = None
+
+from cvs2svn_lib import config
+from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.common import FatalException
+from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.instrumentation import counters
 from cvs2svn_lib.symbol import Trunk
 from cvs2svn_lib.symbol import Branch
 from cvs2svn_lib.symbol import Tag
+from cvs2svn_lib.cvs_item import CVSRevisionAdd
+from cvs2svn_lib.cvs_item import CVSRevisionChange
 from cvs2svn_lib.cvs_item import CVSSymbol
+from cvs2svn_lib.cvs_item_database import IndexedCVSItemStore
+from cvs2svn_lib.svn_commit import SVNRevisionCommit
+from cvs2svn_lib.external_blob_generator import ExternalBlobGenerator
+from cvs2svn_lib.external_blob_generator import read_blob_aliases
 from cvs2svn_lib.dvcs_common import DVCSOutputOption
 from cvs2svn_lib.dvcs_common import MirrorUpdater
+from cvs2svn_lib.output_option import reopen_output_file
 from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.git_pack_writer import FastImportPackfileWriter
 
 
 class ExpectedDirectoryError(Exception):
@@ -55,6 +78,18 @@ class GitRevisionWriter(MirrorUpdater):
     super(GitRevisionWriter, self).start(mirror)
     self.f = f
 
+  def get_checkpoint(self):
+    """Return a picklable object describing the state of this writer."""
+
+    return None
+
+  def resume(self, mirror, f, checkpoint):
+    """Like start(), but continue after an OutputPass checkpoint.
+
+    CHECKPOINT is an object returned by get_checkpoint()."""
+
+    self.start(mirror, f)
+
   def _modify_file(self, cvs_item, post_commit):
     raise NotImplementedError()
 
@@ -74,26 +109,133 @@ class GitRevisionWriter(MirrorUpdater):
     super(GitRevisionWriter, self).branch_file(cvs_symbol)
     self._modify_file(cvs_symbol, post_commit=False)
 
+  def branch_files(self, cvs_symbols):
+    """Call branch_file() for each of CVS_SYMBOLS, in order."""
+
+    for cvs_symbol in cvs_symbols:
+      self.branch_file(cvs_symbol)
+
   def finish(self):
     super(GitRevisionWriter, self).finish()
     del self.f
 
 
+class GitRevisionReplayWriter(GitRevisionWriter):
+  """Only update the mirror; don't write any file contents.
+
+  This writer is used while replaying the commits that were output by
+  an earlier conversion (see GitOutputOption.begin_replay())."""
+
+  def _modify_file(self, cvs_item, post_commit):
+    pass
+
+
 class GitRevisionMarkWriter(GitRevisionWriter):
+  """Refer to the file contents by the marks of blobs written earlier.
+
+  If the blobs were written by an ExternalBlobGenerator, then some
+  marks are aliases for the marks of identical blobs; those blobs are
+  referred to by the latter marks instead."""
+
+  def _uses_blob_aliases(self):
+    return isinstance(Ctx().revision_collector, ExternalBlobGenerator)
+
+  def register_artifacts(self, which_pass):
+    GitRevisionWriter.register_artifacts(self, which_pass)
+    if self._uses_blob_aliases():
+      artifact_manager.register_temp_file_needed(
+          config.GIT_BLOB_ALIASES, which_pass
+          )
+
+  def start(self, mirror, f):
+    GitRevisionWriter.start(self, mirror, f)
+    if self._uses_blob_aliases():
+      self._blob_aliases = read_blob_aliases(
+          artifact_manager.get_temp_file(config.GIT_BLOB_ALIASES)
+          )
+      logger.verbose(
+          '%d duplicate blobs were omitted from the blob file.'
+          % (len(self._blob_aliases),)
+          )
+    else:
+      self._blob_aliases = {}
+
   def _modify_file(self, cvs_item, post_commit):
     if cvs_item.cvs_file.executable:
       mode = '100755'
     else:
       mode = '100644'
 
+    mark = cvs_item.revision_reader_token
     self.f.write(
         'M %s :%d %s\n'
-        % (mode, cvs_item.revision_reader_token,
+        % (mode, self._blob_aliases.get(mark, mark),
            cvs_item.cvs_file.cvs_path,)
         )
 
 
+# The RevisionReader and the CVSItem store used by the worker
+# processes of a GitRevisionInlineWriter (set by
+# _init_content_worker()):
+_worker_revision_reader = None
+_worker_cvs_items_db = None
+
+
+def _init_content_worker(revision_reader):
+  global _worker_revision_reader
+  global _worker_cvs_items_db
+  _worker_revision_reader = revision_reader
+  # The CVSItem store inherited from the parent process shares its
+  # file position with the parent, so open a separate one:
+  _worker_cvs_items_db = IndexedCVSItemStore(
+      artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
+      artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
+      DB_OPEN_READ,
+      )
+
+
+def _get_content(cvs_rev):
+  try:
+    return _worker_revision_reader.get_content(cvs_rev)
+  except FatalException, e:
+    # The exception is pickled to be re-raised in the main process,
+    # but subclasses like CommandError cannot be unpickled, which
+    # would leave the pool hanging.  So pass on just the message:
+    raise FatalException(str(e))
+
+
+def _get_content_by_id(cvs_rev_id):
+  """Return the contents of the CVSRevision with id CVS_REV_ID.
+
+  Return None if the CVSRevision doesn't add or change the file."""
+
+  cvs_rev = _worker_cvs_items_db[cvs_rev_id]
+  if isinstance(cvs_rev, (CVSRevisionAdd, CVSRevisionChange)):
+    return _get_content(cvs_rev)
+  else:
+    return None
+
+
 class GitRevisionInlineWriter(GitRevisionWriter):
+  """Write the file contents inline in the git-fast-import stream.
+
+  If Ctx().jobs is greater than one and the revision reader supports
+  worker processes, the contents are checked out by a pool of worker
+  processes while the main process writes the stream:
+
+  - The contents of the revisions in upcoming primary and post commits
+    are checked out ahead of time, in commit order.  Any that turn out
+    not to be needed are discarded once their commit has been written.
+
+  - The contents of the files that are added to a symbol in a fixup
+    commit are checked out in the order that they will be written.
+
+  In each case, at most PREFETCH_PER_JOB * Ctx().jobs contents are in
+  progress or waiting to be written at any time.  Contents that were
+  not prefetched are read synchronously."""
+
+  PREFETCH_PER_JOB = 8
+
   def __init__(self, revision_reader):
     self.revision_reader = revision_reader
 
@@ -101,11 +243,120 @@ class GitRevisionInlineWriter(GitRevisionWriter):
     GitRevisionWriter.register_artifacts(self, which_pass)
     self.revision_reader.register_artifacts(which_pass)
 
+  def _get_pool(self):
+    """Return a multiprocessing.Pool for Ctx().jobs workers, or None.
+
+    The workers rely on inheriting the revision reader and Ctx() from
+    this process, so a pool is only used on platforms that support
+    fork()."""
+
+    if (
+        Ctx().jobs <= 1
+        or multiprocessing is None
+        or not hasattr(os, 'fork')
+        or not self.revision_reader.supports_worker_processes
+        ):
+      return None
+
+    return multiprocessing.Pool(
+        Ctx().jobs, _init_content_worker, (self.revision_reader,)
+        )
+
   def start(self, mirror, f):
     GitRevisionWriter.start(self, mirror, f)
     self.revision_reader.start()
+    self._start_pool(mirror.get_youngest_revnum() + 1)
 
-  def _modify_file(self, cvs_item, post_commit):
+  def get_checkpoint(self):
+    return self.revision_reader.get_checkpoint()
+
+  def resume(self, mirror, f, checkpoint):
+    GitRevisionWriter.start(self, mirror, f)
+    self.revision_reader.resume(checkpoint)
+    self._start_pool(mirror.get_youngest_revnum() + 1)
+
+  def _start_pool(self, revnum):
+    """Start the worker pool, if any, prefetching from REVNUM onwards."""
+
+    self._pool = self._get_pool()
+    if self._pool is not None:
+      self._prefetch_limit = self.PREFETCH_PER_JOB * Ctx().jobs
+      self._revisions_to_prefetch = self._iter_revisions_to_prefetch(revnum)
+      # A queue of (revnum, cvs_rev_id, async_result) for the revisions
+      # whose contents have been handed to the pool, in commit order:
+      self._prefetched = deque()
+      # A map {cvs_rev_id : count} of the entries in self._prefetched:
+      self._prefetched_ids = {}
+      self._prefetch_hits = 0
+      self._prefetch_misses = 0
+      self._prefetch()
+
+  def _iter_revisions_to_prefetch(self, revnum):
+    """Generate (revnum, cvs_rev_id) for the revisions in upcoming commits.
+
+    Generate the ids of the CVSRevisions from primary and post commits
+    starting at REVNUM, in commit order.  The CVSRevisions themselves
+    are only read by the worker processes (which skip those that
+    don't add or change a file), because the main process reads them
+    again when it outputs the commits."""
+
+    svn_commit = Ctx()._persistence_manager.get_svn_commit(
+        revnum, load_cvs_items=False
+        )
+    while svn_commit:
+      if isinstance(svn_commit, SVNRevisionCommit):
+        for cvs_rev_id in svn_commit.get_cvs_item_ids():
+          yield (revnum, cvs_rev_id)
+      revnum += 1
+      svn_commit = Ctx()._persistence_manager.get_svn_commit(
+          revnum, load_cvs_items=False
+          )
+
+  def _prefetch(self):
+    """Hand revisions to the pool until the prefetch limit is reached."""
+
+    while len(self._prefetched) < self._prefetch_limit:
+      try:
+        (revnum, cvs_rev_id) = self._revisions_to_prefetch.next()
+      except StopIteration:
+        return
+      self._prefetched.append(
+          (revnum, cvs_rev_id,
+           self._pool.apply_async(_get_content_by_id, (cvs_rev_id,)),)
+          )
+      self._prefetched_ids[cvs_rev_id] = (
+          self._prefetched_ids.get(cvs_rev_id, 0) + 1
+          )
+
+  def _remove_prefetched(self, entry):
+    self._prefetched.remove(entry)
+    id = entry[1]
+    count = self._prefetched_ids.pop(id)
+    if count > 1:
+      self._prefetched_ids[id] = count - 1
+
+  def _get_prefetched_content(self, cvs_rev):
+    """Return the prefetched contents of CVS_REV, or None.
+
+    First discard the prefetched contents for commits that have
+    already been written."""
+
+    revnum = self._mirror.get_youngest_revnum()
+    while self._prefetched and self._prefetched[0][0] < revnum:
+      self._remove_prefetched(self._prefetched[0])
+
+    fulltext = None
+    if cvs_rev.id in self._prefetched_ids:
+      for entry in self._prefetched:
+        if entry[1] == cvs_rev.id:
+          break
+      self._remove_prefetched(entry)
+      fulltext = entry[2].get()
+
+    self._prefetch()
+    return fulltext
+
+  def _write_file(self, cvs_item, fulltext):
     if cvs_item.cvs_file.executable:
       mode = '100755'
     else:
@@ -115,25 +366,112 @@ class GitRevisionInlineWriter(GitRevisionWriter):
         'M %s inline %s\n'
         % (mode, cvs_item.cvs_file.cvs_path,)
         )
+    self.f.write('data %d\n' % (len(fulltext),))
+    self.f.write(fulltext)
+    self.f.write('\n')
+
+  def _terminate_pool(self):
+    """Stop the worker pool without waiting for its pending work.
+
+    This is used when the output fails, so that the worker processes
+    don't outlive it."""
+
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool.join()
+      self._pool = None
+
+  def _get_fulltext(self, cvs_item):
+    """Return the contents to be written for CVS_ITEM."""
 
     if isinstance(cvs_item, CVSSymbol):
       cvs_rev = cvs_item.get_cvs_revision_source(Ctx()._cvs_items_db)
     else:
       cvs_rev = cvs_item
 
-    # FIXME: We have to decide what to do about keyword substitution
-    # and eol_style here:
-    fulltext = self.revision_reader.get_content(cvs_rev)
+    fulltext = None
+    if self._pool is not None:
+      fulltext = self._get_prefetched_content(cvs_rev)
+      if fulltext is None:
+        self._prefetch_misses += 1
+      else:
+        self._prefetch_hits += 1
 
-    self.f.write('data %d\n' % (len(fulltext),))
-    self.f.write(fulltext)
-    self.f.write('\n')
+    if fulltext is None:
+      # FIXME: We have to decide what to do about keyword substitution
+      # and eol_style here:
+      fulltext = self.revision_reader.get_content(cvs_rev)
+
+    return fulltext
+
+  def _modify_file(self, cvs_item, post_commit):
+    try:
+      self._write_file(cvs_item, self._get_fulltext(cvs_item))
+    except:
+      exc_info = sys.exc_info()
+      self._terminate_pool()
+      raise exc_info[0], exc_info[1], exc_info[2]
+
+  def branch_files(self, cvs_symbols):
+    if self._pool is None:
+      GitRevisionWriter.branch_files(self, cvs_symbols)
+      return
+
+    # A queue of (cvs_symbol, async_result) for the files whose
+    # contents have been handed to the pool:
+    pending = deque()
+
+    def write_next():
+      (cvs_symbol, async_result) = pending.popleft()
+      super(GitRevisionWriter, self).branch_file(cvs_symbol)
+      self._write_file(cvs_symbol, async_result.get())
+      self._prefetch_hits += 1
+
+    try:
+      for cvs_symbol in cvs_symbols:
+        cvs_rev = cvs_symbol.get_cvs_revision_source(Ctx()._cvs_items_db)
+        pending.append(
+            (cvs_symbol, self._pool.apply_async(_get_content, (cvs_rev,)),)
+            )
+        if len(pending) >= self._prefetch_limit:
+          write_next()
+
+      while pending:
+        write_next()
+    except:
+      exc_info = sys.exc_info()
+      self._terminate_pool()
+      raise exc_info[0], exc_info[1], exc_info[2]
 
   def finish(self):
-    GitRevisionWriter.finish(self)
+    try:
+      GitRevisionWriter.finish(self)
+    except:
+      exc_info = sys.exc_info()
+      self._terminate_pool()
+      raise exc_info[0], exc_info[1], exc_info[2]
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+      logger.verbose(
+          'Prefetched file contents: %d used, %d read synchronously.'
+          % (self._prefetch_hits, self._prefetch_misses,)
+          )
+      counters.add('GitRevisionInlineWriter prefetch hits', self._prefetch_hits)
+      counters.add(
+          'GitRevisionInlineWriter prefetch misses', self._prefetch_misses
+          )
     self.revision_reader.finish()
 
 
+class _NullOutput(object):
+  """A file-like object that discards anything written to it."""
+
+  def write(self, s):
+    pass
+
+
 class GitOutputOption(DVCSOutputOption):
   """An OutputOption that outputs to a git-fast-import formatted file.
 
@@ -152,6 +490,10 @@ class GitOutputOption(DVCSOutputOption):
 
   name = "Git"
 
+  supports_checkpoints = True
+
+  supports_incremental = True
+
   # The first mark number used for git-fast-import commit marks.  This
   # value needs to be large to avoid conflicts with blob marks.
   _first_commit_mark = 1000000000
@@ -195,6 +537,10 @@ class GitOutputOption(DVCSOutputOption):
 
     self._mark_generator = KeyGenerator(GitOutputOption._first_commit_mark)
 
+    # True while the commits of an earlier conversion are being
+    # replayed (see begin_replay()):
+    self._replaying = False
+
   def register_artifacts(self, which_pass):
     DVCSOutputOption.register_artifacts(self, which_pass)
     self.revision_writer.register_artifacts(which_pass)
@@ -203,9 +549,16 @@ class GitOutputOption(DVCSOutputOption):
     # FIXME: What constraints does git impose on symbols?
     pass
 
+  def _open_output(self):
+    """Return the file-like object to which the commands are written."""
+
+    return open(self.dump_filename, 'wb')
+
+  def begin_replay(self):
+    self._replaying = True
+
   def setup(self, svn_rev_count):
     DVCSOutputOption.setup(self, svn_rev_count)
-    self.f = open(self.dump_filename, 'wb')
 
     # The youngest revnum that has been committed so far:
     self._youngest = 0
@@ -215,8 +568,94 @@ class GitOutputOption(DVCSOutputOption):
     # at the end of the revnum.
     self._marks = {}
 
+    # A map {git_branch : mark} giving the last commit that the output
+    # of an earlier conversion made to each branch that has not been
+    # committed to since (see end_replay()):
+    self._branch_tips = {}
+
+    if self._replaying:
+      # Nothing is written until end_replay() is called:
+      self.f = _NullOutput()
+      self._output_revision_writer = self.revision_writer
+      self.revision_writer = GitRevisionReplayWriter()
+    else:
+      self.f = self._open_output()
+
+    self.revision_writer.start(self._mirror, self.f)
+
+  def end_replay(self, state):
+    self._replaying = False
+    self.revision_writer.finish()
+    self.revision_writer = self._output_revision_writer
+    del self._output_revision_writer
+    self.f = self._open_output()
     self.revision_writer.start(self._mirror, self.f)
 
+    # git-fast-import doesn't know the state of the branches at the end
+    # of the earlier import, so the first new commit to each branch has
+    # to name its parent explicitly (by a mark imported using
+    # --import-marks):
+    for (lod, modifications) in self._marks.iteritems():
+      if isinstance(lod, Tag):
+        continue
+      # The post commits are recorded under the LOD None:
+      git_branch = 'refs/heads/%s' % (getattr(lod, 'name', 'master'),)
+      mark = modifications[-1][1]
+      self._branch_tips[git_branch] = max(
+          mark, self._branch_tips.get(git_branch, mark)
+          )
+
+  def get_incremental_state(self):
+    return None
+
+  def _write_branch_tip(self, git_branch):
+    """Make the commit being written to GIT_BRANCH continue that branch.
+
+    If GIT_BRANCH was last committed to by an earlier conversion, write
+    a 'from' command naming that commit.  This has to be called after
+    the commit message and before any 'merge' command."""
+
+    mark = self._branch_tips.pop(git_branch, None)
+    if mark is not None:
+      self.f.write('from :%d\n' % (mark,))
+
+  def get_checkpoint(self):
+    self.f.flush()
+    return (
+        DVCSOutputOption.get_checkpoint(self),
+        self.revision_writer.get_checkpoint(),
+        self.f.tell(),
+        self._youngest,
+        [(lod and lod.id, modifications)
+         for (lod, modifications) in self._marks.iteritems()],
+        self._mark_generator.get_last_id(),
+        self._branch_tips,
+        )
+
+  def resume(self, svn_rev_count, checkpoint):
+    (
+        dvcs_checkpoint, revision_writer_checkpoint, offset,
+        self._youngest, marks, last_mark, self._branch_tips,
+        ) = checkpoint
+    DVCSOutputOption.resume(self, svn_rev_count, dvcs_checkpoint)
+    self.f = reopen_output_file(self.dump_filename, offset)
+
+    self._marks = {}
+    for (lod_id, modifications) in marks:
+      # The post commits are recorded under the LOD None:
+      if lod_id is None:
+        lod = None
+      else:
+        lod = Ctx()._symbol_db.get_symbol(lod_id)
+      self._marks[lod] = modifications
+
+    if last_mark is not None:
+      self._mark_generator = KeyGenerator(last_mark + 1)
+
+    self.revision_writer.resume(
+        self._mirror, self.f, revision_writer_checkpoint
+        )
+
   def _create_commit_mark(self, lod, revnum):
     mark = self._mark_generator.gen_id()
     self._set_lod_mark(lod, revnum, mark)
@@ -278,9 +717,10 @@ class GitOutputOption(DVCSOutputOption):
     self._mirror.start_commit(svn_commit.revnum)
     if isinstance(lod, Trunk):
       # FIXME: is this correct?:
-      self.f.write('commit refs/heads/master\n')
+      git_branch = 'refs/heads/master'
     else:
-      self.f.write('commit refs/heads/%s\n' % (lod.name,))
+      git_branch = 'refs/heads/%s' % (lod.name,)
+    self.f.write('commit %s\n' % (git_branch,))
     self.f.write(
         'mark :%d\n'
         % (self._create_commit_mark(lod, svn_commit.revnum),)
@@ -290,6 +730,7 @@ class GitOutputOption(DVCSOutputOption):
         )
     self.f.write('data %d\n' % (len(log_msg),))
     self.f.write('%s\n' % (log_msg,))
+    self._write_branch_tip(git_branch)
     for cvs_rev in svn_commit.get_cvs_items():
       self.revision_writer.process_revision(cvs_rev, post_commit=False)
 
@@ -319,6 +760,7 @@ class GitOutputOption(DVCSOutputOption):
         )
     self.f.write('data %d\n' % (len(log_msg),))
     self.f.write('%s\n' % (log_msg,))
+    self._write_branch_tip('refs/heads/master')
     self.f.write(
         'merge :%d\n'
         % (self._get_source_mark(source_lod, svn_commit.revnum),)
@@ -426,10 +868,14 @@ class GitOutputOption(DVCSOutputOption):
           'from :%d\n'
           % (self._get_source_mark(p_source_lod, p_source_revnum),)
           )
+    else:
+      self._write_branch_tip(git_branch)
 
-    for (source_lod, source_revnum, cvs_symbols,) in source_groups:
-      for cvs_symbol in cvs_symbols:
-        self.revision_writer.branch_file(cvs_symbol)
+    self.revision_writer.branch_files([
+        cvs_symbol
+        for (source_lod, source_revnum, cvs_symbols,) in source_groups
+        for cvs_symbol in cvs_symbols
+        ])
 
     if is_initial_lod_creation:
       for cvs_file in cvs_files_to_delete:
@@ -472,6 +918,7 @@ class GitOutputOption(DVCSOutputOption):
       raise InternalError()
     self.f.write('reset refs/%s/%s\n' % (category, symbol.name,))
     self.f.write('from :%d\n' % (mark,))
+    self._branch_tips.pop('refs/%s/%s' % (category, symbol.name,), None)
 
   def get_tag_fixup_branch_name(self, svn_commit):
     # The branch name to use for the "tag fixup branches".  The
@@ -532,6 +979,7 @@ class GitOutputOption(DVCSOutputOption):
         self.f.write('committer %s %d +0000\n' % (author, svn_commit.date,))
         self.f.write('data %d\n' % (len(log_msg),))
         self.f.write('%s\n' % (log_msg,))
+        self._write_branch_tip(source_lod_git_branch)
 
         self.f.write(
             'merge :%d\n'
@@ -556,3 +1004,65 @@ class GitOutputOption(DVCSOutputOption):
     del self.f
 
 
+class GitRepositoryOutputOption(GitOutputOption):
+  """An OutputOption that writes directly to a new git repository.
+
+  The git-fast-import commands are interpreted in-process by a
+  FastImportPackfileWriter, which writes the git objects into a
+  packfile, so 'git fast-import' is not needed.
+
+  Members:
+
+    repository_path -- (string) the path of the git repository to be
+        created.
+
+    blob_filename -- (string or None) the name of the file containing
+        the blobs referred to by REVISION_WRITER, or None if the file
+        contents are written inline.
+
+  """
+
+  # The packfile cannot be continued after an interruption, and the
+  # repository has to be new:
+  supports_checkpoints = False
+  supports_incremental = False
+
+  def __init__(
+        self, repository_path, revision_writer,
+        blob_filename=None,
+        author_transforms=None,
+        tie_tag_fixup_branches=False,
+        ):
+    """Constructor.
+
+    REPOSITORY_PATH is the path of the bare git repository to create;
+    it must not exist yet.  If REVISION_WRITER refers to blobs by mark
+    (e.g., GitRevisionMarkWriter), BLOB_FILENAME must be the name of
+    the blob file written by the revision collector; its blobs are
+    added to the repository first.  See the superclass for the meaning
+    of the other parameters."""
+
+    GitOutputOption.__init__(
+        self, None, revision_writer,
+        author_transforms=author_transforms,
+        tie_tag_fixup_branches=tie_tag_fixup_branches,
+        )
+    self.repository_path = repository_path
+    self.blob_filename = blob_filename
+
+  def check(self):
+    GitOutputOption.check(self)
+    if not Ctx().dry_run and os.path.exists(self.repository_path):
+      raise FatalError(
+          "the git repository path '%s' exists." % (self.repository_path,)
+          )
+
+  def _open_output(self):
+    logger.normal("Creating new repository '%s'" % (self.repository_path,))
+    f = FastImportPackfileWriter(self.repository_path)
+    if self.blob_filename is not None:
+      logger.normal('Adding blobs from %s' % (self.blob_filename,))
+      f.import_file(self.blob_filename)
+    return f
+
+
@@ -0,0 +1,616 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Write git objects directly into a packfile in a new git repository.
+
+A FastImportPackfileWriter is a file-like object that accepts the
+git-fast-import commands that cvs2git generates and interprets them
+itself, writing the resulting blob, tree and commit objects into a
+packfile and the branches and tags as references.  This makes it
+possible to create a git repository without running 'git fast-import'
+(or indeed git at all).
+
+Only the subset of the fast-import language that cvs2git uses is
+supported.  The objects are stored whole (zlib-compressed but without
+delta compression), so the packfile is typically much larger than one
+written by git; 'git repack -a -d -f' can be used to shrink it.
+
+For information about the packfile and index formats, see
+Documentation/technical/pack-format.txt in the git sources."""
+
+
+import os
+import struct
+import zlib
+from binascii import hexlify
+from collections import deque
+
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+from cvs2svn_lib.common import InternalError
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
+
+
+# The packfile type codes of the objects that we write:
+_OBJECT_TYPES = {
+    'commit' : 1,
+    'tree' : 2,
+    'blob' : 3,
+    }
+_OBJECT_TYPE_NAMES = dict([
+    (code, type) for (type, code) in _OBJECT_TYPES.items()
+    ])
+
+# The mode of subdirectories in tree objects:
+_TREE_MODE = '40000'
+
+
+def _hash_object(type, data):
+  """Return the (binary) SHA-1 name of the git object TYPE with DATA."""
+
+  sha = sha1('%s %d\0' % (type, len(data),))
+  sha.update(data)
+  return sha.digest()
+
+
+class PackfileWriter(object):
+  """Write git objects to a packfile and write the corresponding index.
+
+  Each object is written once, no matter how often it is added.  The
+  objects are not delta-compressed."""
+
+  def __init__(self, pack_dir):
+    """Write the packfile and index into the directory PACK_DIR.
+
+    The packfile is written to a temporary file, which is renamed to
+    its final name (which depends on the contents) by finish()."""
+
+    self.pack_dir = pack_dir
+    self._tmp_filename = os.path.join(pack_dir, 'tmp_pack_%d' % (os.getpid(),))
+    self._f = open(self._tmp_filename, 'w+b')
+    # The number of objects is filled in by finish():
+    self._f.write(struct.pack('>4sLL', 'PACK', 2, 0))
+    self._offset = 12
+
+    # A map {sha : (offset, length, crc32)} for the objects written so
+    # far, where SHA is the binary SHA-1 name of the object, OFFSET is
+    # its position in the packfile, LENGTH is its length in the
+    # packfile (including its header), and CRC32 is the checksum of
+    # those bytes:
+    self._objects = {}
+
+  def __contains__(self, sha):
+    return sha in self._objects
+
+  def __len__(self):
+    return len(self._objects)
+
+  def add_object(self, type, data):
+    """Add an object of TYPE ('blob', 'tree' or 'commit') containing DATA.
+
+    Return the binary SHA-1 name of the object."""
+
+    sha = _hash_object(type, data)
+    if sha in self._objects:
+      return sha
+
+    # The header contains the type and the length of the data,
+    # encoded in little-endian order, seven bits at a time (except for
+    # the first byte, which has only four):
+    size = len(data)
+    c = (_OBJECT_TYPES[type] << 4) | (size & 0x0f)
+    size >>= 4
+    header = []
+    while size:
+      header.append(chr(c | 0x80))
+      c = size & 0x7f
+      size >>= 7
+    header.append(chr(c))
+    header = ''.join(header)
+
+    compressed = zlib.compress(data)
+    self._f.write(header)
+    self._f.write(compressed)
+    length = len(header) + len(compressed)
+    crc = zlib.crc32(compressed, zlib.crc32(header)) & 0xffffffff
+    self._objects[sha] = (self._offset, length, crc)
+    self._offset += length
+    return sha
+
+  def read_object(self, sha):
+    """Return (type, data) for the object with binary SHA-1 name SHA.
+
+    The object must have been written by this PackfileWriter."""
+
+    (offset, length, crc) = self._objects[sha]
+    self._f.seek(offset)
+    s = self._f.read(length)
+    self._f.seek(0, 2)
+
+    c = ord(s[0])
+    type = _OBJECT_TYPE_NAMES[(c >> 4) & 0x07]
+    i = 1
+    while c & 0x80:
+      c = ord(s[i])
+      i += 1
+    return (type, zlib.decompress(s[i:]))
+
+  def finish(self):
+    """Finish the packfile and write its index.
+
+    Return the name of the packfile (without extension); the packfile
+    and its index are called NAME.pack and NAME.idx."""
+
+    # Fill in the number of objects, then compute the checksum of the
+    # whole packfile:
+    self._f.seek(8)
+    self._f.write(struct.pack('>L', len(self._objects)))
+    self._f.seek(0)
+    sha = sha1()
+    while True:
+      s = self._f.read(1024 * 1024)
+      if not s:
+        break
+      sha.update(s)
+    pack_sha = sha.digest()
+    self._f.seek(0, 2)
+    self._f.write(pack_sha)
+    self._f.close()
+
+    name = os.path.join(self.pack_dir, 'pack-%s' % (hexlify(pack_sha),))
+    os.rename(self._tmp_filename, name + '.pack')
+    self._write_index(name + '.idx', pack_sha)
+    return name
+
+  def _write_index(self, filename, pack_sha):
+    """Write a version 2 pack index for the objects to FILENAME."""
+
+    shas = self._objects.keys()
+    shas.sort()
+
+    # fanout[i] is the number of objects whose names begin with a byte
+    # less than or equal to i:
+    fanout = [0] * 256
+    for sha in shas:
+      fanout[ord(sha[0])] += 1
+    for i in range(1, 256):
+      fanout[i] += fanout[i - 1]
+
+    # Offsets that don't fit in 31 bits are stored in a separate table
+    # of 64-bit offsets, and the index of the entry in that table is
+    # recorded instead:
+    offsets = []
+    large_offsets = []
+    for sha in shas:
+      offset = self._objects[sha][0]
+      if offset < 0x80000000:
+        offsets.append(offset)
+      else:
+        offsets.append(0x80000000 | len(large_offsets))
+        large_offsets.append(offset)
+
+    f = open(filename, 'wb')
+    checksum = sha1()
+    def write(s):
+      checksum.update(s)
+      f.write(s)
+    write('\377tOc' + struct.pack('>L', 2))
+    write(struct.pack('>256L', *fanout))
+    write(''.join(shas))
+    write(''.join([
+        struct.pack('>L', self._objects[sha][2]) for sha in shas
+        ]))
+    write(''.join([struct.pack('>L', offset) for offset in offsets]))
+    write(''.join([struct.pack('>Q', offset) for offset in large_offsets]))
+    write(pack_sha)
+    f.write(checksum.digest())
+    f.close()
+
+
+class FastImportPackfileWriter(object):
+  """Interpret git-fast-import commands and write a git repository.
+
+  This is a file-like object, to which the commands can be written in
+  arbitrary pieces.  The repository is created (as a bare repository)
+  when this object is constructed and is finished when it is closed.
+
+  The commands have the same meaning as for git-fast-import, but only
+  the following subset is supported:
+
+    blob, mark, data
+    commit, mark, author, committer, data, from, merge, M, D
+    reset (with or without from)
+
+  Marks and 'from'/'merge' references must be of the form ':N', and
+  'data' commands must use the exact byte count format.  The file
+  contents may be referred to by mark or given inline.
+
+  The trees of each commit are computed from the tree of the commit's
+  first parent by applying the 'M' and 'D' commands; only the
+  subtrees along the modified paths are read and rewritten.  As with
+  git-fast-import, directories that become empty are removed."""
+
+  # The maximum number of parsed tree objects to keep in memory:
+  TREE_CACHE_SIZE = 10000
+
+  def __init__(self, repository_path):
+    """Create a new bare git repository at REPOSITORY_PATH.
+
+    REPOSITORY_PATH must not exist yet."""
+
+    self.repository_path = repository_path
+    os.mkdir(repository_path)
+    for path in [
+          'objects', 'objects/info', 'objects/pack',
+          'refs', 'refs/heads', 'refs/tags',
+          ]:
+      os.mkdir(os.path.join(repository_path, path))
+    f = open(os.path.join(repository_path, 'HEAD'), 'w')
+    f.write('ref: refs/heads/master\n')
+    f.close()
+    f = open(os.path.join(repository_path, 'config'), 'w')
+    f.write(
+        '[core]\n'
+        '\trepositoryformatversion = 0\n'
+        '\tfilemode = true\n'
+        '\tbare = true\n'
+        )
+    f.close()
+
+    self._pack = PackfileWriter(
+        os.path.join(repository_path, 'objects', 'pack')
+        )
+
+    # A map {mark : sha} for the blobs and commits with marks:
+    self._marks = {}
+
+    # A map {ref : sha} giving the current commit of each branch:
+    self._branches = {}
+
+    # A map {commit_sha : tree_sha} for the commits written so far:
+    self._commit_trees = {}
+
+    # A map {tree_sha : {name : (mode, sha)}} of parsed tree objects,
+    # and the order in which they were added to it:
+    self._tree_cache = {}
+    self._tree_cache_order = deque()
+
+    # The unprocessed input and its total length:
+    self._buffer = []
+    self._buffer_length = 0
+    # The amount of input needed before it is worth trying to
+    # process it again:
+    self._needed = 1
+    # If not None, the number of bytes of data that are expected next:
+    self._data_length = None
+    # True iff an optional newline following data might come next:
+    self._skip_newline = False
+
+    # The command currently being processed ('blob', 'commit', or
+    # 'reset') or None:
+    self._command = None
+    self._ref = None
+    self._mark = None
+    self._author = None
+    self._committer = None
+    self._message = ''
+    self._from = None
+    self._merges = []
+    # A list of (path, mode, sha) for the file modifications of the
+    # current commit, in order; for deletions, MODE and SHA are None:
+    self._changes = []
+    # (mode, path) for a file whose contents are expected inline:
+    self._inline = None
+
+    self._commit_count = 0
+
+  def write(self, s):
+    self._buffer.append(s)
+    self._buffer_length += len(s)
+    if self._buffer_length < self._needed:
+      return
+
+    data = ''.join(self._buffer)
+    pos = self._process(data)
+    if pos < len(data):
+      self._buffer = [data[pos:]]
+    else:
+      self._buffer = []
+    self._buffer_length = len(data) - pos
+
+  def import_file(self, filename):
+    """Process the git-fast-import commands in file FILENAME."""
+
+    f = open(filename, 'rb')
+    while True:
+      s = f.read(1024 * 1024)
+      if not s:
+        break
+      self.write(s)
+    f.close()
+
+  def _process(self, data):
+    """Process as many commands from DATA as possible.
+
+    Return the position in DATA up to which it has been processed, and
+    set self._needed to the amount of unprocessed data needed to make
+    further progress."""
+
+    pos = 0
+    while True:
+      if self._data_length is not None:
+        end = pos + self._data_length
+        if end > len(data):
+          self._needed = self._data_length
+          return pos
+        self._data_length = None
+        self._skip_newline = True
+        self._handle_data(data[pos:end])
+        pos = end
+
+      if self._skip_newline:
+        if pos == len(data):
+          self._needed = 1
+          return pos
+        if data[pos] == '\n':
+          pos += 1
+        self._skip_newline = False
+
+      i = data.find('\n', pos)
+      if i == -1:
+        self._needed = len(data) - pos + 1
+        return pos
+      self._handle_line(data[pos:i])
+      pos = i + 1
+
+  def _get_mark(self, s):
+    if not s.startswith(':'):
+      raise InternalError('Unsupported fast-import reference %r' % (s,))
+    return self._marks[int(s[1:])]
+
+  def _handle_line(self, line):
+    words = line.split(' ', 1)
+    command = words[0]
+    if len(words) == 2:
+      arg = words[1]
+    else:
+      arg = None
+
+    if command == '':
+      self._finish_command()
+    elif command in ['blob', 'commit', 'reset']:
+      self._finish_command()
+      self._command = command
+      self._ref = arg
+    elif command == 'mark':
+      self._mark = int(arg[1:])
+    elif command == 'data':
+      self._data_length = int(arg)
+    elif command == 'author':
+      self._author = arg
+    elif command == 'committer':
+      self._committer = arg
+    elif command == 'from':
+      self._from = self._get_mark(arg)
+    elif command == 'merge':
+      self._merges.append(self._get_mark(arg))
+    elif command == 'M':
+      (mode, ref, path) = arg.split(' ', 2)
+      if ref == 'inline':
+        self._inline = (mode, path)
+      else:
+        self._changes.append((path, mode, self._get_mark(ref)))
+    elif command == 'D':
+      self._changes.append((arg, None, None))
+    else:
+      raise InternalError('Unsupported fast-import command %r' % (line,))
+
+  def _handle_data(self, data):
+    if self._command == 'blob':
+      sha = self._pack.add_object('blob', data)
+      if self._mark is not None:
+        self._marks[self._mark] = sha
+      self._finish_command()
+    elif self._inline is not None:
+      (mode, path) = self._inline
+      self._inline = None
+      self._changes.append((path, mode, self._pack.add_object('blob', data)))
+    elif self._command == 'commit':
+      self._message = data
+    else:
+      raise InternalError('Unexpected data in fast-import stream')
+
+  def _finish_command(self):
+    if self._command == 'commit':
+      self._write_commit()
+    elif self._command == 'reset':
+      if self._from is None:
+        self._branches.pop(self._ref, None)
+      else:
+        self._branches[self._ref] = self._from
+
+    self._command = None
+    self._ref = None
+    self._mark = None
+    self._author = None
+    self._committer = None
+    self._message = ''
+    self._from = None
+    self._merges = []
+    self._changes = []
+
+  def _write_commit(self):
+    if self._from is not None:
+      parent = self._from
+    else:
+      parent = self._branches.get(self._ref)
+
+    parents = []
+    if parent is None:
+      tree = None
+    else:
+      parents.append(parent)
+      tree = self._commit_trees[parent]
+    parents.extend(self._merges)
+
+    if self._changes or tree is None:
+      tree = self._write_changes(tree, self._changes)
+
+    committer = self._committer
+    author = self._author or committer
+    data = ['tree %s\n' % (hexlify(tree),)]
+    for parent in parents:
+      data.append('parent %s\n' % (hexlify(parent),))
+    data.append('author %s\ncommitter %s\n\n' % (author, committer,))
+    data.append(self._message)
+    sha = self._pack.add_object('commit', ''.join(data))
+
+    self._commit_trees[sha] = tree
+    self._branches[self._ref] = sha
+    if self._mark is not None:
+      self._marks[self._mark] = sha
+    self._commit_count += 1
+
+  def _read_tree(self, sha):
+    """Return a new map {name : (mode, sha)} for the tree named SHA."""
+
+    try:
+      entries = self._tree_cache[sha]
+    except KeyError:
+      (type, data) = self._pack.read_object(sha)
+      entries = {}
+      pos = 0
+      while pos < len(data):
+        i = data.index('\0', pos)
+        (mode, name) = data[pos:i].split(' ', 1)
+        entries[name] = (mode, data[i + 1:i + 21])
+        pos = i + 21
+      self._cache_tree(sha, entries)
+
+    return entries.copy()
+
+  def _cache_tree(self, sha, entries):
+    if sha not in self._tree_cache:
+      self._tree_cache[sha] = entries
+      self._tree_cache_order.append(sha)
+      if len(self._tree_cache_order) > self.TREE_CACHE_SIZE:
+        del self._tree_cache[self._tree_cache_order.popleft()]
+
+  def _write_changes(self, tree, changes):
+    """Apply CHANGES to the tree named TREE and write the result.
+
+    TREE may be None, meaning the empty tree.  Return the SHA-1 name of
+    the new root tree.
+
+    While the changes are being applied, modified directories are
+    represented by dicts {name : entry}, where ENTRY is either another
+    dict (for a modified subdirectory) or a tuple (mode, sha) (for a
+    file or an unmodified subdirectory)."""
+
+    if tree is None:
+      root = {}
+    else:
+      root = self._read_tree(tree)
+
+    for (path, mode, sha) in changes:
+      components = path.split('/')
+      node = root
+      for name in components[:-1]:
+        entry = node.get(name)
+        if isinstance(entry, dict):
+          node = entry
+        elif entry is not None and entry[0] == _TREE_MODE:
+          node[name] = node = self._read_tree(entry[1])
+        elif mode is None:
+          # There is nothing to delete:
+          node = None
+          break
+        else:
+          # Create the directory (replacing any file of the same name):
+          node[name] = node = {}
+
+      if node is None:
+        pass
+      elif mode is None:
+        node.pop(components[-1], None)
+      else:
+        node[components[-1]] = (mode, sha)
+
+    sha = self._write_tree(root)
+    if sha is None:
+      sha = self._pack.add_object('tree', '')
+    return sha
+
+  def _write_tree(self, node):
+    """Write the modified directory NODE and any modified subdirectories.
+
+    Return the SHA-1 name of the tree object, or None if the directory
+    is empty."""
+
+    entries = {}
+    items = []
+    for (name, entry) in node.iteritems():
+      if isinstance(entry, dict):
+        sha = self._write_tree(entry)
+        if sha is None:
+          continue
+        entry = (_TREE_MODE, sha)
+      entries[name] = entry
+      # Git sorts the entries of a tree as if the names of
+      # subdirectories ended with '/':
+      if entry[0] == _TREE_MODE:
+        items.append((name + '/', name, entry))
+      else:
+        items.append((name, name, entry))
+
+    if not items:
+      return None
+
+    items.sort()
+    sha = self._pack.add_object('tree', ''.join([
+        '%s %s\0%s' % (mode, name, entry_sha)
+        for (key, name, (mode, entry_sha)) in items
+        ]))
+    self._cache_tree(sha, entries)
+    return sha
+
+  def close(self):
+    """Finish the packfile and write the references."""
+
+    if self._buffer_length:
+      raise InternalError('Incomplete fast-import command at end of stream')
+    self._finish_command()
+
+    name = self._pack.finish()
+    logger.verbose(
+        'Wrote %d objects (%d commits) to %s.pack'
+        % (len(self._pack), self._commit_count, name,)
+        )
+    counters.add('FastImportPackfileWriter objects', len(self._pack))
+
+    refs = self._branches.items()
+    refs.sort()
+    f = open(os.path.join(self.repository_path, 'packed-refs'), 'w')
+    f.write('# pack-refs with: peeled fully-peeled sorted \n')
+    for (ref, sha) in refs:
+      f.write('%s %s\n' % (hexlify(sha), ref,))
+    f.close()
+
+
@@ -16,13 +16,23 @@
 
 """Write file contents to a stream of git-fast-import blobs."""
 
+try:
+  from hashlib import sha1
+except ImportError:
+  from sha import new as sha1
+
+from cvs2svn_lib.log import logger
 from cvs2svn_lib.cvs_item import CVSRevisionDelete
 from cvs2svn_lib.revision_manager import RevisionCollector
 from cvs2svn_lib.key_generator import KeyGenerator
 
 
 class GitRevisionCollector(RevisionCollector):
-  """Output file revisions to git-fast-import."""
+  """Output file revisions to git-fast-import.
+
+  Each distinct file content is written only once.  A revision whose
+  contents are identical to those of a blob that was already written
+  is given the mark of that blob as its revision_reader_token."""
 
   def __init__(self, blob_filename, revision_reader):
     self.blob_filename = blob_filename
@@ -35,6 +45,9 @@ class GitRevisionCollector(RevisionCollector):
     self.revision_reader.start()
     self.dump_file = open(self.blob_filename, 'wb')
     self._mark_generator = KeyGenerator()
+    # A map {sha1_digest : mark} for the blobs that have been written:
+    self._blob_digests = {}
+    self._duplicate_count = 0
 
   def _process_revision(self, cvs_rev):
     """Write the revision fulltext to a blob if it is not dead."""
@@ -48,7 +61,15 @@ class GitRevisionCollector(RevisionCollector):
     # and eol_style here:
     fulltext = self.revision_reader.get_content(cvs_rev)
 
+    digest = sha1(fulltext).digest()
+    mark = self._blob_digests.get(digest)
+    if mark is not None:
+      self._duplicate_count += 1
+      cvs_rev.revision_reader_token = mark
+      return
+
     mark = self._mark_generator.gen_id()
+    self._blob_digests[digest] = mark
     self.dump_file.write('blob\n')
     self.dump_file.write('mark :%d\n' % (mark,))
     self.dump_file.write('data %d\n' % (len(fulltext),))
@@ -82,5 +103,10 @@ class GitRevisionCollector(RevisionCollector):
   def finish(self):
     self.revision_reader.finish()
     self.dump_file.close()
+    self._blob_digests = None
+    logger.verbose(
+        '%d duplicate blobs were omitted from the blob file.'
+        % (self._duplicate_count,)
+        )
 
 
@@ -30,6 +30,7 @@ from cvs2svn_lib.git_revision_collector import GitRevisionCollector
 from cvs2svn_lib.external_blob_generator import ExternalBlobGenerator
 from cvs2svn_lib.git_output_option import GitRevisionMarkWriter
 from cvs2svn_lib.git_output_option import GitOutputOption
+from cvs2svn_lib.git_output_option import GitRepositoryOutputOption
 
 
 class GitRunOptions(DVCSRunOptions):
@@ -52,6 +53,8 @@ committer.
 .P
 The output of this program are a "blobfile" and a "dumpfile", which
 together can be loaded into a git repository using "git fast-import".
+Alternatively, with \\fB--gitrepos\\fR, the git repository is written
+directly.
 .P
 \\fICVS-REPOS-PATH\\fR is the filesystem path of the part of the CVS
 repository that you want to convert.  This path doesn't have to be the
@@ -100,6 +103,23 @@ A directory called \\fIcvs2svn-tmp\\fR (or the directory specified by
             ),
         metavar='PATH',
         ))
+    group.add_option(IncompatibleOption(
+        '--gitrepos', type='string',
+        action='store',
+        help=(
+            'create a git repository in PATH directly, instead of writing '
+            'a dumpfile'
+            ),
+        man_help=(
+            'Write the converted history directly into a new bare git '
+            'repository at \\fIpath\\fR, instead of writing a dumpfile '
+            'to be loaded with "git fast-import".  \\fIpath\\fR must not '
+            'already exist.  The objects are not delta-compressed, so you '
+            'may want to run "git repack -a -d -f" on the result.  '
+            '(The blobfile is still needed as an intermediate file.)'
+            ),
+        metavar='PATH',
+        ))
     group.add_option(ContextOption(
         '--dry-run',
         action='store_true',
@@ -159,8 +179,14 @@ A directory called \\fIcvs2svn-tmp\\fR (or the directory specified by
       ctx.revision_collector = NullRevisionCollector()
       return
 
-    if not (options.blobfile and options.dumpfile):
-      raise FatalError("must pass '--blobfile' and '--dumpfile' options.")
+    not_both(options.dumpfile, '--dumpfile',
+             options.gitrepos, '--gitrepos')
+
+    if not (options.blobfile and (options.dumpfile or options.gitrepos)):
+      raise FatalError(
+          "must pass '--blobfile' and either '--dumpfile' or '--gitrepos' "
+          "options."
+          )
 
     if options.use_external_blob_generator:
       ctx.revision_collector = ExternalBlobGenerator(options.blobfile)
@@ -181,9 +207,18 @@ A directory called \\fIcvs2svn-tmp\\fR (or the directory specified by
   def process_output_options(self):
     """Process options related to fastimport output."""
     ctx = Ctx()
-    ctx.output_option = GitOutputOption(
-        self.options.dumpfile,
-        GitRevisionMarkWriter(),
-        # Optional map from CVS author names to git author names:
-        author_transforms={}, # FIXME
-        )
+    if self.options.gitrepos:
+      ctx.output_option = GitRepositoryOutputOption(
+          self.options.gitrepos,
+          GitRevisionMarkWriter(),
+          blob_filename=self.options.blobfile,
+          # Optional map from CVS author names to git author names:
+          author_transforms={}, # FIXME
+          )
+    else:
+      ctx.output_option = GitOutputOption(
+          self.options.dumpfile,
+          GitRevisionMarkWriter(),
+          # Optional map from CVS author names to git author names:
+          author_transforms={}, # FIXME
+          )
@@ -0,0 +1,87 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+
+"""This module contains the state recorded by --incremental conversions."""
+
+
+import os
+import cPickle
+
+
+class IncrementalState(object):
+  """The state of the output at the end of an incremental conversion.
+
+  Members:
+
+    output_option_name -- (string) the class name of the OutputOption
+        that wrote the output.
+
+    digests -- a list of the digests of the SVNCommits that were
+        output (see SVNCommit.get_digest()), in revnum order.
+
+    symbols -- a map {(project_id, symbol_name) : revnum} giving the
+        revision number of the first SVNSymbolCommit that was output
+        for each symbol.
+
+    output_state -- the object returned by the get_incremental_state()
+        method of the OutputOption.
+
+  """
+
+  def __init__(self, output_option_name, digests, symbols, output_state):
+    self.output_option_name = output_option_name
+    self.digests = digests
+    self.symbols = symbols
+    self.output_state = output_state
+
+  def write(self, filename):
+    """Write this state to FILENAME.
+
+    The state is written to a new file, which then replaces the old
+    one, so that an interruption never leaves a partial file behind."""
+
+    new_filename = filename + '.new'
+    f = open(new_filename, 'wb')
+    cPickle.dump(
+        (
+            self.output_option_name, self.digests, self.symbols,
+            self.output_state,
+            ),
+        f, -1,
+        )
+    f.close()
+    if os.path.exists(filename):
+      # os.rename() cannot overwrite files on all platforms:
+      os.unlink(filename)
+    os.rename(new_filename, filename)
+
+
+def read_incremental_state(filename):
+  """Return the IncrementalState stored in FILENAME.
+
+  If FILENAME doesn't exist (i.e., for the first of a series of
+  incremental conversions), return None."""
+
+  if not os.path.exists(filename):
+    return None
+
+  f = open(filename, 'rb')
+  (output_option_name, digests, symbols, output_state) = cPickle.load(f)
+  f.close()
+  return IncrementalState(output_option_name, digests, symbols, output_state)
+
+
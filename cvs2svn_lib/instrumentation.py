@@ -0,0 +1,208 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module contains tools to measure the resources used by passes.
+
+The counters object collects named event counts (for example, cache
+hits and misses) from the data structures used during a pass.  To keep
+the overhead low, the data structures count events in their own
+instance variables.  Objects that are closed before the end of the
+pass in which they were opened can simply add their totals to the
+counters object when they are closed.  Objects that might stay open
+across passes or be discarded without being closed (such as databases)
+register themselves as sources instead; the counts of each source are
+read whenever a pass ends, and only the increase since the previous
+pass is attributed to the pass.  The number of bytes that the
+databases read from and write to each file is collected the same way,
+so that it can be reported per artifact.
+
+The other functions in this module return the resource usage of the
+current process as far as the platform allows it to be determined."""
+
+
+import weakref
+
+try:
+  import resource
+except ImportError:
+  # Not available on all platforms (e.g., Windows):
+  resource = None
+
+
+class _Counters:
+  """Collect named event counts and per-file I/O for the current pass."""
+
+  def __init__(self):
+    # A map {id(source) : (ref, baseline)} of the registered sources,
+    # where REF is a weak reference to the source and BASELINE is the
+    # value that _read_source() returned for it when the current pass
+    # started (or when it was registered, if later):
+    self._sources = {}
+    self.reset()
+
+  def reset(self):
+    """Discard all counts, starting the counts for a new pass."""
+
+    # A map {name : count} of the counts that have been added
+    # explicitly or by sources that have been unregistered:
+    self._counts = {}
+
+    # A map {filename : [bytes_read, bytes_written]} of the I/O done
+    # by sources that have been unregistered:
+    self._file_io = {}
+
+    for (key, (ref, baseline)) in self._sources.items():
+      source = ref()
+      if source is None:
+        del self._sources[key]
+      else:
+        self._sources[key] = (ref, self._read_source(source))
+
+  def add(self, name, count):
+    """Add COUNT to the counter called NAME."""
+
+    self._counts[name] = self._counts.get(name, 0) + count
+
+  def _read_source(self, source):
+    """Return the tuple (counts, file_io) describing SOURCE's totals."""
+
+    if hasattr(source, 'get_file_io'):
+      file_io = source.get_file_io()
+    else:
+      file_io = {}
+    return (source.get_counters(), file_io,)
+
+  def _add_increase(self, counts, file_io, baseline, source):
+    """Add the increase of SOURCE's totals over BASELINE.
+
+    Add the increase of the event counts to COUNTS, and that of the
+    I/O to FILE_IO."""
+
+    (old_counts, old_file_io) = baseline
+    (new_counts, new_file_io) = self._read_source(source)
+    for (name, count) in new_counts.iteritems():
+      counts[name] = counts.get(name, 0) + count - old_counts.get(name, 0)
+    for (filename, (bytes_read, bytes_written)) in new_file_io.iteritems():
+      (old_read, old_written) = old_file_io.get(filename, (0, 0))
+      io = file_io.setdefault(filename, [0, 0])
+      io[0] += bytes_read - old_read
+      io[1] += bytes_written - old_written
+
+  def register(self, source):
+    """Register SOURCE, whose counts are to be read at the end of passes.
+
+    SOURCE must have a method get_counters() that returns a map {name :
+    count} of the events that it has counted since it was created.  It
+    may also have a method get_file_io() that returns a map {filename :
+    (bytes_read, bytes_written)} of the I/O that it has done since it
+    was created.  Only a weak reference to SOURCE is kept; if it is
+    garbage collected without being unregistered, the events that it
+    counted since the end of the previous pass are lost."""
+
+    self._sources[id(source)] = (weakref.ref(source), ({}, {},))
+
+  def unregister(self, source):
+    """Add the final counts of SOURCE and stop reading them.
+
+    This method should be called when SOURCE is closed."""
+
+    try:
+      (ref, baseline) = self._sources.pop(id(source))
+    except KeyError:
+      return
+    self._add_increase(self._counts, self._file_io, baseline, source)
+
+  def _get_totals(self):
+    """Return the tuple (counts, file_io) for the current pass."""
+
+    counts = self._counts.copy()
+    file_io = {}
+    for (filename, io) in self._file_io.iteritems():
+      file_io[filename] = io[:]
+    for (ref, baseline) in self._sources.values():
+      source = ref()
+      if source is not None:
+        self._add_increase(counts, file_io, baseline, source)
+    return (counts, file_io,)
+
+  def get_counts(self):
+    """Return a map {name : count} of all counts for the current pass."""
+
+    return self._get_totals()[0]
+
+  def get_file_io(self):
+    """Return a map {filename : (bytes_read, bytes_written)}.
+
+    The map describes the I/O that was counted during the current
+    pass."""
+
+    retval = {}
+    for (filename, (bytes_read, bytes_written)) \
+            in self._get_totals()[1].iteritems():
+      retval[filename] = (bytes_read, bytes_written,)
+    return retval
+
+
+# The default _Counters instance:
+counters = _Counters()
+
+
+def get_max_rss():
+  """Return the peak resident set size of this process, in KiB.
+
+  This is the high-water mark for the lifetime of the process, not
+  just the current pass.  The value includes the largest child process
+  that has been waited for.  Return None if the value cannot be
+  determined on this platform."""
+
+  if resource is None:
+    return None
+
+  try:
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+  except (AttributeError, ValueError, resource.error):
+    return None
+
+
+def get_io_counts():
+  """Return the number of bytes (read, written) by this process so far.
+
+  The counts include all I/O done through system calls, whether or not
+  it hit the disk.  Return None if the values cannot be determined on
+  this platform (currently they are only available under Linux)."""
+
+  try:
+    f = open('/proc/self/io', 'r')
+  except IOError:
+    return None
+
+  try:
+    values = {}
+    for line in f:
+      (name, value) = line.split(':', 1)
+      values[name.strip()] = int(value)
+  finally:
+    f.close()
+
+  try:
+    return (values['rchar'], values['wchar'],)
+  except KeyError:
+    return None
+
+
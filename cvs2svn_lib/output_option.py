@@ -17,9 +17,41 @@
 """This module contains classes that hold the cvs2svn output options."""
 
 
+import os
+
+from cvs2svn_lib.common import FatalError
+
+
+def reopen_output_file(filename, offset):
+  """Open the output file FILENAME to continue writing at OFFSET.
+
+  Anything after OFFSET, which was written after an OutputPass
+  checkpoint, is discarded.  Return the file object."""
+
+  if not os.path.isfile(filename) or os.path.getsize(filename) < offset:
+    raise FatalError(
+        'Output file %s is shorter than at the OutputPass checkpoint.'
+        % (filename,)
+        )
+  f = open(filename, 'rb+')
+  f.truncate(offset)
+  f.seek(offset)
+  return f
+
+
 class OutputOption:
   """Represents an output choice for a run of cvs2svn."""
 
+  # True iff this output option implements get_checkpoint() and
+  # resume(), so that OutputPass can be resumed after an interruption
+  # (see --checkpoint-interval):
+  supports_checkpoints = False
+
+  # True iff this output option implements begin_replay(),
+  # end_replay(), and get_incremental_state(), so that it can continue
+  # the output of an earlier conversion (see --incremental):
+  supports_incremental = False
+
   def register_artifacts(self, which_pass):
     """Register artifacts that will be needed for this output option.
 
@@ -52,6 +84,50 @@ class OutputOption:
 
     raise NotImplementedError()
 
+  def get_checkpoint(self):
+    """Return a picklable object describing the state of the output.
+
+    This is called between commits.  Any output written so far has to
+    be flushed to disk first."""
+
+    raise NotImplementedError()
+
+  def resume(self, svn_rev_count, checkpoint):
+    """Prepare this output option to continue after a checkpoint.
+
+    CHECKPOINT is an object returned by get_checkpoint().  This method
+    is called instead of setup() when OutputPass is resumed; only the
+    commits after the checkpoint are output."""
+
+    raise NotImplementedError()
+
+  def begin_replay(self):
+    """Start replaying the commits output by an earlier conversion.
+
+    This method is called before setup().  The commits that follow are
+    processed as usual, but only to bring the state of this output
+    option up to date; nothing is written for them until end_replay()
+    is called."""
+
+    raise NotImplementedError()
+
+  def end_replay(self, state):
+    """Stop replaying commits; output the commits that follow.
+
+    STATE is the object that get_incremental_state() returned at the
+    end of the earlier conversion."""
+
+    raise NotImplementedError()
+
+  def get_incremental_state(self):
+    """Return a picklable object needed to continue this output later.
+
+    This is called after the last commit has been processed, before
+    cleanup().  The object is passed to end_replay() by the next
+    incremental conversion."""
+
+    raise NotImplementedError()
+
   def process_initial_project_commit(self, svn_commit):
     """Process SVN_COMMIT, which is an SVNInitialProjectCommit."""
 
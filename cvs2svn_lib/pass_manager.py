@@ -17,13 +17,27 @@
 """This module contains tools to manage the passes of a conversion."""
 
 
+import sys
+import os
 import time
 import gc
+import signal
+import traceback
+
+try:
+  import threading
+except ImportError:
+  # Python was built without thread support:
+  threading = None
 
 from cvs2svn_lib import config
+from cvs2svn_lib.common import FatalException
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
+from cvs2svn_lib.instrumentation import get_max_rss
+from cvs2svn_lib.instrumentation import get_io_counts
 from cvs2svn_lib.stats_keeper import StatsKeeper
 from cvs2svn_lib.stats_keeper import read_stats_keeper
 from cvs2svn_lib.artifact_manager import artifact_manager
@@ -35,6 +49,52 @@ class InvalidPassError(FatalError):
         self, msg + '\nUse --help-passes for more information.')
 
 
+class _ConsumerWatchdog(object):
+  """Wait for the consumer process of a pipelined pair of passes.
+
+  If the consumer exits before the producer has opened all of the
+  named pipes between them (e.g., because of an error in its setup),
+  the producer would block forever in open().  Therefore, when the
+  consumer has failed, each named pipe is opened for reading (so that
+  an open() that is already blocked returns), unlinked (so that a
+  later open() creates a regular file instead), and closed again (so
+  that further writes to it fail).  Either way, the producer then runs
+  to completion or fails."""
+
+  def __init__(self, pid, filenames):
+    self.pid = pid
+    self.filenames = filenames
+
+    # The exit status of the consumer, or None if it is still running:
+    self.status = None
+
+    self._thread = threading.Thread(target=self._run)
+    self._thread.setDaemon(True)
+    self._thread.start()
+
+  def join(self):
+    """Wait until the consumer has exited."""
+
+    self._thread.join()
+
+  def _run(self):
+    (pid, self.status) = os.waitpid(self.pid, 0)
+    if self.status == 0:
+      return
+
+    for filename in self.filenames:
+      try:
+        fd = os.open(filename, os.O_RDONLY | os.O_NONBLOCK)
+      except OSError:
+        fd = None
+      try:
+        os.unlink(filename)
+      except OSError:
+        pass
+      if fd is not None:
+        os.close(fd)
+
+
 def check_for_garbage():
   # We've turned off the garbage collector because we shouldn't
   # need it (we don't create circular dependencies) and because it
@@ -76,6 +136,11 @@ class Pass(object):
 
     artifact_manager.register_temp_file_needed(basename, self)
 
+  def _register_temp_file_streamed(self, basename):
+    """Helper method; for brevity only."""
+
+    artifact_manager.register_temp_file_streamed(basename, self)
+
   def run(self, run_options, stats_keeper):
     """Carry out this step of the conversion.
 
@@ -132,11 +197,20 @@ class PassManager:
   def run(self, run_options):
     """Run the specified passes, one after another.
 
+    If Ctx().pipeline_passes is set, then pairs of consecutive passes
+    where the second pass only reads the output of the first pass as a
+    stream are run concurrently (see _run_pipelined()).
+
+    If Ctx().keep_databases_loaded is set, then read-only databases
+    that are opened via artifact_manager.open_resident() are kept
+    loaded from one pass to the next as long as they are still valid.
+
     RUN_OPTIONS will be passed to the Passes' run() methods.
     RUN_OPTIONS.start_pass is the number of the first pass that should
     be run.  RUN_OPTIONS.end_pass is the number of the last pass that
     should be run.  It must be that 1 <= RUN_OPTIONS.start_pass <=
-    RUN_OPTIONS.end_pass <= self.num_passes."""
+    RUN_OPTIONS.end_pass <= self.num_passes.  The passes whose numbers
+    are in RUN_OPTIONS.profile_passes are profiled (see _run_pass())."""
 
     # Convert start_pass and end_pass into the indices of the passes
     # to execute, using the Python index range convention (i.e., first
@@ -163,37 +237,36 @@ class PassManager:
     for the_pass in self.passes[0:index_start]:
       artifact_manager.pass_skipped(the_pass)
 
+    # Keep read-only databases loaded from one pass to the next if
+    # requested:
+    artifact_manager.set_keep_resident(Ctx().keep_databases_loaded)
+
     start_time = time.time()
-    for i in range(index_start, index_end):
+    i = index_start
+    while i < index_end:
+      if i + 1 < index_end and self._can_pipeline(i):
+        (stats_keeper, start_time) = self._run_pipelined(
+            i, run_options, start_time
+            )
+        i += 2
+        continue
+
       the_pass = self.passes[i]
       logger.quiet('----- pass %d (%s) -----' % (i + 1, the_pass.name,))
       artifact_manager.pass_started(the_pass)
 
-      if i == 0:
-        stats_keeper = StatsKeeper()
-      else:
-        stats_keeper = read_stats_keeper(
-            artifact_manager.get_temp_file(
-                config.STATISTICS_FILE % (i + 1 - 1,)
-                )
-            )
+      stats_keeper = self._get_stats_keeper(i)
 
-      the_pass.run(run_options, stats_keeper)
+      io_start = self._start_measurement()
+      profile = self._run_pass(i, run_options, stats_keeper)
       end_time = time.time()
-      stats_keeper.log_duration_for_pass(
-          end_time - start_time, i + 1, the_pass.name
-          )
-      logger.normal(stats_keeper.single_pass_timing(i + 1))
-      stats_keeper.archive(
-          artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
-          )
+      resources = self._get_resources(i, io_start, profile)
+      self._pass_finished(i, stats_keeper, end_time - start_time, resources)
       start_time = end_time
-      Ctx().clean()
-      # Allow the artifact manager to clean up artifacts that are no
-      # longer needed:
-      artifact_manager.pass_done(the_pass, Ctx().skip_cleanup)
+      i += 1
 
-      check_for_garbage()
+    # Discard any databases that are still loaded:
+    artifact_manager.set_keep_resident(False)
 
     # Tell the artifact manager about passes that are being deferred:
     for the_pass in self.passes[index_end:]:
@@ -201,10 +274,271 @@ class PassManager:
 
     logger.quiet(stats_keeper)
     logger.normal(stats_keeper.timings())
+    logger.verbose(stats_keeper.resources())
+
+    if Ctx().stats_filename is not None:
+      stats_keeper.write_data(Ctx().stats_filename)
 
     # Consistency check:
     artifact_manager.check_clean()
 
+  def _get_stats_keeper(self, i):
+    """Return the StatsKeeper to be used by pass number I + 1.
+
+    The pass must already have been started."""
+
+    if i == 0:
+      return StatsKeeper()
+    else:
+      return read_stats_keeper(
+          artifact_manager.get_temp_file(
+              config.STATISTICS_FILE % (i + 1 - 1,)
+              )
+          )
+
+  def _run_pass(self, i, run_options, stats_keeper):
+    """Run pass number I + 1.
+
+    If the pass number is in RUN_OPTIONS.profile_passes, then run the
+    pass under the profiler, writing the profiling data to a file
+    'cvs2svn-passN.cProfile' (or 'cvs2svn-passN.hotshot' for old
+    versions of Python) in the temporary directory.  The file is not
+    registered as an artifact, because it has to outlive the
+    conversion.  Return the name of the file containing the profiling
+    data, or None if the pass was not profiled."""
+
+    the_pass = self.passes[i]
+    if i + 1 not in run_options.profile_passes:
+      the_pass.run(run_options, stats_keeper)
+      return None
+
+    try:
+      import cProfile
+    except ImportError:
+      # Old version of Python without cProfile.  Use hotshot instead.
+      import hotshot
+      filename = Ctx().get_temp_filename('cvs2svn-pass%d.hotshot' % (i + 1,))
+      prof = hotshot.Profile(filename)
+      try:
+        prof.runcall(the_pass.run, run_options, stats_keeper)
+      finally:
+        prof.close()
+    else:
+      filename = Ctx().get_temp_filename(
+          'cvs2svn-pass%d.cProfile' % (i + 1,)
+          )
+      prof = cProfile.Profile()
+      try:
+        prof.runcall(the_pass.run, run_options, stats_keeper)
+      finally:
+        prof.dump_stats(filename)
+
+    logger.normal('Profiling data for pass %d written to %s.' % (
+        i + 1, filename,
+        ))
+    return filename
+
+  def _start_measurement(self):
+    """Prepare to measure the resources used by a pass.
+
+    Return the I/O counts at the start of the pass, to be passed to
+    _get_resources() when the pass is done."""
+
+    counters.reset()
+    return get_io_counts()
+
+  def _get_resources(self, i, io_start, profile):
+    """Return a map describing the resources used by pass number I + 1.
+
+    IO_START is the value returned by _start_measurement() when the
+    pass was started, or None if the I/O counts are not known.
+    PROFILE is the name of the file containing the profiling data for
+    the pass, or None.  The result is in the form expected by
+    StatsKeeper.log_resources_for_pass().  This method must be called
+    before the artifact manager is told that the pass is done."""
+
+    resources = {}
+
+    max_rss = get_max_rss()
+    if max_rss is not None:
+      resources['max_rss'] = max_rss
+
+    if io_start is not None:
+      io_end = get_io_counts()
+      if io_end is not None:
+        resources['bytes_read'] = io_end[0] - io_start[0]
+        resources['bytes_written'] = io_end[1] - io_start[1]
+
+    (resources['artifacts_created'], resources['artifacts_needed'],) = \
+        artifact_manager.get_artifact_sizes(self.passes[i])
+
+    resources['counters'] = counters.get_counts()
+    resources['artifacts'] = artifact_manager.get_artifact_io(
+        self.passes[i], counters.get_file_io()
+        )
+
+    if profile is not None:
+      resources['profile'] = profile
+
+    return resources
+
+  def _pass_finished(self, i, stats_keeper, duration, resources):
+    """Do the bookkeeping after pass number I + 1 has completed.
+
+    Record DURATION and RESOURCES to STATS_KEEPER, archive the
+    statistics, and allow the artifact manager to clean up the
+    artifacts that are no longer needed."""
+
+    the_pass = self.passes[i]
+    stats_keeper.log_duration_for_pass(duration, i + 1, the_pass.name)
+    stats_keeper.log_resources_for_pass(i + 1, resources)
+    logger.normal(stats_keeper.single_pass_timing(i + 1))
+    stats_keeper.archive(
+        artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+        )
+    Ctx().clean()
+    # Allow the artifact manager to clean up artifacts that are no
+    # longer needed:
+    artifact_manager.pass_done(the_pass, Ctx().skip_cleanup)
+
+    check_for_garbage()
+
+  def _can_pipeline(self, i):
+    """Return True iff passes I + 1 and I + 2 can be run concurrently.
+
+    This is only possible if pipelining was requested, if the platform
+    supports named pipes and fork(), and if everything that the second
+    pass needs from the first pass is registered as being read as a
+    stream."""
+
+    if not Ctx().pipeline_passes or Ctx().skip_cleanup:
+      return False
+
+    if not (hasattr(os, 'fork') and hasattr(os, 'mkfifo')):
+      return False
+
+    # A thread is needed to watch the consumer (see _ConsumerWatchdog):
+    if threading is None:
+      return False
+
+    return artifact_manager.get_streamed_artifacts(
+        self.passes[i], self.passes[i + 1],
+        ignore=[config.STATISTICS_FILE % (i + 1,)],
+        ) is not None
+
+  def _run_pipelined(self, i, run_options, start_time):
+    """Run passes I + 1 and I + 2 concurrently.
+
+    The streamed artifacts between the two passes are replaced by
+    named pipes.  The consumer pass is run in a child process while
+    the producer pass runs in this process.  The consumer is passed a
+    copy of the StatsKeeper as it was before the producer ran, and any
+    changes that it makes to its copy are discarded; therefore, only
+    passes that do not record statistics should register streamed
+    artifacts.  The resources used by the consumer are only partly
+    known; in particular, its event counters and I/O counts are lost.
+    START_TIME is the time from which the producer's duration should
+    be measured.  Return a tuple (stats_keeper, end_time), where
+    STATS_KEEPER is the StatsKeeper after both passes and END_TIME is
+    the time at which both passes had completed."""
+
+    producer = self.passes[i]
+    consumer = self.passes[i + 1]
+
+    fifos = [
+        artifact.filename
+        for artifact in artifact_manager.get_streamed_artifacts(
+            producer, consumer, ignore=[config.STATISTICS_FILE % (i + 1,)],
+            )
+        ]
+    for filename in fifos:
+      if os.path.exists(filename):
+        os.unlink(filename)
+      os.mkfifo(filename)
+
+    logger.quiet(
+        '----- passes %d (%s) and %d (%s), pipelined -----'
+        % (i + 1, producer.name, i + 2, consumer.name,)
+        )
+    artifact_manager.pass_started(producer)
+    artifact_manager.pass_started(consumer)
+
+    stats_keeper = self._get_stats_keeper(i)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    io_start = self._start_measurement()
+    pid = os.fork()
+    if pid == 0:
+      # This is the child process, which runs the consumer.  Never
+      # return from here, so that the caller's cleanup code is only
+      # executed by the parent:
+      status = 1
+      try:
+        try:
+          self._run_pass(i + 1, run_options, stats_keeper)
+          status = 0
+        except FatalException, e:
+          sys.stderr.write(str(e) + '\n')
+        except:
+          traceback.print_exc()
+      finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+    consumer_failed = FatalError(
+        'Pass %d (%s) failed while running pipelined with pass %d (%s).'
+        % (i + 2, consumer.name, i + 1, producer.name,)
+        )
+    watchdog = _ConsumerWatchdog(pid, fifos)
+
+    try:
+      profile = self._run_pass(i, run_options, stats_keeper)
+    except:
+      exc_info = sys.exc_info()
+      if watchdog.status is None:
+        try:
+          os.kill(pid, signal.SIGTERM)
+        except OSError:
+          pass
+        watchdog.join()
+      else:
+        # The consumer exited first, so its failure is probably what
+        # caused the producer's error:
+        watchdog.join()
+        if watchdog.status != 0:
+          raise consumer_failed
+      raise exc_info[0], exc_info[1], exc_info[2]
+
+    producer_end_time = time.time()
+    resources = self._get_resources(i, io_start, profile)
+    self._pass_finished(
+        i, stats_keeper, producer_end_time - start_time, resources
+        )
+
+    watchdog.join()
+    if watchdog.status != 0:
+      raise consumer_failed
+    end_time = time.time()
+
+    # The consumer's event counts and database I/O were collected in
+    # the child process:
+    resources = self._get_resources(i + 1, None, None)
+    del resources['counters']
+    resources['artifacts'] = artifact_manager.get_artifact_io(
+        self.passes[i + 1], {}
+        )
+
+    # Only the time that the consumer ran beyond the end of the
+    # producer is charged to the consumer, so that the total of the
+    # pass timings is still the elapsed time of the conversion:
+    self._pass_finished(
+        i + 1, stats_keeper, end_time - producer_end_time, resources
+        )
+
+    return (stats_keeper, end_time)
+
   def help_passes(self):
     """Output (to sys.stdout) the indices and names of available passes."""
 
@@ -18,8 +18,17 @@
 
 
 import sys
+import os
+import re
 import shutil
 import cPickle
+from collections import deque
+
+try:
+  import multiprocessing
+except ImportError:
+  # Python versions before 2.6:
+  multiprocessing = None
 
 from cvs2svn_lib import config
 from cvs2svn_lib.context import Ctx
@@ -40,6 +49,8 @@ from cvs2svn_lib.cvs_path_database import CVSPathDatabase
 from cvs2svn_lib.metadata_database import MetadataDatabase
 from cvs2svn_lib.project import read_projects
 from cvs2svn_lib.project import write_projects
+from cvs2svn_lib.incremental_state import IncrementalState
+from cvs2svn_lib.incremental_state import read_incremental_state
 from cvs2svn_lib.symbol import LineOfDevelopment
 from cvs2svn_lib.symbol import Trunk
 from cvs2svn_lib.symbol import Symbol
@@ -71,6 +82,7 @@ from cvs2svn_lib.changeset_graph_link import ChangesetGraphLink
 from cvs2svn_lib.changeset_database import ChangesetDatabase
 from cvs2svn_lib.changeset_database import CVSItemToChangesetTable
 from cvs2svn_lib.svn_commit import SVNRevisionCommit
+from cvs2svn_lib.svn_commit import SVNSymbolCommit
 from cvs2svn_lib.openings_closings import SymbolingsLogger
 from cvs2svn_lib.svn_commit_creator import SVNCommitCreator
 from cvs2svn_lib.persistence_manager import PersistenceManager
@@ -110,13 +122,74 @@ class CollectRevsPass(Pass):
                            + "\n".join(fatal_errors) + "\n"
                            + "Exited due to fatal error(s).")
 
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
     write_projects(artifact_manager.get_temp_file(config.PROJECTS))
     logger.quiet("Done")
 
 
+# Log messages that contain only ASCII characters do not match this
+# regular expression:
+_non_ascii_re = re.compile(r'[\x80-\xff]')
+
+
+def _get_clean_log_msg(log_msg):
+  """Return LOG_MSG, converted appropriately to UTF8.
+
+  Raise a UnicodeException if it cannot be converted using the
+  configured cvs_log_decoder."""
+
+  try:
+    clean_log_msg = Ctx().cvs_log_decoder(log_msg)
+  except UnicodeError:
+    raise UnicodeError(
+        'Problem decoding log message:\n'
+        '%s\n'
+        '%s\n'
+        '%s'
+        % ('-' * 75, log_msg, '-' * 75,)
+        )
+
+  try:
+    return clean_log_msg.encode('utf8')
+  except UnicodeError:
+    raise UnicodeError(
+        'Problem encoding log message:\n'
+        '%s\n'
+        '%s\n'
+        '%s'
+        % ('-' * 75, log_msg, '-' * 75,)
+        )
+
+
+def _get_clean_log_msgs(log_msgs):
+  """Convert LOG_MSGS to UTF8 and return a list of the results.
+
+  Each result is a tuple (clean_log_msg, error), where error is None
+  or the message of the UnicodeError that prevented LOG_MSG from being
+  converted (in which case clean_log_msg is the original LOG_MSG).
+  This function is run in the worker processes of CleanMetadataPass,
+  so it must not rely on any state other than that of Ctx()."""
+
+  retval = []
+  for log_msg in log_msgs:
+    try:
+      retval.append((_get_clean_log_msg(log_msg), None,))
+    except UnicodeError, e:
+      retval.append((log_msg, str(e),))
+  return retval
+
+
 class CleanMetadataPass(Pass):
-  """Clean up CVS revision metadata and write it to a new database."""
+  """Clean up CVS revision metadata and write it to a new database.
+
+  The records are processed in batches of BATCH_SIZE.  If Ctx().jobs
+  is greater than one, the log messages of each batch are converted by
+  a pool of worker processes while the main process writes the results
+  of earlier batches (in id order) to the new database.  Log messages
+  that contain only ASCII characters are not decoded at all if the
+  configured cvs_log_decoder leaves ASCII strings unchanged."""
+
+  BATCH_SIZE = 1000
 
   def register_artifacts(self):
     self._register_temp_file(config.METADATA_CLEAN_INDEX_TABLE)
@@ -150,78 +223,136 @@ class CleanMetadataPass(Pass):
     self._authors[author] = clean_author
     return clean_author
 
-  def _get_clean_log_msg(self, log_msg):
-    """Return LOG_MSG, converted appropriately to UTF8.
-
-    Raise a UnicodeException if it cannot be converted using the
-    configured cvs_log_decoder."""
+  def _needs_decoding(self, log_msg):
+    """Return True iff LOG_MSG has to be passed to cvs_log_decoder."""
 
-    try:
-      clean_log_msg = Ctx().cvs_log_decoder(log_msg)
-    except UnicodeError:
-      raise UnicodeError(
-          'Problem decoding log message:\n'
-          '%s\n'
-          '%s\n'
-          '%s'
-          % ('-' * 75, log_msg, '-' * 75,)
-          )
-
-    try:
-      return clean_log_msg.encode('utf8')
-    except UnicodeError:
-      raise UnicodeError(
-          'Problem encoding log message:\n'
-          '%s\n'
-          '%s\n'
-          '%s'
-          % ('-' * 75, log_msg, '-' * 75,)
-          )
-
-  def _clean_metadata(self, metadata):
-    """Clean up METADATA by overwriting its members as necessary."""
-
-    try:
-      metadata.author = self._get_clean_author(metadata.author)
-    except UnicodeError, e:
-      logger.warn('%s: %s' % (warning_prefix, e,))
-      self.warnings = True
-
-    try:
-      metadata.log_msg = self._get_clean_log_msg(metadata.log_msg)
-    except UnicodeError, e:
-      logger.warn('%s: %s' % (warning_prefix, e,))
-      self.warnings = True
-
-  def run(self, run_options, stats_keeper):
-    logger.quiet("Converting metadata to UTF8...")
-    metadata_db = MetadataDatabase(
-        artifact_manager.get_temp_file(config.METADATA_STORE),
-        artifact_manager.get_temp_file(config.METADATA_INDEX_TABLE),
-        DB_OPEN_READ,
-        )
-    metadata_clean_db = MetadataDatabase(
-        artifact_manager.get_temp_file(config.METADATA_CLEAN_STORE),
-        artifact_manager.get_temp_file(config.METADATA_CLEAN_INDEX_TABLE),
-        DB_OPEN_NEW,
+    return not (
+        self._ascii_fast_path
+        and isinstance(log_msg, str)
+        and _non_ascii_re.search(log_msg) is None
         )
 
-    self.warnings = False
+  def _iter_batches(self, metadata_db):
+    """Generate (batch, log_msgs) for the records in METADATA_DB.
 
-    # A map {author : clean_author} for those known (to avoid
-    # repeating warnings):
-    self._authors = {}
+    batch is a list of up to BATCH_SIZE Metadata instances, in id
+    order; log_msgs is the list of their log messages that need to be
+    decoded."""
 
+    batch = []
+    log_msgs = []
     for id in metadata_db.iterkeys():
       metadata = metadata_db[id]
+      batch.append(metadata)
+      if self._needs_decoding(metadata.log_msg):
+        log_msgs.append(metadata.log_msg)
+      if len(batch) >= self.BATCH_SIZE:
+        yield (batch, log_msgs)
+        batch = []
+        log_msgs = []
+
+    if batch:
+      yield (batch, log_msgs)
 
+  def _write_batch(self, metadata_clean_db, batch, results):
+    """Clean the Metadata instances in BATCH and write them to the database.
+
+    RESULTS is the output of _get_clean_log_msgs() for the log
+    messages of BATCH that needed decoding."""
+
+    results = iter(results)
+    for metadata in batch:
       # Record the original author name because it might be needed for
       # expanding CVS keywords:
       metadata.original_author = metadata.author
 
-      self._clean_metadata(metadata)
+      try:
+        metadata.author = self._get_clean_author(metadata.author)
+      except UnicodeError, e:
+        logger.warn('%s: %s' % (warning_prefix, e,))
+        self.warnings = True
+
+      if self._needs_decoding(metadata.log_msg):
+        (log_msg, error) = results.next()
+        if error is None:
+          metadata.log_msg = log_msg
+        else:
+          logger.warn('%s: %s' % (warning_prefix, error,))
+          self.warnings = True
+      else:
+        self._ascii_count += 1
+
+      metadata_clean_db[metadata.id] = metadata
+
+  def _get_pool(self):
+    """Return a multiprocessing.Pool for Ctx().jobs workers, or None.
+
+    The workers rely on inheriting Ctx() from this process, so a pool
+    is only used on platforms that support fork()."""
 
-      metadata_clean_db[id] = metadata
+    if Ctx().jobs <= 1 or multiprocessing is None or not hasattr(os, 'fork'):
+      return None
+
+    return multiprocessing.Pool(Ctx().jobs)
+
+  def run(self, run_options, stats_keeper):
+    logger.quiet("Converting metadata to UTF8...")
+    self._ascii_fast_path = Ctx().cvs_log_decoder.preserves_ascii()
+    pool = self._get_pool()
+    try:
+      metadata_db = MetadataDatabase(
+          artifact_manager.get_temp_file(config.METADATA_STORE),
+          artifact_manager.get_temp_file(config.METADATA_INDEX_TABLE),
+          DB_OPEN_READ,
+          )
+      metadata_clean_db = MetadataDatabase(
+          artifact_manager.get_temp_file(config.METADATA_CLEAN_STORE),
+          artifact_manager.get_temp_file(config.METADATA_CLEAN_INDEX_TABLE),
+          DB_OPEN_NEW,
+          )
+
+      self.warnings = False
+
+      # A map {author : clean_author} for those known (to avoid
+      # repeating warnings):
+      self._authors = {}
+
+      # The number of log messages that didn't need decoding:
+      self._ascii_count = 0
+
+      if pool is None:
+        for (batch, log_msgs) in self._iter_batches(metadata_db):
+          self._write_batch(
+              metadata_clean_db, batch, _get_clean_log_msgs(log_msgs)
+              )
+      else:
+        # A queue of (batch, async_result) for batches that have been
+        # handed to the pool but not yet written.  The queue length is
+        # limited to bound memory usage:
+        pending = deque()
+        for (batch, log_msgs) in self._iter_batches(metadata_db):
+          pending.append(
+              (batch, pool.apply_async(_get_clean_log_msgs, (log_msgs,)),)
+              )
+          if len(pending) > 2 * Ctx().jobs:
+            (batch, async_result) = pending.popleft()
+            self._write_batch(metadata_clean_db, batch, async_result.get())
+
+        while pending:
+          (batch, async_result) = pending.popleft()
+          self._write_batch(metadata_clean_db, batch, async_result.get())
+
+        pool.close()
+        pool.join()
+        pool = None
+    finally:
+      if pool is not None:
+        pool.terminate()
+
+    logger.verbose(
+        '%d log messages were pure ASCII and did not need decoding.'
+        % (self._ascii_count,)
+        )
 
     if self.warnings:
       raise FatalError(
@@ -396,8 +527,9 @@ class CollateSymbolsPass(Pass):
       return retval
 
   def run(self, run_options, stats_keeper):
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
         )
     self.symbol_stats = SymbolStatistics(
         artifact_manager.get_temp_file(config.SYMBOL_STATISTICS)
@@ -440,11 +572,16 @@ class FilterSymbolsPass(Pass):
     Ctx().revision_collector.register_artifacts(self)
 
   def run(self, run_options, stats_keeper):
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     cvs_item_store = OldCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_STORE))
 
@@ -504,8 +641,8 @@ class FilterSymbolsPass(Pass):
     symbol_db.close()
     revision_collector.finish()
     cvs_item_store.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -515,7 +652,7 @@ class SortRevisionsPass(Pass):
 
   def register_artifacts(self):
     self._register_temp_file(config.CVS_REVS_SORTED_DATAFILE)
-    self._register_temp_file_needed(config.CVS_REVS_DATAFILE)
+    self._register_temp_file_streamed(config.CVS_REVS_DATAFILE)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting CVS revision summaries...")
@@ -534,7 +671,7 @@ class SortSymbolsPass(Pass):
 
   def register_artifacts(self):
     self._register_temp_file(config.CVS_SYMBOLS_SORTED_DATAFILE)
-    self._register_temp_file_needed(config.CVS_SYMBOLS_DATAFILE)
+    self._register_temp_file_streamed(config.CVS_SYMBOLS_DATAFILE)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting CVS symbol summaries...")
@@ -561,8 +698,8 @@ class InitializeChangesetsPass(Pass):
     self._register_temp_file_needed(config.SYMBOL_DB)
     self._register_temp_file_needed(config.CVS_PATHS_DB)
     self._register_temp_file_needed(config.ITEM_SERIALIZER)
-    self._register_temp_file_needed(config.CVS_REVS_SORTED_DATAFILE)
-    self._register_temp_file_needed(
+    self._register_temp_file_streamed(config.CVS_REVS_SORTED_DATAFILE)
+    self._register_temp_file_streamed(
         config.CVS_SYMBOLS_SORTED_DATAFILE)
 
   def get_revision_changesets(self):
@@ -758,11 +895,16 @@ class InitializeChangesetsPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Creating preliminary commit sets...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
 
     f = open(artifact_manager.get_temp_file(config.ITEM_SERIALIZER), 'rb')
     self.cvs_item_serializer = cPickle.load(f)
@@ -796,8 +938,8 @@ class InitializeChangesetsPass(Pass):
     self.sorted_cvs_items_db.close()
     cvs_item_to_changeset_id.close()
     changeset_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     del self.cvs_item_serializer
 
@@ -821,6 +963,19 @@ class ProcessedChangesetLogger:
       del self.processed_changeset_ids[:]
 
 
+def _compact_changeset_db(changeset_db):
+  """Compact CHANGESET_DB if many of its records are dead.
+
+  Breaking cycles deletes and rewrites changesets, which leaves dead
+  records in the database.  Compacting it writes the live changesets
+  in id order, which is the order in which the following passes read
+  them."""
+
+  dead_fraction = changeset_db.get_dead_fraction()
+  if dead_fraction >= config.CHANGESETS_COMPACT_DEAD_FRACTION:
+    changeset_db.compact()
+
+
 class BreakRevisionChangesetCyclesPass(Pass):
   """Break up any dependency cycles involving only RevisionChangesets."""
 
@@ -892,11 +1047,16 @@ class BreakRevisionChangesetCyclesPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking revision changeset dependency cycles...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -915,7 +1075,7 @@ class BreakRevisionChangesetCyclesPass(Pass):
     changeset_db = ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_REVBROKEN_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_REVBROKEN_INDEX),
-        DB_OPEN_NEW)
+        DB_OPEN_NEW, track_dead_records=True)
 
     self.changeset_graph = ChangesetGraph(
         changeset_db, cvs_item_to_changeset_id
@@ -941,11 +1101,12 @@ class BreakRevisionChangesetCyclesPass(Pass):
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
+    _compact_changeset_db(changeset_db)
     self.changeset_graph.close()
     self.changeset_graph = None
     Ctx()._cvs_items_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -1018,11 +1179,16 @@ class RevisionTopologicalSortPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Generating CVSRevisions in commit order...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -1038,8 +1204,8 @@ class RevisionTopologicalSortPass(Pass):
 
     changesets_revordered_db.close()
     Ctx()._cvs_items_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -1114,11 +1280,16 @@ class BreakSymbolChangesetCyclesPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking symbol changeset dependency cycles...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -1137,7 +1308,7 @@ class BreakSymbolChangesetCyclesPass(Pass):
     changeset_db = ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_SYMBROKEN_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_SYMBROKEN_INDEX),
-        DB_OPEN_NEW)
+        DB_OPEN_NEW, track_dead_records=True)
 
     self.changeset_graph = ChangesetGraph(
         changeset_db, cvs_item_to_changeset_id
@@ -1163,11 +1334,12 @@ class BreakSymbolChangesetCyclesPass(Pass):
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
+    _compact_changeset_db(changeset_db)
     self.changeset_graph.close()
     self.changeset_graph = None
     Ctx()._cvs_items_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -1334,11 +1506,16 @@ class BreakAllChangesetCyclesPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking CVSSymbol dependency loops...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -1357,7 +1534,7 @@ class BreakAllChangesetCyclesPass(Pass):
     self.changeset_db = ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_ALLBROKEN_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_ALLBROKEN_INDEX),
-        DB_OPEN_NEW)
+        DB_OPEN_NEW, track_dead_records=True)
 
     self.changeset_graph = ChangesetGraph(
         self.changeset_db, self.cvs_item_to_changeset_id
@@ -1441,6 +1618,7 @@ class BreakAllChangesetCyclesPass(Pass):
         self.break_cycle(self.changeset_graph.find_cycle(id))
 
     del self.processed_changeset_logger
+    _compact_changeset_db(self.changeset_db)
     self.changeset_graph.close()
     self.changeset_graph = None
     self.cvs_item_to_changeset_id = None
@@ -1507,11 +1685,16 @@ class TopologicalSortPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Generating CVSRevisions in commit order...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -1527,8 +1710,8 @@ class TopologicalSortPass(Pass):
     sorted_changesets.close()
 
     Ctx()._cvs_items_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -1573,9 +1756,63 @@ class CreateRevsPass(Pass):
     changeset_db.close()
 
   def get_svn_commits(self, creator):
-    """Generate the SVNCommits, in order."""
+    """Generate the SVNCommits, in order.
+
+    In a follow-up --incremental conversion, the commits for a symbol
+    are postponed until the revision number where the earlier
+    conversion first output that symbol (or until after the commits
+    that it output, for new symbols), so that the commits that were
+    output before keep their revision numbers.  (Otherwise, for
+    example, a new tag on old revisions would be inserted between
+    them.)"""
+
+    state = None
+    if Ctx().incremental_state_filename is not None:
+      state = read_incremental_state(Ctx().incremental_state_filename)
+
+    if state is None:
+      for (changeset, timestamp) in self.get_changesets():
+        for svn_commit in creator.process_changeset(changeset, timestamp):
+          yield svn_commit
+      return
+
+    new_symbol_revnum = len(state.digests) + 1
 
+    # A list of (revnum, changeset) for the SymbolChangesets that have
+    # to wait until REVNUM is the next revision number, in the order
+    # that they were encountered:
+    postponed = []
     for (changeset, timestamp) in self.get_changesets():
+      if isinstance(changeset, SymbolChangeset):
+        revnum = state.symbols.get(
+            (changeset.symbol.project.id, changeset.symbol.name),
+            new_symbol_revnum,
+            )
+        if creator.revnum_generator.get_last_id() + 1 < revnum:
+          logger.verbose('Postponing %s until r%d' % (changeset, revnum,))
+          postponed.append((revnum, changeset))
+          continue
+
+      for svn_commit in creator.process_changeset(changeset, timestamp):
+        yield svn_commit
+
+      # Process the postponed changesets whose turn has come.  They
+      # are dated like the last commit, to keep the dates in order:
+      i = 0
+      while i < len(postponed):
+        (revnum, postponed_changeset) = postponed[i]
+        if creator.revnum_generator.get_last_id() + 1 >= revnum:
+          del postponed[i]
+          for svn_commit in creator.process_changeset(
+                postponed_changeset, timestamp
+                ):
+            yield svn_commit
+          # Earlier entries might be ready now, too:
+          i = 0
+        else:
+          i += 1
+
+    for (revnum, changeset) in postponed:
       for svn_commit in creator.process_changeset(changeset, timestamp):
         yield svn_commit
 
@@ -1594,11 +1831,16 @@ class CreateRevsPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Mapping CVS revisions to Subversion commits...")
 
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
     Ctx()._cvs_items_db = IndexedCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
@@ -1619,8 +1861,8 @@ class CreateRevsPass(Pass):
     persistence_manager.close()
     Ctx()._symbolings_logger.close()
     Ctx()._cvs_items_db.close()
-    Ctx()._symbol_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
     logger.quiet("Done")
 
@@ -1630,7 +1872,7 @@ class SortSymbolOpeningsClosingsPass(Pass):
 
   def register_artifacts(self):
     self._register_temp_file(config.SYMBOL_OPENINGS_CLOSINGS_SORTED)
-    self._register_temp_file_needed(config.SYMBOL_OPENINGS_CLOSINGS)
+    self._register_temp_file_streamed(config.SYMBOL_OPENINGS_CLOSINGS)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting symbolic name source revisions...")
@@ -1695,12 +1937,15 @@ class IndexSymbolsPass(Pass):
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Determining offsets for all symbolic names...")
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
         )
-    Ctx()._symbol_db = SymbolDatabase()
     self.generate_offsets_for_symbolings()
-    Ctx()._symbol_db.close()
+    artifact_manager.close_resident(Ctx()._symbol_db)
     logger.quiet("Done.")
 
 
@@ -1718,13 +1963,96 @@ class OutputPass(Pass):
     self._register_temp_file_needed(config.SVN_COMMITS_INDEX_TABLE)
     self._register_temp_file_needed(config.SVN_COMMITS_STORE)
     self._register_temp_file_needed(config.CVS_REVS_TO_SVN_REVNUMS)
+    if self._checkpoints_enabled():
+      self._register_temp_file(config.OUTPUT_CHECKPOINT)
     Ctx().output_option.register_artifacts(self)
 
+  def _checkpoints_enabled(self):
+    return Ctx().checkpoint_interval and not Ctx().dry_run
+
+  def _write_checkpoint(self, revnum):
+    """Write the state of the output after REVNUM to OUTPUT_CHECKPOINT.
+
+    The checkpoint is written to a new file, which then replaces the
+    old one, so that an interruption never leaves a partial checkpoint
+    behind."""
+
+    checkpoint = Ctx().output_option.get_checkpoint()
+    filename = artifact_manager.get_temp_file(config.OUTPUT_CHECKPOINT)
+    new_filename = filename + '.new'
+    f = open(new_filename, 'wb')
+    cPickle.dump(
+        (revnum, Ctx().output_option.__class__.__name__, checkpoint,),
+        f, -1,
+        )
+    f.close()
+    if os.path.exists(filename):
+      # os.rename() cannot overwrite files on all platforms:
+      os.unlink(filename)
+    os.rename(new_filename, filename)
+    logger.verbose('Wrote OutputPass checkpoint after r%d.' % (revnum,))
+
+  def _read_checkpoint(self, run_options):
+    """Return the OUTPUT_CHECKPOINT to resume from, or None.
+
+    OutputPass is only resumed if it is the first pass that is run."""
+
+    if (
+          not self._checkpoints_enabled()
+          or run_options.start_pass
+              != run_options.pass_manager.get_pass_number(self.name)
+          ):
+      return None
+
+    filename = artifact_manager.get_temp_file(config.OUTPUT_CHECKPOINT)
+    if not os.path.exists(filename):
+      return None
+
+    f = open(filename, 'rb')
+    (revnum, output_option_name, checkpoint) = cPickle.load(f)
+    f.close()
+    if output_option_name != Ctx().output_option.__class__.__name__:
+      raise FatalError(
+          'The OutputPass checkpoint %s was written using different '
+          'output options.\n'
+          'Remove it to restart OutputPass from the beginning.'
+          % (filename,)
+          )
+    return (revnum, checkpoint)
+
+  def _check_incremental_state(self, state, digests):
+    """Check that the commits in STATE are the first commits of DIGESTS.
+
+    STATE is the IncrementalState written by the earlier conversion;
+    DIGESTS is a list of the digests of the SVNCommits of this
+    conversion."""
+
+    if state.output_option_name != Ctx().output_option.__class__.__name__:
+      raise FatalError(
+          'The incremental state file %s was written using different '
+          'output options.'
+          % (Ctx().incremental_state_filename,)
+          )
+
+    for (i, old_digest) in enumerate(state.digests):
+      if i >= len(digests) or digests[i] != old_digest:
+        raise FatalError(
+            'The conversion of r%d, which was output by the earlier '
+            'conversion, has changed.\n'
+            'Probably the history in the CVS repository was changed '
+            'retroactively (e.g., by moving a tag or by deleting a '
+            'revision).  A full conversion is needed.'
+            % (i + 1,)
+            )
+
   def run(self, run_options, stats_keeper):
-    Ctx()._projects = read_projects(
-        artifact_manager.get_temp_file(config.PROJECTS)
+    Ctx()._projects = artifact_manager.open_resident(
+        config.PROJECTS, read_projects,
+        artifact_manager.get_temp_file(config.PROJECTS),
+        )
+    Ctx()._cvs_path_db = artifact_manager.open_resident(
+        config.CVS_PATHS_DB, CVSPathDatabase, DB_OPEN_READ
         )
-    Ctx()._cvs_path_db = CVSPathDatabase(DB_OPEN_READ)
     Ctx()._metadata_db = MetadataDatabase(
         artifact_manager.get_temp_file(config.METADATA_CLEAN_STORE),
         artifact_manager.get_temp_file(config.METADATA_CLEAN_INDEX_TABLE),
@@ -1734,25 +2062,101 @@ class OutputPass(Pass):
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
         DB_OPEN_READ)
-    Ctx()._symbol_db = SymbolDatabase()
+    Ctx()._symbol_db = artifact_manager.open_resident(
+        config.SYMBOL_DB, SymbolDatabase
+        )
     Ctx()._persistence_manager = PersistenceManager(DB_OPEN_READ)
 
-    Ctx().output_option.setup(stats_keeper.svn_rev_count())
+    # The number of commits that were output by an earlier conversion,
+    # and therefore only have to be replayed (see --incremental):
+    replay_revnum = 0
+    if Ctx().incremental_state_filename is not None:
+      logger.normal('Computing the digests of the commits...')
+      digests = []
+      symbols = {}
+      for svn_commit in Ctx()._persistence_manager.iter_svn_commits():
+        digests.append(svn_commit.get_digest())
+        if isinstance(svn_commit, SVNSymbolCommit):
+          symbol = svn_commit.symbol
+          symbols.setdefault(
+              (symbol.project.id, symbol.name), svn_commit.revnum
+              )
+      state = read_incremental_state(Ctx().incremental_state_filename)
+      if state is not None:
+        self._check_incremental_state(state, digests)
+        replay_revnum = len(state.digests)
+
+    resume_point = self._read_checkpoint(run_options)
+    if resume_point is None:
+      start_revnum = 1
+      if replay_revnum:
+        logger.quiet(
+            'Replaying r1-r%d, which were output by the earlier '
+            'conversion.' % (replay_revnum,)
+            )
+        Ctx().output_option.begin_replay()
+      Ctx().output_option.setup(stats_keeper.svn_rev_count())
+      if self._checkpoints_enabled():
+        if replay_revnum:
+          # Remove any checkpoint left over from an earlier run; the
+          # first checkpoint is written when the replay is done:
+          filename = artifact_manager.get_temp_file(config.OUTPUT_CHECKPOINT)
+          if os.path.exists(filename):
+            os.unlink(filename)
+        else:
+          # Replace any checkpoint left over from an earlier run:
+          self._write_checkpoint(0)
+    else:
+      (revnum, checkpoint) = resume_point
+      if revnum < replay_revnum:
+        raise FatalError(
+            'The OutputPass checkpoint %s precedes the end of the '
+            'earlier conversion.\n'
+            'Remove it to restart OutputPass from the beginning.'
+            % (artifact_manager.get_temp_file(config.OUTPUT_CHECKPOINT),)
+            )
+      logger.quiet('Resuming OutputPass after r%d.' % (revnum,))
+      start_revnum = revnum + 1
+      Ctx().output_option.resume(stats_keeper.svn_rev_count(), checkpoint)
 
-    svn_revnum = 1
-    svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
-    while svn_commit:
+    for svn_commit in Ctx()._persistence_manager.iter_svn_commits(
+          start_revnum
+          ):
       svn_commit.output(Ctx().output_option)
-      svn_revnum += 1
-      svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
-
+      if svn_commit.revnum == replay_revnum:
+        Ctx().output_option.end_replay(state.output_state)
+        logger.quiet(
+            'Outputting the commits after r%d.' % (replay_revnum,)
+            )
+        if self._checkpoints_enabled():
+          self._write_checkpoint(svn_commit.revnum)
+      elif (
+            self._checkpoints_enabled()
+            and svn_commit.revnum > replay_revnum
+            and svn_commit.revnum % Ctx().checkpoint_interval == 0
+            ):
+        self._write_checkpoint(svn_commit.revnum)
+
+    if Ctx().incremental_state_filename is not None:
+      output_state = Ctx().output_option.get_incremental_state()
     Ctx().output_option.cleanup()
     Ctx()._persistence_manager.close()
 
-    Ctx()._symbol_db.close()
+    # The state is only recorded once the output is complete:
+    if Ctx().incremental_state_filename is not None and not Ctx().dry_run:
+      IncrementalState(
+          Ctx().output_option.__class__.__name__, digests, symbols,
+          output_state,
+          ).write(Ctx().incremental_state_filename)
+      logger.normal(
+          'Wrote the incremental state to %s.'
+          % (Ctx().incremental_state_filename,)
+          )
+
+    artifact_manager.close_resident(Ctx()._symbol_db)
     Ctx()._cvs_items_db.close()
     Ctx()._metadata_db.close()
-    Ctx()._cvs_path_db.close()
+    artifact_manager.close_resident(Ctx()._cvs_path_db)
 
 
 # The list of passes constituting a run of cvs2svn:
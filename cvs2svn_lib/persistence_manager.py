@@ -21,6 +21,9 @@ from cvs2svn_lib import config
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import SVN_INVALID_REVNUM
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.record_table import SignedIntegerPacker
 from cvs2svn_lib.record_table import RecordTable
@@ -69,6 +72,9 @@ class PersistenceManager:
         artifact_manager.get_temp_file(config.CVS_REVS_TO_SVN_REVNUMS),
         mode, SignedIntegerPacker(SVN_INVALID_REVNUM))
 
+    # The number of batches read by iter_svn_commits():
+    self._read_ahead_batches = 0
+
   def get_svn_revnum(self, cvs_rev_id):
     """Return the Subversion revision number in which CVS_REV_ID was
     committed, or SVN_INVALID_REVNUM if there is no mapping for
@@ -76,12 +82,70 @@ class PersistenceManager:
 
     return self.cvs2svn_db.get(cvs_rev_id, SVN_INVALID_REVNUM)
 
-  def get_svn_commit(self, svn_revnum):
+  def get_svn_commit(self, svn_revnum, load_cvs_items=True):
     """Return an SVNCommit that corresponds to SVN_REVNUM.
 
-    If no SVNCommit exists for revnum SVN_REVNUM, then return None."""
-
-    return self.svn_commit_db.get(svn_revnum, None)
+    If no SVNCommit exists for revnum SVN_REVNUM, then return None.  If
+    LOAD_CVS_ITEMS is False, then the CVSItems of the SVNCommit are not
+    read; only get_cvs_item_ids() may be used to find out about
+    them."""
+
+    svn_commit = self.svn_commit_db.get(svn_revnum, None)
+    if svn_commit is not None and load_cvs_items:
+      svn_commit.load_cvs_items(list(
+          Ctx()._cvs_items_db.get_many(svn_commit.get_cvs_item_ids())
+          ))
+    return svn_commit
+
+  def iter_svn_commits(
+        self, start_revnum=1, read_ahead=config.SVN_COMMIT_READ_AHEAD
+        ):
+    """Generate the SVNCommits in order, starting with START_REVNUM.
+
+    The SVNCommits are read ahead in batches.  A batch ends after
+    READ_AHEAD commits or once its commits need READ_AHEAD CVSItems.
+    The CVSItems needed by a whole batch are read with a single call
+    to Ctx()._cvs_items_db.get_many(), which reads them in file order,
+    rather than with one call per commit.  The items are passed to each
+    commit in the same order as get_svn_commit() would pass them."""
+
+    svn_revnum = start_revnum
+    while True:
+      svn_commits = []
+      cvs_item_ids = set()
+      while (
+            len(svn_commits) < read_ahead
+            and len(cvs_item_ids) < read_ahead
+            ):
+        svn_commit = self.svn_commit_db.get(svn_revnum, None)
+        if svn_commit is None:
+          break
+        svn_commits.append(svn_commit)
+        cvs_item_ids.update(svn_commit.get_cvs_item_ids())
+        svn_revnum += 1
+
+      if not svn_commits:
+        return
+
+      # A map {id : (rank, cvs_item)}, where RANK is the position of the
+      # item in the order returned by get_many():
+      cvs_items = {}
+      rank = 0
+      for (id, cvs_item) in Ctx()._cvs_items_db.get_many(cvs_item_ids):
+        cvs_items[id] = (rank, cvs_item)
+        rank += 1
+      self._read_ahead_batches += 1
+
+      for svn_commit in svn_commits:
+        items = [
+            (cvs_items[id][0], id, cvs_items[id][1])
+            for id in svn_commit.get_cvs_item_ids()
+            ]
+        items.sort()
+        svn_commit.load_cvs_items([
+            (id, cvs_item) for (rank, id, cvs_item) in items
+            ])
+        yield svn_commit
 
   def put_svn_commit(self, svn_commit):
     """Record the bidirectional mapping between SVN_REVNUM and
@@ -98,6 +162,11 @@ class PersistenceManager:
         self.cvs2svn_db[cvs_rev.id] = svn_commit.revnum
 
   def close(self):
+    if self._read_ahead_batches:
+      logger.verbose(
+          'Read SVNCommits ahead in %d batches.' % (self._read_ahead_batches,)
+          )
+      counters.add('SVNCommit read-ahead batches', self._read_ahead_batches)
     self.cvs2svn_db.close()
     self.cvs2svn_db = None
     self.svn_commit_db.close()
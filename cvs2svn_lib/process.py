@@ -18,6 +18,7 @@
 
 
 import subprocess
+import tempfile
 
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import CommandError
@@ -108,3 +109,50 @@ def get_command_output(command):
   return stdout
 
 
+class PipeStream(object):
+  """A file-like object from which the output of a command can be read.
+
+  The command is started when the object is created.  When the object
+  is closed, raise a CommandError if the command exited with a nonzero
+  return code or wrote something to stderr.  The command's output
+  should be read completely before closing the object; if it is closed
+  earlier (e.g., because an error occurred while processing the
+  output), the command's exit status is ignored so that it cannot mask
+  the original error."""
+
+  def __init__(self, command):
+    """Run COMMAND, which is a list of strings."""
+
+    self._command = command
+
+    # The command's error output is collected in a temporary file
+    # rather than a pipe, because the command would block if it wrote
+    # more than fits into a pipe before its output had been read:
+    self._stderr = tempfile.TemporaryFile()
+    self._pipe = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=self._stderr,
+        )
+    self._pipe.stdin.close()
+
+    # True iff the command's output has been read completely:
+    self._eof = False
+
+  def read(self, size=-1):
+    data = self._pipe.stdout.read(size)
+    if size < 0 or (size > 0 and not data):
+      self._eof = True
+    return data
+
+  def close(self):
+    self._pipe.stdout.close()
+    returncode = self._pipe.wait()
+    self._stderr.seek(0)
+    stderr = self._stderr.read()
+    self._stderr.close()
+    if self._eof and (returncode or stderr):
+      raise CommandError(' '.join(self._command), returncode, stderr)
+
+
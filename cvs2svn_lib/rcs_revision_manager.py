@@ -19,17 +19,22 @@
 
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import canonicalize_eol
+from cvs2svn_lib.common import CanonicalizeEOLStream
 from cvs2svn_lib.process import check_command_runs
 from cvs2svn_lib.process import get_command_output
+from cvs2svn_lib.process import PipeStream
 from cvs2svn_lib.process import CommandFailedException
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.revision_manager import RevisionReader
 from cvs2svn_lib.apple_single_filter import get_maybe_apple_single
+from cvs2svn_lib.apple_single_filter import get_maybe_apple_single_stream
 
 
 class RCSRevisionReader(RevisionReader):
   """A RevisionReader that reads the contents via RCS."""
 
+  supports_worker_processes = True
+
   def __init__(self, co_executable):
     self.co_executable = co_executable
     try:
@@ -39,7 +44,7 @@ class RCSRevisionReader(RevisionReader):
                        'Please check that co is installed and in your PATH\n'
                        '(it is a part of the RCS software).' % (e,))
 
-  def get_content(self, cvs_rev):
+  def _get_pipe_command(self, cvs_rev):
     pipe_cmd = [
         self.co_executable,
         '-q',
@@ -49,7 +54,10 @@ class RCSRevisionReader(RevisionReader):
     if cvs_rev.get_property('_keyword_handling') == 'collapsed':
       pipe_cmd.append('-kk')
     pipe_cmd.append(cvs_rev.cvs_file.filename)
-    data = get_command_output(pipe_cmd)
+    return pipe_cmd
+
+  def get_content(self, cvs_rev):
+    data = get_command_output(self._get_pipe_command(cvs_rev))
 
     if Ctx().decode_apple_single:
       # Insert a filter to decode any files that are in AppleSingle
@@ -62,4 +70,16 @@ class RCSRevisionReader(RevisionReader):
 
     return data
 
+  def get_content_stream(self, cvs_rev):
+    stream = PipeStream(self._get_pipe_command(cvs_rev))
+
+    if Ctx().decode_apple_single:
+      stream = get_maybe_apple_single_stream(stream)
+
+    eol_fix = cvs_rev.get_property('_eol_fix')
+    if eol_fix:
+      stream = CanonicalizeEOLStream(stream, eol_fix)
+
+    return stream
+
 
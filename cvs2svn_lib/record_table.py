@@ -42,6 +42,7 @@ from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 
 
 # A unique value that can be used to stand for "unset" without
@@ -123,6 +124,30 @@ class FileOffsetPacker(Packer):
     return struct.unpack(self.INDEX_FORMAT, s + self.PAD)[0]
 
 
+class BlockPositionPacker(Packer):
+  """A packer for (block_offset, record_offset) pairs.
+
+  BLOCK_OFFSET is the file offset of a block and is stored in 5 bytes,
+  like the offsets packed by FileOffsetPacker.  RECORD_OFFSET is the
+  offset of a record within the uncompressed block and is stored in 3
+  bytes, so blocks are limited to 16 MiB."""
+
+  INDEX_FORMAT = '<Q'
+
+  MAX_RECORD_OFFSET = (1 << 24) - 1
+
+  def __init__(self):
+    Packer.__init__(self, struct.calcsize(self.INDEX_FORMAT))
+
+  def pack(self, v):
+    (block_offset, record_offset) = v
+    return struct.pack(self.INDEX_FORMAT, block_offset | (record_offset << 40))
+
+  def unpack(self, s):
+    v = struct.unpack(self.INDEX_FORMAT, s)[0]
+    return (v & 0xffffffffffL, v >> 40)
+
+
 class RecordTableAccessError(RuntimeError):
   pass
 
@@ -227,7 +252,15 @@ class RecordTable(AbstractRecordTable):
   # about 96 bytes on a 32-bit computer.
   CACHE_OVERHEAD_PER_ENTRY = 96
 
-  def __init__(self, filename, mode, packer, cache_memory=CACHE_MEMORY):
+  def __init__(
+        self, filename, mode, packer, cache_memory=CACHE_MEMORY,
+        counter_prefix='RecordTable',
+        ):
+    """Open the table in FILENAME.
+
+    COUNTER_PREFIX is the prefix of the names under which the cache
+    hits and misses are reported to instrumentation.counters."""
+
     AbstractRecordTable.__init__(self, filename, mode, packer)
     if self.mode == DB_OPEN_NEW:
       self.f = open(self.filename, 'wb+')
@@ -238,6 +271,7 @@ class RecordTable(AbstractRecordTable):
     else:
       raise RuntimeError('Invalid mode %r' % self.mode)
     self.cache_memory = cache_memory
+    self.counter_prefix = counter_prefix
 
     # Number of items that can be stored in the write cache.
     self._max_memory_cache = (
@@ -257,6 +291,15 @@ class RecordTable(AbstractRecordTable):
     # The index just beyond the last record ever written to disk:
     self._limit_written = self._limit
 
+    # The number of reads that were satisfied from / missed the cache:
+    self._cache_hits = 0
+    self._cache_misses = 0
+
+    # The number of bytes read from and written to the file:
+    self._bytes_read = 0
+    self._bytes_written = 0
+    counters.register(self)
+
   def flush(self):
     logger.debug('Flushing cache for %s' % (self,))
 
@@ -280,7 +323,9 @@ class RecordTable(AbstractRecordTable):
           while self._limit_written < i:
             f.write(self.packer.empty_value)
             self._limit_written += 1
+            self._bytes_written += self._record_len
         f.write(s)
+        self._bytes_written += self._record_len
         old_i = i + 1
         self._limit_written = max(self._limit_written, old_i)
 
@@ -300,12 +345,16 @@ class RecordTable(AbstractRecordTable):
 
   def _get_packed_record(self, i):
     try:
-      return self._cache[i][1]
+      s = self._cache[i][1]
+      self._cache_hits += 1
+      return s
     except KeyError:
+      self._cache_misses += 1
       if not 0 <= i < self._limit_written:
         raise KeyError(i)
       self.f.seek(i * self._record_len)
       s = self.f.read(self._record_len)
+      self._bytes_read += self._record_len
       self._cache[i] = (False, s)
       if len(self._cache) >= self._max_memory_cache:
         self.flush()
@@ -317,6 +366,16 @@ class RecordTable(AbstractRecordTable):
     self._cache = None
     self.f.close()
     self.f = None
+    counters.unregister(self)
+
+  def get_counters(self):
+    return {
+        self.counter_prefix + ' cache hits' : self._cache_hits,
+        self.counter_prefix + ' cache misses' : self._cache_misses,
+        }
+
+  def get_file_io(self):
+    return {self.filename : (self._bytes_read, self._bytes_written)}
 
 
 class MmapRecordTable(AbstractRecordTable):
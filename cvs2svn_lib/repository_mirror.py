@@ -136,8 +136,10 @@ import bisect
 
 from cvs2svn_lib import config
 from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.cvs_path import CVSFile
 from cvs2svn_lib.cvs_path import CVSDirectory
@@ -612,17 +614,32 @@ class _NodeDatabase(object):
   # But the cache will never be limited to less than this number:
   MIN_CACHE_LIMIT = 5000
 
-  def __init__(self):
+  def __init__(self, max_node_ids=None):
+    """Create a new node database, or reopen an existing one.
+
+    If MAX_NODE_IDS is set, it is the value of self._max_node_ids
+    returned by get_checkpoint(), and the records written to the
+    existing database after that checkpoint are discarded."""
+
     self.cvs_path_db = Ctx()._cvs_path_db
-    self.db = IndexedDatabase(
-        artifact_manager.get_temp_file(config.MIRROR_NODES_STORE),
-        artifact_manager.get_temp_file(config.MIRROR_NODES_INDEX_TABLE),
-        DB_OPEN_NEW, serializer=MarshalSerializer(),
-        )
+    if max_node_ids is None:
+      self.db = IndexedDatabase(
+          artifact_manager.get_temp_file(config.MIRROR_NODES_STORE),
+          artifact_manager.get_temp_file(config.MIRROR_NODES_INDEX_TABLE),
+          DB_OPEN_NEW, serializer=MarshalSerializer(),
+          )
+      max_node_ids = [0]
+    else:
+      # The records written after the checkpoint will be overwritten:
+      self.db = IndexedDatabase(
+          artifact_manager.get_temp_file(config.MIRROR_NODES_STORE),
+          artifact_manager.get_temp_file(config.MIRROR_NODES_INDEX_TABLE),
+          DB_OPEN_WRITE,
+          )
 
     # A list of the maximum node_id stored by each call to
     # write_new_nodes():
-    self._max_node_ids = [0]
+    self._max_node_ids = max_node_ids
 
     # A map {node_id : {cvs_path : node_id}}:
     self._cache = {}
@@ -639,6 +656,12 @@ class _NodeDatabase(object):
         self.MIN_CACHE_LIMIT,
         )
 
+    # Statistics about the use of the cache:
+    self._cache_hits = 0
+    self._cache_misses = 0
+    self._cache_clears = 0
+    counters.register(self)
+
   def _load(self, items):
     retval = {}
     for (id, value) in items:
@@ -659,7 +682,9 @@ class _NodeDatabase(object):
   def __getitem__(self, id):
     try:
       items = self._cache[id]
+      self._cache_hits += 1
     except KeyError:
+      self._cache_misses += 1
       index = self._determine_index(id)
       for (node_id, items) in self.db[index].items():
         self._cache[node_id] = self._load(items)
@@ -678,6 +703,7 @@ class _NodeDatabase(object):
       # cache):
       logger.debug('Clearing node cache')
       self._cache.clear()
+      self._cache_clears += 1
 
     data = {}
     max_node_id = 0
@@ -694,10 +720,24 @@ class _NodeDatabase(object):
     else:
       self._max_node_ids.append(max_node_id)
 
+  def get_checkpoint(self):
+    """Flush the database and return the state needed to reopen it."""
+
+    self.db.flush()
+    return self._max_node_ids[:]
+
   def close(self):
     self._cache.clear()
     self.db.close()
     self.db = None
+    counters.unregister(self)
+
+  def get_counters(self):
+    return {
+        'RepositoryMirror node cache hits' : self._cache_hits,
+        'RepositoryMirror node cache misses' : self._cache_misses,
+        'RepositoryMirror node cache clears' : self._cache_clears,
+        }
 
 
 class RepositoryMirror:
@@ -752,6 +792,44 @@ class RepositoryMirror:
     # Start at revision 0 without a root node.
     self._youngest = 0
 
+  def get_checkpoint(self):
+    """Return a picklable object describing the state of the mirror.
+
+    This must be called between commits.  The node database is flushed
+    to disk, so that the mirror can be restored to its current state by
+    passing the return value to resume(), even if later commits are
+    written to the database in the meantime."""
+
+    return (
+        self._youngest,
+        self._key_generator.get_last_id(),
+        [
+            (lod.id, lod_history.revnums, lod_history.ids)
+            for (lod, lod_history) in self._lod_histories.iteritems()
+            ],
+        self._node_db.get_checkpoint(),
+        )
+
+  def resume(self, checkpoint):
+    """Restore the RepositoryMirror to the state in CHECKPOINT.
+
+    CHECKPOINT is an object returned by get_checkpoint().  This method
+    is called instead of open()."""
+
+    (self._youngest, last_id, lod_histories, max_node_ids) = checkpoint
+
+    self._key_generator = KeyGenerator((last_id or 0) + 1)
+
+    self._lod_histories = {}
+    for (lod_id, revnums, ids) in lod_histories:
+      lod = Ctx()._symbol_db.get_symbol(lod_id)
+      lod_history = LODHistory(self, lod)
+      lod_history.revnums = revnums
+      lod_history.ids = ids
+      self._lod_histories[lod] = lod_history
+
+    self._node_db = _NodeDatabase(max_node_ids)
+
   def start_commit(self, revnum):
     """Start a new commit."""
 
@@ -761,6 +839,11 @@ class RepositoryMirror:
     # A map {node_id : _WritableMirrorDirectoryMixin}.
     self._new_nodes = {}
 
+  def get_youngest_revnum(self):
+    """Return the revnum of the current (or most recent) commit."""
+
+    return self._youngest
+
   def end_commit(self):
     """Called at the end of each commit.
 
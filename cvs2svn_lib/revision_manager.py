@@ -17,6 +17,8 @@
 """This module describes the interface to the CVS repository."""
 
 
+from cStringIO import StringIO
+
 class RevisionCollector(object):
   """Optionally collect revision information for CVS files."""
 
@@ -80,6 +82,11 @@ class NullRevisionCollector(RevisionCollector):
 class RevisionReader(object):
   """An object that can read the contents of CVSRevisions."""
 
+  # True iff get_content() may be called from worker processes that
+  # were forked after start() was called.  This requires get_content()
+  # not to depend on state that changes from call to call:
+  supports_worker_processes = False
+
   def register_artifacts(self, which_pass):
     """Register artifacts that will be needed during branch exclusion.
 
@@ -95,6 +102,24 @@ class RevisionReader(object):
 
     pass
 
+  def get_checkpoint(self):
+    """Return a picklable object describing the state of this reader.
+
+    This is called between commits when OutputPass writes a checkpoint
+    (see --checkpoint-interval).  The default implementation is
+    suitable for readers whose get_content() does not depend on
+    earlier calls."""
+
+    return None
+
+  def resume(self, checkpoint):
+    """Prepare for calls to get_content() after a checkpoint.
+
+    CHECKPOINT is an object returned by get_checkpoint().  This method
+    is called instead of start() when OutputPass is resumed."""
+
+    self.start()
+
   def get_content(self, cvs_rev):
     """Return the contents of CVS_REV.
 
@@ -108,6 +133,18 @@ class RevisionReader(object):
 
     raise NotImplementedError()
 
+  def get_content_stream(self, cvs_rev):
+    """Return a file-like object from which CVS_REV's contents can be read.
+
+    The contents are the same as those returned by get_content().  The
+    caller must call the object's close() method after reading the
+    contents.  This implementation wraps the string returned by
+    get_content(); RevisionReaders that can produce the contents
+    incrementally should override this method so that large files
+    need not be held in memory."""
+
+    return StringIO(self.get_content(cvs_rev))
+
   def finish(self):
     """Inform the reader that all calls to get_content() are done.
 
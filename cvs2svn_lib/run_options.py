@@ -218,6 +218,8 @@ class RunOptions(object):
     self.start_pass = 1
     self.end_pass = self.pass_manager.num_passes
     self.profiling = False
+    # The numbers of the passes that should be profiled individually:
+    self.profile_passes = set()
 
     self.projects = []
 
@@ -709,6 +711,59 @@ class RunOptions(object):
             ),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--pipeline-passes',
+        action='store_true',
+        help=(
+            'run consecutive passes concurrently where one pass only '
+            'streams the output of the other'
+            ),
+        man_help=(
+            'Run pairs of consecutive passes concurrently, in separate '
+            'processes, where the second pass only reads the output of '
+            'the first pass sequentially.  The data are passed through '
+            'named pipes instead of temporary files.  This option has '
+            'no effect on platforms without named pipes or if '
+            '\\fB--skip-cleanup\\fR is used.'
+            ),
+        ))
+    group.add_option(ContextOption(
+        '--keep-databases-loaded',
+        action='store_true',
+        help=(
+            'keep read-only databases loaded from one pass to the next '
+            '(faster, but uses more memory)'
+            ),
+        man_help=(
+            'Keep read-only databases (the project, path, and symbol '
+            'databases) loaded in memory from one pass to the next '
+            'instead of loading them again at the start of each pass.  '
+            'This saves time when several passes are run in one '
+            'invocation, at the cost of keeping the databases in memory '
+            'during passes that do not need them.'
+            ),
+        compatible_with_option=True,
+        ))
+    group.add_option(ContextOption(
+        '--jobs', type='int',
+        action='store',
+        help=(
+            'use up to N worker processes in passes that can use them '
+            '(default 1)'
+            ),
+        man_help=(
+            'Use up to \\fIn\\fR worker processes in passes that can be '
+            'parallelized (currently CleanMetadataPass, FilterSymbolsPass '
+            'with cvs2git --use-external-blob-generator, and OutputPass '
+            'when file contents are written inline into a fastimport '
+            'stream using RCS or CVS).  The default is 1, which does all '
+            'of the work in the main process.  Worker processes are only '
+            'used on platforms that support '
+            '\\fIfork\\fR().'
+            ),
+        metavar='N',
+        compatible_with_option=True,
+        ))
     self.parser.set_default('co_executable', config.CO_EXECUTABLE)
     group.add_option(IncompatibleOption(
         '--co', type='string',
@@ -766,6 +821,63 @@ class RunOptions(object):
             ),
         metavar='[START]:[END]',
         ))
+    group.add_option(ContextOption(
+        '--checkpoint-interval', type='int',
+        action='store',
+        help=(
+            'save the state of OutputPass every N revisions, so that an '
+            'interrupted OutputPass can be resumed using --passes'
+            ),
+        man_help=(
+            'Save the state of OutputPass to the temporary directory '
+            'after every \\fIn\\fR revisions.  If OutputPass is '
+            'interrupted, it can then be continued from the most recent '
+            'checkpoint by running the same command again with '
+            '\\fB--passes\\fR starting at OutputPass, instead of '
+            'starting the output from scratch.  This is only supported '
+            'if the output is written to a dumpfile '
+            '(\\fB--dumpfile\\fR).  Each checkpoint saves the complete '
+            'state, including a copy of the database of file contents '
+            'that are needed for later revisions, so the time and disk '
+            'space that a checkpoint takes grow with the size of the '
+            'conversion; the total cost of checkpointing grows '
+            'quadratically with the number of revisions.  Therefore, '
+            'choose \\fIn\\fR large enough that checkpoints are only '
+            'written every few minutes.  The default is 0, which '
+            'disables checkpoints.'
+            ),
+        metavar='N',
+        compatible_with_option=True,
+        ))
+    group.add_option(ContextOption(
+        '--incremental', type='string',
+        action='store', dest='incremental_state_filename',
+        help=(
+            'record the state of the output in PATH; if PATH exists, '
+            'only output the commits that are new since the conversion '
+            'that wrote it'
+            ),
+        man_help=(
+            'Record the state of the output in \\fIpath\\fR at the end '
+            'of the conversion.  If \\fIpath\\fR already exists, the '
+            'conversion is a follow-up of the conversion that wrote it: '
+            'the whole CVS repository is converted again, but the '
+            'commits that were output by the earlier conversion are '
+            'only replayed internally, and just the new commits are '
+            'written to the output.  For Subversion, load the resulting '
+            'dumpfile into the repository that holds the earlier '
+            'output, or pass \\fB--existing-svnrepos\\fR.  For git, '
+            'import the blob file and the dump file into the same '
+            'repository as before, using the \\fB--import-marks\\fR '
+            'and \\fB--export-marks\\fR options of '
+            '\\fBgit fast-import\\fR.  The conversion fails if any '
+            'of the commits that were output earlier would now be '
+            'converted differently; for example, because the history '
+            'in CVS was changed retroactively.'
+            ),
+        metavar='PATH',
+        compatible_with_option=True,
+        ))
 
     return group
 
@@ -848,6 +960,39 @@ class RunOptions(object):
             'Profile with \'' + prof + '\' (into file \\fIcvs2svn.' + prof + '\\fR).'
             ),
         ))
+    group.add_option(ManOption(
+        '--profile-pass', type='string',
+        action='callback', callback=self.callback_profile_pass,
+        help=(
+            'profile pass PASS with \'' + prof + '\' (into file '
+            'cvs2svn-passN.' + prof + ' in the temporary directory); may '
+            'be specified multiple times'
+            ),
+        man_help=(
+            'Profile pass \\fIpass\\fR (specified by name or number) with '
+            '\'' + prof + '\' (into file \\fIcvs2svn-passN.' + prof + '\\fR '
+            'in the temporary directory, where \\fIN\\fR is the number '
+            'of the pass).  This option '
+            'may be specified multiple times to profile several passes.  '
+            'It cannot be combined with \\fB--profile\\fR.'
+            ),
+        metavar='PASS',
+        ))
+    group.add_option(ContextOption(
+        '--write-stats', type='string',
+        action='store', dest='stats_filename',
+        help=(
+            'write statistics and per-pass resource usage to PATH '
+            '(in JSON format)'
+            ),
+        man_help=(
+            'Write to \\fIpath\\fR, in JSON format, the conversion '
+            'statistics together with the time, peak memory, I/O, '
+            'temporary file sizes, I/O per temporary file, and cache '
+            'statistics of each pass.'
+            ),
+        metavar='PATH',
+        ))
 
     return group
 
@@ -922,6 +1067,9 @@ class RunOptions(object):
   def callback_profile(self, option, opt_str, value, parser):
     self.profiling = True
 
+  def callback_profile_pass(self, option, opt_str, value, parser):
+    self.profile_passes.add(self.pass_manager.get_pass_number(value))
+
   def callback_symbol_hints(self, option, opt_str, value, parser):
     parser.values.symbol_strategy_rules.append(SymbolHintsFileRule(value))
 
@@ -1074,11 +1222,36 @@ class RunOptions(object):
       raise InvalidPassError(
           'Ending pass must not come before starting pass.')
 
+    not_both(
+        self.profiling, '--profile',
+        self.profile_passes, '--profile-pass',
+        )
+
+    if ctx.jobs < 1:
+      raise FatalError('The number of jobs must be at least 1.')
+
+    if ctx.checkpoint_interval < 0:
+      raise FatalError('The checkpoint interval must not be negative.')
+
     if not ctx.dry_run and ctx.output_option is None:
       raise FatalError('No output option specified.')
 
     if ctx.output_option is not None:
       ctx.output_option.check()
+      if (
+            ctx.checkpoint_interval
+            and not ctx.output_option.supports_checkpoints
+            ):
+        raise FatalError(
+            'The output option does not support --checkpoint-interval.'
+            )
+      if (
+            ctx.incremental_state_filename is not None
+            and not ctx.output_option.supports_incremental
+            ):
+        raise FatalError(
+            'The output option does not support --incremental.'
+            )
 
     if not self.projects:
       raise FatalError('No project specified.')
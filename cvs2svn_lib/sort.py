@@ -103,7 +103,12 @@ def merge_files_onepass(input_filenames, output_filename, key=None):
   the output file will also be sorted."""
 
   input_filenames = list(input_filenames)
-  if len(input_filenames) == 1:
+  if len(input_filenames) == 1 and (
+        not os.path.exists(output_filename)
+        or os.path.isfile(output_filename)
+        ):
+    # (If the output is a named pipe it must not be replaced, so in
+    # that case fall through and copy the data.)
     shutil.move(input_filenames[0], output_filename)
   else:
     output_file = file(output_filename, 'wb', BUFSIZE)
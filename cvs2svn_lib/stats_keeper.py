@@ -24,6 +24,15 @@ import time
 import cPickle
 from cStringIO import StringIO
 
+try:
+  import json
+except ImportError:
+  try:
+    import simplejson as json
+  except ImportError:
+    json = None
+
+from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.cvs_item import CVSRevision
 from cvs2svn_lib.cvs_item import CVSBranch
 from cvs2svn_lib.cvs_item import CVSTag
@@ -35,12 +44,53 @@ class StatsKeeper:
     self._first_rev_date = 1L<<32
     self._last_rev_date = 0
     self._pass_timings = { }
+    # A map { pass_num : resources }, where resources is a map { name :
+    # value } describing the resources used by the pass (see
+    # log_resources_for_pass()):
+    self._pass_resources = { }
     self._stats_reflect_exclude = False
     self.reset_cvs_rev_info()
 
+  def __setstate__(self, state):
+    # Statistics files written by older versions of cvs2svn do not
+    # include the resource usage:
+    state.setdefault('_pass_resources', {})
+    self.__dict__.update(state)
+
   def log_duration_for_pass(self, duration, pass_num, pass_name):
     self._pass_timings[pass_num] = (pass_name, duration,)
 
+  def log_resources_for_pass(self, pass_num, resources):
+    """Record the resources used by pass PASS_NUM.
+
+    RESOURCES is a map { name : value }.  The following names are
+    used, but each of them might be missing if it could not be
+    determined:
+
+        'max_rss' -- the peak resident set size of the process at the
+            end of the pass, in KiB.
+
+        'bytes_read', 'bytes_written' -- the number of bytes read and
+            written by the process during the pass.
+
+        'artifacts_created', 'artifacts_needed' -- the total size in
+            bytes of the artifacts created by the pass and of the
+            other artifacts that it read (see
+            ArtifactManager.get_artifact_sizes()).
+
+        'counters' -- a map { name : count } of the events counted
+            during the pass (see instrumentation.counters).
+
+        'artifacts' -- a map { artifact_name : stats } describing the
+            size of each artifact used by the pass and the bytes read
+            from and written to it (see
+            ArtifactManager.get_artifact_io()).
+
+        'profile' -- the name of the file to which profiling data for
+            the pass was written."""
+
+    self._pass_resources[pass_num] = resources
+
   def set_stats_reflect_exclude(self, value):
     self._stats_reflect_exclude = value
 
@@ -176,6 +226,109 @@ class StatsKeeper:
     f.write((format + '   total') % total)
     return f.getvalue()
 
+  @staticmethod
+  def _format_size(value):
+    if value is None:
+      return '%10s' % ('-',)
+    else:
+      return '%10d' % (value // 1024,)
+
+  def resources(self):
+    """Return a string describing the resources used by the passes."""
+
+    passes = self._pass_resources.keys()
+    passes.sort()
+    f = StringIO()
+    f.write('Resources (KiB):\n')
+    f.write('------------------\n')
+    f.write(
+        '%10s %10s %10s %10s %10s   pass\n'
+        % ('max RSS', 'read', 'written', 'created', 'needed',)
+        )
+    for pass_num in passes:
+      resources = self._pass_resources[pass_num]
+      max_rss = resources.get('max_rss')
+      if max_rss is not None:
+        max_rss *= 1024
+      f.write(
+          '%s %s %s %s %s   pass%-2d\n' % (
+              self._format_size(max_rss),
+              self._format_size(resources.get('bytes_read')),
+              self._format_size(resources.get('bytes_written')),
+              self._format_size(resources.get('artifacts_created')),
+              self._format_size(resources.get('artifacts_needed')),
+              pass_num,
+              )
+          )
+    for pass_num in passes:
+      resources = self._pass_resources[pass_num]
+      counts = resources.get('counters', {}).items()
+      counts.sort()
+      for (name, count) in counts:
+        f.write('pass%-2d %-40s %12d\n' % (pass_num, name, count,))
+      if resources.get('profile'):
+        f.write('pass%-2d profile written to %s\n' % (
+            pass_num, resources['profile'],
+            ))
+    f.write(
+        '%-6s %-40s %10s %10s %10s\n'
+        % ('', 'artifact (KiB)', 'size', 'read', 'written',)
+        )
+    for pass_num in passes:
+      artifacts = self._pass_resources[pass_num].get('artifacts', {}).items()
+      artifacts.sort()
+      for (name, stats) in artifacts:
+        f.write('pass%-2d %-40s %s %s %s\n' % (
+            pass_num, name,
+            self._format_size(stats.get('size')),
+            self._format_size(stats.get('bytes_read')),
+            self._format_size(stats.get('bytes_written')),
+            ))
+    f.write('------------------')
+    return f.getvalue()
+
+  def get_data(self):
+    """Return the statistics as a structure of dicts, lists, and scalars."""
+
+    passes = []
+    pass_nums = set(self._pass_timings.keys())
+    pass_nums.update(self._pass_resources.keys())
+    pass_nums = list(pass_nums)
+    pass_nums.sort()
+    for pass_num in pass_nums:
+      data = {'number' : pass_num}
+      if pass_num in self._pass_timings:
+        (data['name'], data['duration'],) = self._pass_timings[pass_num]
+      data.update(self._pass_resources.get(pass_num, {}))
+      passes.append(data)
+
+    return {
+        'cvs_files' : self._repos_file_count,
+        'cvs_revisions' : self._cvs_revs_count,
+        'cvs_branches' : self._cvs_branches_count,
+        'cvs_tags' : self._cvs_tags_count,
+        'unique_tags' : len(self._tag_ids),
+        'unique_branches' : len(self._branch_ids),
+        'cvs_repos_size' : self._repos_size,
+        'svn_commits' : self._svn_rev_count,
+        'first_revision_date' : self._first_rev_date,
+        'last_revision_date' : self._last_rev_date,
+        'passes' : passes,
+        }
+
+  def write_data(self, filename):
+    """Write the statistics to FILENAME in JSON format."""
+
+    if json is None:
+      raise FatalError(
+          'Writing statistics requires the json or simplejson module.'
+          )
+
+    f = open(filename, 'w')
+    json.dump(self.get_data(), f, indent=2, sort_keys=True)
+    f.write('\n')
+    f.close()
+
 
 def read_stats_keeper(filename):
   """Factory function: Return a _StatsKeeper instance.
@@ -36,6 +36,11 @@ There are five types of SVNCommits:
 """
 
 
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.symbol import Branch
@@ -64,6 +69,24 @@ class SVNCommit:
   def __setstate__(self, state):
     (self.date, self.revnum,) = state
 
+  def get_cvs_item_ids(self):
+    """Return the ids of the CVSItems that this commit has to load.
+
+    When an SVNCommit is read from disk, its CVSItems are not read
+    along with it.  Instead, the reader has to read the CVSItems with
+    these ids and pass them to load_cvs_items()."""
+
+    return []
+
+  def load_cvs_items(self, cvs_items):
+    """Fill in the CVSItems of this commit after it was read from disk.
+
+    CVS_ITEMS is a list of (id, cvs_item) pairs for the ids returned by
+    get_cvs_item_ids(), in the order returned by get_many() of the
+    CVSItem store."""
+
+    pass
+
   def get_cvs_items(self):
     """Return a list containing the CVSItems in this commit."""
 
@@ -95,6 +118,31 @@ class SVNCommit:
 
     raise NotImplementedError()
 
+  def _get_digest_data(self):
+    """Return a list of the data that go into get_digest().
+
+    Derived classes should extend the list with the data describing
+    their own contents.  The date is not included, because the dates
+    of the commits are adjusted to be increasing, and can therefore
+    shift slightly when new commits are inserted between them (e.g.,
+    for a new tag on old revisions)."""
+
+    return [
+        self.__class__.__name__, self.get_author(), self.get_log_msg(),
+        ]
+
+  def get_digest(self):
+    """Return an MD5 digest (as a binary string) of this commit.
+
+    The digest only depends on properties that are the same every time
+    the same CVS history is converted with the same options (file
+    paths, revision numbers, symbol names, metadata, etc.), not on the
+    ids that a particular conversion assigned to the CVSItems.  It is
+    used by --incremental to check that the commits that were output
+    by an earlier conversion have not changed."""
+
+    return md5(repr(self._get_digest_data())).digest()
+
   def output(self, output_option):
     """Cause this commit to be output to OUTPUT_OPTION.
 
@@ -146,6 +194,11 @@ class SVNInitialProjectCommit(SVNCommit):
   def get_description(self):
     return 'Project initialization'
 
+  def _get_digest_data(self):
+    return SVNCommit._get_digest_data(self) + [
+        project.id for project in self.projects
+        ]
+
   def output(self, output_option):
     output_option.process_initial_project_commit(self)
 
@@ -175,12 +228,17 @@ class SVNRevisionCommit(SVNCommit):
     (svn_commit_state, cvs_rev_ids) = state
     SVNCommit.__setstate__(self, svn_commit_state)
 
-    self.cvs_revs = [
-        cvs_rev
-        for (id, cvs_rev) in Ctx()._cvs_items_db.get_many(cvs_rev_ids)
-        ]
+    # The CVSRevisions are filled in by load_cvs_items():
+    self._cvs_rev_ids = cvs_rev_ids
+    self.cvs_revs = None
     self._metadata = None
 
+  def get_cvs_item_ids(self):
+    return self._cvs_rev_ids
+
+  def load_cvs_items(self, cvs_items):
+    self.cvs_revs = [cvs_rev for (id, cvs_rev) in cvs_items]
+
   def get_cvs_items(self):
     return self.cvs_revs
 
@@ -201,6 +259,18 @@ class SVNRevisionCommit(SVNCommit):
   def get_author(self):
     return self._get_metadata().author
 
+  def _get_digest_data(self):
+    data = [
+        (
+            cvs_rev.cvs_file.project.id, cvs_rev.cvs_file.cvs_path,
+            cvs_rev.rev, cvs_rev.__class__.__name__,
+            getattr(cvs_rev.lod, 'name', None),
+            )
+        for cvs_rev in self.cvs_revs
+        ]
+    data.sort()
+    return SVNCommit._get_digest_data(self) + data
+
   def get_warning_summary(self):
     retval = []
     retval.append(SVNCommit.get_warning_summary(self) + '  Related files:')
@@ -296,6 +366,9 @@ class SVNSymbolCommit(SVNCommit):
 
     self.cvs_symbol_ids = cvs_symbol_ids
 
+    # The CVSSymbols, if they have been loaded by load_cvs_items():
+    self._cvs_symbols = None
+
   def __getstate__(self):
     return (
         SVNCommit.__getstate__(self),
@@ -306,8 +379,18 @@ class SVNSymbolCommit(SVNCommit):
     (svn_commit_state, symbol_id, self.cvs_symbol_ids) = state
     SVNCommit.__setstate__(self, svn_commit_state)
     self.symbol = Ctx()._symbol_db.get_symbol(symbol_id)
+    self._cvs_symbols = None
+
+  def get_cvs_item_ids(self):
+    return self.cvs_symbol_ids
+
+  def load_cvs_items(self, cvs_items):
+    self._cvs_symbols = [cvs_symbol for (id, cvs_symbol) in cvs_items]
 
   def get_cvs_items(self):
+    if self._cvs_symbols is not None:
+      return self._cvs_symbols
+
     return [
         cvs_symbol
         for (id, cvs_symbol)
@@ -335,6 +418,24 @@ class SVNSymbolCommit(SVNCommit):
   def get_description(self):
     return 'copying to %s %r' % (self._get_symbol_type(), self.symbol.name,)
 
+  def _get_digest_data(self):
+    # The sources of the CVSSymbols are described by the LOD and the
+    # revision number in which they were committed, because the ids of
+    # their CVSItems can differ between conversions:
+    data = [
+        (
+            cvs_symbol.cvs_file.project.id, cvs_symbol.cvs_file.cvs_path,
+            cvs_symbol.__class__.__name__,
+            getattr(cvs_symbol.source_lod, 'name', None),
+            Ctx()._persistence_manager.get_svn_revnum(
+                cvs_symbol.source_id
+                ),
+            )
+        for cvs_symbol in self.get_cvs_items()
+        ]
+    data.sort()
+    return SVNCommit._get_digest_data(self) + [self.symbol.name] + data
+
   def __str__(self):
     """ Print a human-readable description of this SVNCommit.
 
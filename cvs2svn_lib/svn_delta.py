@@ -0,0 +1,287 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This module computes text deltas in Subversion's svndiff format.
+
+An svndiff delta consists of the header 'SVN\\0' followed by a series of
+windows.  Each window describes a span of the target text using
+instructions that copy bytes from a 'source view' (a span of the
+source text) or insert new data.  Subversion limits the size of both
+views to SVN_DELTA_WINDOW_SIZE bytes and requires that successive
+source views never slide backwards.
+
+The deltas are computed line by line, which is appropriate for the
+mostly-textual files kept in CVS and is what RCS does as well.  The
+matching lines are found using difflib after removing any common
+prefix and suffix, so the typical case of a small change to a large
+file is cheap.  difflib's running time is quadratic in the worst case,
+so if the changed regions are too big a cruder but linear-time matcher
+is used instead."""
+
+
+from difflib import SequenceMatcher
+
+from cvs2svn_lib.rcs_stream import msplit
+
+
+# The maximum size of the source and target views of a window, as
+# enforced by Subversion when reading a delta:
+SVN_DELTA_WINDOW_SIZE = 100 * 1024
+
+# If the product of the numbers of lines in the changed regions of the
+# source and target exceeds this value, use _match_unique_lines()
+# rather than difflib to find the matching lines:
+MAX_SEQUENCE_MATCHER_WORK = 1000 * 1000
+
+# Instruction opcodes:
+_OP_SOURCE = 0
+_OP_NEW = 2
+
+
+def _encode_int(n):
+  """Return N encoded as an svndiff variable-length integer.
+
+  The integer is written in big-endian order, seven bits per byte,
+  with the high bit set in all bytes but the last."""
+
+  bytes = [chr(n & 0x7f)]
+  n >>= 7
+  while n:
+    bytes.append(chr(0x80 | (n & 0x7f)))
+    n >>= 7
+  bytes.reverse()
+  return ''.join(bytes)
+
+
+def _encode_instruction(op, length, offset=None):
+  if length < 0x40:
+    s = chr((op << 6) | length)
+  else:
+    s = chr(op << 6) + _encode_int(length)
+  if offset is not None:
+    s += _encode_int(offset)
+  return s
+
+
+def _line_offsets(lines, start):
+  """Return a list of the offsets of LINES, starting at offset START.
+
+  The list has one more entry than LINES, namely the offset of the end
+  of the last line."""
+
+  offsets = [start]
+  for line in lines:
+    start += len(line)
+    offsets.append(start)
+  return offsets
+
+
+def _match_unique_lines(a, b):
+  """Generate blocks of lines that sequences A and B have in common.
+
+  Generate tuples (I, J, N) such that a[I:I+N] == b[J:J+N], in order
+  of increasing I and J.  The matching is anchored on lines that occur
+  exactly once in A; each match is extended forwards and backwards as
+  far as possible.  The running time is linear in the lengths of A and
+  B, but the result is not necessarily optimal."""
+
+  # A map from line to its index in A, or to None if the line occurs
+  # more than once:
+  index = {}
+  for (i, line) in enumerate(a):
+    if line in index:
+      index[line] = None
+    else:
+      index[line] = i
+
+  # The ends of the previous match in A and B:
+  a_end = b_end = 0
+  j = 0
+  while j < len(b):
+    i = index.get(b[j])
+    if i is None or i < a_end:
+      j += 1
+      continue
+
+    while i > a_end and j > b_end and a[i - 1] == b[j - 1]:
+      i -= 1
+      j -= 1
+    n = 0
+    while i + n < len(a) and j + n < len(b) and a[i + n] == b[j + n]:
+      n += 1
+    yield (i, j, n)
+    a_end = i + n
+    j = b_end = j + n
+
+
+def generate_copies(source, target):
+  """Generate the spans that TARGET has in common with SOURCE.
+
+  Generate tuples (SOURCE_OFFSET, TARGET_OFFSET, LENGTH), in order of
+  increasing TARGET_OFFSET and SOURCE_OFFSET, describing byte ranges
+  that are identical in the two strings.  The ranges consist of whole
+  lines."""
+
+  source_lines = msplit(source)
+  target_lines = msplit(target)
+
+  # Skip over any common prefix:
+  prefix = 0
+  n = min(len(source_lines), len(target_lines))
+  while prefix < n and source_lines[prefix] == target_lines[prefix]:
+    prefix += 1
+
+  # ...and any common suffix (not overlapping the prefix):
+  suffix = 0
+  n -= prefix
+  while (
+        suffix < n
+        and source_lines[-1 - suffix] == target_lines[-1 - suffix]
+        ):
+    suffix += 1
+
+  prefix_len = len(''.join(source_lines[:prefix]))
+  if prefix_len:
+    yield (0, 0, prefix_len)
+
+  source_middle = source_lines[prefix:len(source_lines) - suffix]
+  target_middle = target_lines[prefix:len(target_lines) - suffix]
+  if source_middle and target_middle:
+    source_offsets = _line_offsets(source_middle, prefix_len)
+    target_offsets = _line_offsets(target_middle, prefix_len)
+    if (
+          len(source_middle) * len(target_middle)
+          <= MAX_SEQUENCE_MATCHER_WORK
+          ):
+      blocks = SequenceMatcher(
+          None, source_middle, target_middle
+          ).get_matching_blocks()
+    else:
+      blocks = _match_unique_lines(source_middle, target_middle)
+    for (i, j, n) in blocks:
+      if n:
+        yield (
+            source_offsets[i], target_offsets[j],
+            source_offsets[i + n] - source_offsets[i],
+            )
+
+  suffix_len = len(''.join(source_lines[len(source_lines) - suffix:]))
+  if suffix_len:
+    yield (len(source) - suffix_len, len(target) - suffix_len, suffix_len)
+
+
+class _WindowWriter(object):
+  """Split a sequence of copy and insert operations into svndiff windows."""
+
+  def __init__(self, window_size):
+    self._window_size = window_size
+    self._windows = []
+    self._reset()
+
+  def _reset(self):
+    self._instructions = []
+    self._new_data = []
+    self._target_len = 0
+    self._source_start = None
+    self._source_end = None
+
+  def flush(self):
+    """Write out the current window, if it is not empty."""
+
+    if not self._target_len:
+      return
+
+    if self._source_start is None:
+      source_offset = source_len = 0
+    else:
+      source_offset = self._source_start
+      source_len = self._source_end - self._source_start
+    instructions = ''.join(self._instructions)
+    new_data = ''.join(self._new_data)
+    self._windows.append(
+        _encode_int(source_offset)
+        + _encode_int(source_len)
+        + _encode_int(self._target_len)
+        + _encode_int(len(instructions))
+        + _encode_int(len(new_data))
+        + instructions
+        + new_data
+        )
+    self._reset()
+
+  def insert(self, data):
+    """Add instructions to insert the string DATA into the target."""
+
+    while data:
+      room = self._window_size - self._target_len
+      if not room:
+        self.flush()
+        continue
+      chunk = data[:room]
+      data = data[room:]
+      self._instructions.append(_encode_instruction(_OP_NEW, len(chunk)))
+      self._new_data.append(chunk)
+      self._target_len += len(chunk)
+
+  def copy(self, offset, length):
+    """Add instructions to copy LENGTH bytes from OFFSET in the source.
+
+    OFFSET must not be less than the end of any previous copy."""
+
+    while length:
+      room = self._window_size - self._target_len
+      if self._source_start is not None:
+        room = min(room, self._source_start + self._window_size - offset)
+      if room <= 0:
+        self.flush()
+        continue
+      n = min(length, room)
+      if self._source_start is None:
+        self._source_start = offset
+      self._source_end = offset + n
+      self._instructions.append(
+          _encode_instruction(_OP_SOURCE, n, offset - self._source_start)
+          )
+      self._target_len += n
+      offset += n
+      length -= n
+
+  def get_windows(self):
+    self.flush()
+    return self._windows
+
+
+def make_svndiff(source, target, window_size=SVN_DELTA_WINDOW_SIZE):
+  """Return an svndiff (version 0) delta that converts SOURCE to TARGET.
+
+  SOURCE and TARGET are strings.  The windows of the delta span at
+  most WINDOW_SIZE bytes of each text."""
+
+  writer = _WindowWriter(window_size)
+  target_pos = 0
+  for (source_offset, target_offset, length) in generate_copies(
+        source, target
+        ):
+    if target_offset > target_pos:
+      writer.insert(target[target_pos:target_offset])
+    writer.copy(source_offset, length)
+    target_pos = target_offset + length
+  if target_pos < len(target):
+    writer.insert(target[target_pos:])
+
+  return 'SVN\0' + ''.join(writer.get_windows())
+
+
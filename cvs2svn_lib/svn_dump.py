@@ -17,7 +17,11 @@
 """This module contains code to output to Subversion dumpfile format."""
 
 
+import sys
 import subprocess
+import tempfile
+from collections import deque
+from cStringIO import StringIO
 
 try:
   from hashlib import md5
@@ -28,10 +32,14 @@ from cvs2svn_lib.common import CommandError
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.common import path_split
+from cvs2svn_lib import config
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.cvs_path import CVSDirectory
 from cvs2svn_lib.cvs_path import CVSFile
 from cvs2svn_lib.svn_repository_delegate import SVNRepositoryDelegate
+from cvs2svn_lib.svn_delta import make_svndiff
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.instrumentation import counters
 
 
 # Things that can happen to a file.
@@ -39,26 +47,154 @@ OP_ADD    = 'add'
 OP_CHANGE = 'change'
 
 
+class DeltaBaseCache(object):
+  """Remember the recent contents of files, to be used as delta bases.
+
+  The texts are stored in a map {lod : {cvs_file.id : (cvs_file, text,
+  checksum, serial)}}, where CHECKSUM is the hex MD5 digest of TEXT and
+  SERIAL records when the entry was added.  If the total size of the
+  texts exceeds MAX_SIZE bytes, the least recently added entries are
+  discarded."""
+
+  def __init__(self, max_size):
+    self._max_size = max_size
+    self._texts = {}
+    self._size = 0
+    self._serial = 0
+
+    # A queue of (serial, lod, cvs_file.id) in the order that the
+    # entries were added.  It can contain stale entries for texts that
+    # have already been replaced or discarded.
+    self._queue = deque()
+    self._count = 0
+
+  def get(self, lod, cvs_file):
+    """Return (text, checksum) for CVS_FILE on LOD, or None if unknown."""
+
+    try:
+      entry = self._texts[lod][cvs_file.id]
+    except KeyError:
+      return None
+    return (entry[1], entry[2])
+
+  def _is_current(self, serial, lod, id):
+    """Return True iff the queue entry (SERIAL, LOD, ID) is not stale."""
+
+    try:
+      return self._texts[lod][id][3] == serial
+    except KeyError:
+      return False
+
+  def _discard(self, lod, id):
+    entry = self._texts[lod].pop(id)
+    self._size -= len(entry[1])
+    self._count -= 1
+    if not self._texts[lod]:
+      del self._texts[lod]
+
+  def put(self, lod, cvs_file, text, checksum):
+    """Record that CVS_FILE on LOD now contains TEXT."""
+
+    self.remove(lod, cvs_file)
+    if len(text) > self._max_size:
+      return
+
+    self._serial += 1
+    self._texts.setdefault(lod, {})[cvs_file.id] = (
+        cvs_file, text, checksum, self._serial,
+        )
+    self._size += len(text)
+    self._count += 1
+    self._queue.append((self._serial, lod, cvs_file.id))
+
+    while self._size > self._max_size:
+      (old_serial, old_lod, old_id) = self._queue.popleft()
+      if self._is_current(old_serial, old_lod, old_id):
+        self._discard(old_lod, old_id)
+
+    if len(self._queue) > 2 * self._count + 1000:
+      # Drop the stale entries from the queue:
+      self._queue = deque([
+          entry for entry in self._queue if self._is_current(*entry)
+          ])
+
+  def remove(self, lod, cvs_path):
+    """Forget the contents of CVS_PATH on LOD.
+
+    If CVS_PATH is a directory, forget the contents of all of the files
+    within it."""
+
+    files = self._texts.get(lod)
+    if not files:
+      return
+    elif isinstance(cvs_path, CVSFile):
+      if cvs_path.id in files:
+        self._discard(lod, cvs_path.id)
+    else:
+      for (id, entry) in files.items():
+        if cvs_path in entry[0].get_ancestry():
+          self._discard(lod, id)
+
+  def remove_lod(self, lod):
+    """Forget the contents of all files on LOD."""
+
+    for id in list(self._texts.get(lod, [])):
+      self._discard(lod, id)
+
+
 class DumpstreamDelegate(SVNRepositoryDelegate):
   """Write output in Subversion dumpfile format."""
 
-  def __init__(self, revision_reader, dumpfile):
+  # The size of the pieces in which file contents are read and written:
+  CHUNK_SIZE = 64 * 1024
+
+  def __init__(self, revision_reader, dumpfile, deltas=False, checkpoint=None):
     """Return a new DumpstreamDelegate instance.
 
     DUMPFILE should be a file-like object opened in binary mode, to
     which the dump stream will be written.  The only methods called on
-    the object are write() and close()."""
+    the object are write() and close() (and flush(), by
+    get_checkpoint()).
+
+    If DELTAS is True, write a version 3 dumpfile in which file
+    changes are expressed as svndiff deltas against the previous
+    contents of the file, as long as those contents are still in the
+    delta base cache (see config.SVN_DELTA_CACHE_SIZE).
+
+    If CHECKPOINT is set, it is an object returned by get_checkpoint(),
+    and DUMPFILE continues a dump stream from that checkpoint; no
+    header is written.  (The delta base cache starts out empty.)"""
 
     self._revision_reader = revision_reader
     self._dumpfile = dumpfile
-    self._write_dumpfile_header()
+    if deltas:
+      self._delta_bases = DeltaBaseCache(config.SVN_DELTA_CACHE_SIZE)
+    else:
+      self._delta_bases = None
+
+    # Statistics about the deltas written: the number of deltas and
+    # fulltexts written, and the total size of the deltas and of the
+    # fulltexts that they replace:
+    self._delta_count = 0
+    self._fulltext_count = 0
+    self._delta_bytes = 0
+    self._delta_text_bytes = 0
+
+    # The number of file contents that had to be spooled to temporary
+    # files, and their total size:
+    self._spooled_count = 0
+    self._spooled_bytes = 0
 
     # A set of the basic project infrastructure project directories
     # that have been created so far, as SVN paths.  (The root
     # directory is considered to be present at initialization.)  This
     # includes all of the LOD paths, and all of their parent
     # directories etc.
-    self._basic_directories = set([''])
+    if checkpoint is None:
+      self._write_dumpfile_header()
+      self._basic_directories = set([''])
+    else:
+      self._basic_directories = set(checkpoint)
 
   def _write_dumpfile_header(self):
     """Initialize the dumpfile with the standard headers.
@@ -67,7 +203,10 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
     repository will be created with one anyway, we don't specify a
     UUID in the dumpfile."""
 
-    self._dumpfile.write('SVN-fs-dump-format-version: 2\n\n')
+    if self._delta_bases is None:
+      self._dumpfile.write('SVN-fs-dump-format-version: 2\n\n')
+    else:
+      self._dumpfile.write('SVN-fs-dump-format-version: 3\n\n')
 
   def _utf8_path(self, path):
     """Return a copy of PATH encoded in UTF-8."""
@@ -202,6 +341,68 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
   def mkdir(self, lod, cvs_directory):
     self._make_any_dir(lod.get_path(cvs_directory.cvs_path))
 
+  def _get_content(self, cvs_rev):
+    """Return (stream, length, checksum) for the contents of CVS_REV.
+
+    STREAM is a file-like object positioned at the start of the
+    contents, which the caller must close.  CHECKSUM is the hex MD5
+    digest of the contents.  The contents are read from the revision
+    reader's stream in chunks.  If that stream cannot be rewound, the
+    contents are kept in memory or, if they are larger than
+    config.CONTENT_SPOOL_THRESHOLD, spooled to a temporary file, so
+    that they can be written after their length and checksum."""
+
+    stream = self._revision_reader.get_content_stream(cvs_rev)
+    checksum = md5()
+    length = 0
+
+    if hasattr(stream, 'seek'):
+      # The contents can simply be read twice:
+      while True:
+        chunk = stream.read(self.CHUNK_SIZE)
+        if not chunk:
+          break
+        checksum.update(chunk)
+        length += len(chunk)
+      stream.seek(0)
+      return (stream, length, checksum.hexdigest())
+
+    chunks = []
+    spool = None
+    try:
+      while True:
+        chunk = stream.read(self.CHUNK_SIZE)
+        if not chunk:
+          break
+        checksum.update(chunk)
+        length += len(chunk)
+        if spool is not None:
+          spool.write(chunk)
+        elif length > config.CONTENT_SPOOL_THRESHOLD:
+          spool = tempfile.TemporaryFile(dir=Ctx().tmpdir)
+          spool.writelines(chunks)
+          spool.write(chunk)
+          chunks = None
+        else:
+          chunks.append(chunk)
+    except:
+      # Close the stream (e.g., to reap a checkout command), but
+      # re-raise the original exception:
+      exc_info = sys.exc_info()
+      stream.close()
+      raise exc_info[0], exc_info[1], exc_info[2]
+    stream.close()
+
+    if spool is None:
+      stream = StringIO(''.join(chunks))
+    else:
+      self._spooled_count += 1
+      self._spooled_bytes += length
+      spool.seek(0)
+      stream = spool
+
+    return (stream, length, checksum.hexdigest())
+
   def _add_or_change_path(self, cvs_rev, op):
     """Emit the addition or change corresponding to CVS_REV.
 
@@ -248,11 +449,32 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
       prop_contents = ''
       props_header = ''
 
-    data = self._revision_reader.get_content(cvs_rev)
+    (stream, length, checksum) = self._get_content(cvs_rev)
+    try:
+      self._write_file_node(
+          cvs_rev, op, prop_contents, props_header, stream, length, checksum
+          )
+    finally:
+      stream.close()
+
+  def _write_file_node(
+        self, cvs_rev, op, prop_contents, props_header,
+        stream, length, checksum,
+        ):
+    """Emit the node for CVS_REV, whose contents can be read from STREAM.
+
+    LENGTH and CHECKSUM are the length and MD5 hex digest of the
+    contents.  The other arguments are as computed in
+    _add_or_change_path().  The contents are only read into memory if
+    they are needed as a whole."""
+
+    # The contents, if they have been read into memory, else None:
+    data = None
 
     # treat .cvsignore as a directory property
     dir_path, basename = path_split(cvs_rev.get_svn_path())
     if basename == '.cvsignore':
+      data = stream.read()
       ignore_contents = self._string_for_props({
           'svn:ignore' : ''.join((s + '\n') for s in generate_ignores(data))
           })
@@ -273,8 +495,43 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
       if not Ctx().keep_cvsignore:
         return
 
-    checksum = md5()
-    checksum.update(data)
+    text = data
+    delta_header = ''
+    if (
+          self._delta_bases is not None
+          and length <= config.CONTENT_SPOOL_THRESHOLD
+          ):
+      if data is None:
+        data = text = stream.read()
+      base = None
+      if op == OP_CHANGE:
+        base = self._delta_bases.get(cvs_rev.lod, cvs_rev.cvs_file)
+      if base is not None and data:
+        (base_data, base_checksum) = base
+        delta = make_svndiff(base_data, data)
+        header = (
+            'Text-delta: true\n'
+            'Text-delta-base-md5: %s\n' % (base_checksum,)
+            )
+        # Only use the delta if it is actually smaller:
+        if len(header) + len(delta) < len(data):
+          text = delta
+          delta_header = header
+          self._delta_count += 1
+          self._delta_bytes += len(delta)
+          self._delta_text_bytes += len(data)
+      if not delta_header:
+        self._fulltext_count += 1
+      self._delta_bases.put(cvs_rev.lod, cvs_rev.cvs_file, data, checksum)
+    elif self._delta_bases is not None:
+      # The new contents are too large to be kept as a delta base, so
+      # the previous contents must not be used as one anymore:
+      self._delta_bases.remove(cvs_rev.lod, cvs_rev.cvs_file)
+
+    if text is None:
+      text_length = length
+    else:
+      text_length = len(text)
 
     # The content length is the length of property data, text data,
     # and any metadata around/inside around them:
@@ -283,19 +540,28 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
         'Node-kind: file\n'
         'Node-action: %s\n'
         '%s'  # no property header if no props
+        '%s'  # no delta headers if the text is not a delta
         'Text-content-length: %d\n'
         'Text-content-md5: %s\n'
         'Content-length: %d\n'
         '\n' % (
             self._utf8_path(cvs_rev.get_svn_path()), op, props_header,
-            len(data), checksum.hexdigest(), len(data) + len(prop_contents),
+            delta_header, text_length, checksum,
+            text_length + len(prop_contents),
             )
         )
 
     if prop_contents:
       self._dumpfile.write(prop_contents)
 
-    self._dumpfile.write(data)
+    if text is not None:
+      self._dumpfile.write(text)
+    else:
+      while True:
+        chunk = stream.read(self.CHUNK_SIZE)
+        if not chunk:
+          break
+        self._dumpfile.write(chunk)
 
     # This record is done (write two newlines -- one to terminate
     # contents that weren't themselves newline-termination, one to
@@ -322,8 +588,13 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
         % (self._utf8_path(lod.get_path()),)
         )
     self._basic_directories.remove(lod.get_path())
+    if self._delta_bases is not None:
+      self._delta_bases.remove_lod(lod)
 
   def delete_path(self, lod, cvs_path):
+    if self._delta_bases is not None:
+      self._delta_bases.remove(lod, cvs_path)
+
     dir_path, basename = path_split(lod.get_path(cvs_path.get_cvs_path()))
     if basename == '.cvsignore':
       # When a .cvsignore file is deleted, the directory's svn:ignore
@@ -384,6 +655,10 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
     else:
       raise InternalError()
 
+    if self._delta_bases is not None and node_kind == 'file':
+      # The file's new contents are not known:
+      self._delta_bases.remove(dest_lod, cvs_path)
+
     self._dumpfile.write(
         'Node-path: %s\n'
         'Node-kind: %s\n'
@@ -399,12 +674,55 @@ class DumpstreamDelegate(SVNRepositoryDelegate):
             )
         )
 
+  def get_basic_directories(self):
+    """Return a list of the basic directories created so far."""
+
+    return list(self._basic_directories)
+
+  def set_basic_directories(self, paths):
+    """Record that the basic directories PATHS exist already.
+
+    This is used to continue the output of an earlier conversion,
+    whose basic directories were returned by get_basic_directories()."""
+
+    self._basic_directories = set(paths)
+
+  def get_checkpoint(self):
+    """Flush the dump stream and return the state of this delegate."""
+
+    self._dumpfile.flush()
+    return self.get_basic_directories()
+
   def finish(self):
     """Perform any cleanup necessary after all revisions have been
     committed."""
 
     self._dumpfile.close()
 
+    if self._spooled_count:
+      logger.verbose(
+          'Spooled %d large file contents (%d bytes) to temporary files.'
+          % (self._spooled_count, self._spooled_bytes,)
+          )
+    counters.add('DumpstreamDelegate spooled contents', self._spooled_count)
+    counters.add('DumpstreamDelegate spooled bytes', self._spooled_bytes)
+
+    if self._delta_bases is not None:
+      logger.verbose(
+          'Wrote %d file changes as deltas (%d bytes instead of %d) '
+          'and %d as fulltexts.'
+          % (
+              self._delta_count, self._delta_bytes, self._delta_text_bytes,
+              self._fulltext_count,
+              )
+          )
+      counters.add('DumpstreamDelegate deltas', self._delta_count)
+      counters.add('DumpstreamDelegate fulltexts', self._fulltext_count)
+      counters.add('DumpstreamDelegate delta bytes', self._delta_bytes)
+      counters.add(
+          'DumpstreamDelegate delta fulltext bytes', self._delta_text_bytes
+          )
+
 
 def generate_ignores(raw_ignore_val):
   ignore_vals = [ ]
@@ -47,7 +47,9 @@ from cvs2svn_lib.fill_source import get_source_set
 from cvs2svn_lib.stdout_delegate import StdoutDelegate
 from cvs2svn_lib.svn_dump import DumpstreamDelegate
 from cvs2svn_lib.svn_dump import LoaderPipe
+from cvs2svn_lib.background_writer import get_buffered_writer
 from cvs2svn_lib.output_option import OutputOption
+from cvs2svn_lib.output_option import reopen_output_file
 
 
 class SVNOutputOption(OutputOption):
@@ -70,6 +72,13 @@ class SVNOutputOption(OutputOption):
   def __init__(self, author_transforms=None):
     self._mirror = RepositoryMirror()
 
+    # The DumpstreamDelegate that writes the output, if any:
+    self._dumpstream_delegate = None
+
+    # True while the commits of an earlier conversion are being
+    # replayed (see begin_replay()):
+    self._replaying = False
+
     def to_utf8(s):
       if isinstance(s, unicode):
         return s.encode('utf8')
@@ -130,6 +139,33 @@ class SVNOutputOption(OutputOption):
     Ctx().revision_reader.start()
     self.add_delegate(StdoutDelegate(svn_rev_count))
 
+  def get_checkpoint(self):
+    return (
+        self._mirror.get_checkpoint(),
+        Ctx().revision_reader.get_checkpoint(),
+        )
+
+  def resume(self, svn_rev_count, checkpoint):
+    (mirror_checkpoint, revision_reader_checkpoint) = checkpoint
+    self._symbolings_reader = SymbolingsReader()
+    self._mirror.resume(mirror_checkpoint)
+    self._delegates = []
+    Ctx().revision_reader.resume(revision_reader_checkpoint)
+    self.add_delegate(StdoutDelegate(svn_rev_count))
+
+  def begin_replay(self):
+    self._replaying = True
+
+  def end_replay(self, state):
+    self._replaying = False
+    if self._dumpstream_delegate is not None:
+      self._dumpstream_delegate.set_basic_directories(state)
+
+  def get_incremental_state(self):
+    if self._dumpstream_delegate is None:
+      return None
+    return self._dumpstream_delegate.get_basic_directories()
+
   def _get_author(self, svn_commit):
     author = svn_commit.get_author()
     name = self.author_transforms.get(author, author)
@@ -522,7 +558,11 @@ class SVNOutputOption(OutputOption):
 
     Iterate through each of our delegates, in the order that they were
     added, and call the delegate's method named METHOD with the
-    arguments in ARGS."""
+    arguments in ARGS.  While commits are being replayed, the delegates
+    are not invoked at all."""
+
+    if self._replaying:
+      return
 
     for delegate in self._delegates:
       getattr(delegate, method)(*args)
@@ -635,6 +675,10 @@ class SVNOutputOption(OutputOption):
 class DumpfileOutputOption(SVNOutputOption):
   """Output the result of the conversion into a dumpfile."""
 
+  supports_checkpoints = True
+
+  supports_incremental = True
+
   def __init__(self, dumpfile_path, author_transforms=None):
     SVNOutputOption.__init__(self, author_transforms)
     self.dumpfile_path = dumpfile_path
@@ -642,15 +686,38 @@ class DumpfileOutputOption(SVNOutputOption):
   def check(self):
     pass
 
+  def _add_dumpstream_delegate(self, dumpfile, checkpoint=None):
+    self._dumpfile = dumpfile
+    self._dumpstream_delegate = DumpstreamDelegate(
+        Ctx().revision_reader,
+        get_buffered_writer(self._dumpfile, Ctx().output_buffer_size),
+        deltas=Ctx().dump_deltas,
+        checkpoint=checkpoint,
+        )
+    self.add_delegate(self._dumpstream_delegate)
+
   def setup(self, svn_rev_count):
     logger.quiet("Starting Subversion Dumpfile.")
     SVNOutputOption.setup(self, svn_rev_count)
     if not Ctx().dry_run:
-      self.add_delegate(
-          DumpstreamDelegate(
-              Ctx().revision_reader, open(self.dumpfile_path, 'wb')
-              )
-          )
+      self._add_dumpstream_delegate(open(self.dumpfile_path, 'wb'))
+
+  def get_checkpoint(self):
+    dumpstream_checkpoint = self._dumpstream_delegate.get_checkpoint()
+    return (
+        SVNOutputOption.get_checkpoint(self),
+        dumpstream_checkpoint,
+        self._dumpfile.tell(),
+        )
+
+  def resume(self, svn_rev_count, checkpoint):
+    (svn_checkpoint, dumpstream_checkpoint, offset) = checkpoint
+    logger.quiet("Continuing Subversion Dumpfile.")
+    SVNOutputOption.resume(self, svn_rev_count, svn_checkpoint)
+    self._add_dumpstream_delegate(
+        reopen_output_file(self.dumpfile_path, offset),
+        dumpstream_checkpoint,
+        )
 
 
 class RepositoryOutputOption(SVNOutputOption):
@@ -676,9 +743,14 @@ class RepositoryOutputOption(SVNOutputOption):
     logger.quiet("Starting Subversion Repository.")
     SVNOutputOption.setup(self, svn_rev_count)
     if not Ctx().dry_run:
-      self.add_delegate(
-          DumpstreamDelegate(Ctx().revision_reader, LoaderPipe(self.target))
+      self._dumpstream_delegate = DumpstreamDelegate(
+          Ctx().revision_reader,
+          get_buffered_writer(
+              LoaderPipe(self.target), Ctx().output_buffer_size
+              ),
+          deltas=Ctx().dump_deltas,
           )
+      self.add_delegate(self._dumpstream_delegate)
 
 
 class NewRepositoryOutputOption(RepositoryOutputOption):
@@ -764,6 +836,8 @@ class NewRepositoryOutputOption(RepositoryOutputOption):
 class ExistingRepositoryOutputOption(RepositoryOutputOption):
   """Output the result of the conversion into an existing SVN repository."""
 
+  supports_incremental = True
+
   def __init__(self, target, author_transforms=None):
     RepositoryOutputOption.__init__(self, target, author_transforms)
 
@@ -169,3 +169,173 @@ class RevisionScores:
     return best_source_lod, best_revnum, best_score
 
 
+class RevisionCoverage:
+  """Choose revisions of one LOD that cover a set of SVNRevisionRanges.
+
+  This supports a greedy selection of sources: repeatedly find the
+  revision that is contained in the most ranges (the same revision
+  that RevisionScores.get_best_revnum() would choose), then remove the
+  ranges that contain it.  The scores are kept in a segment tree over
+  the distinct opening and closing revision numbers, so that each
+  selection and each removal take logarithmic rather than linear
+  time.
+
+  Each node of the tree represents an interval of leaves (i.e., of
+  revision numbers).  A range is stored at the O(log n) nodes whose
+  intervals exactly make up the range; a node's count is the number of
+  live ranges stored there.  The score of a leaf is the sum of the
+  counts of the nodes on its path to the root, and each node records
+  the maximum score within its subtree, not counting its ancestors."""
+
+  def __init__(self, items):
+    """Initialize from ITEMS, a list of (key, SVNRevisionRange).
+
+    All of the ranges must have the same source_lod and must be
+    non-empty.  The keys are returned by remove_covering()."""
+
+    self._keys = [key for (key, revision_range) in items]
+    self._live = [True] * len(items)
+    self._num_live = len(items)
+
+    revnums = set()
+    for (key, revision_range) in items:
+      revnums.add(revision_range.opening_revnum)
+      if revision_range.closing_revnum is not None:
+        revnums.add(revision_range.closing_revnum)
+    # The revision numbers represented by the leaves, in order:
+    self._revnums = list(revnums)
+    self._revnums.sort()
+    index_map = {}
+    for (i, revnum) in enumerate(self._revnums):
+      index_map[revnum] = i
+
+    size = 1
+    while size < len(self._revnums):
+      size *= 2
+    self._size = size
+
+    # The leaf interval [lo, hi) covered by each range:
+    self._bounds = []
+    for (key, revision_range) in items:
+      if revision_range.closing_revnum is None:
+        hi = len(self._revnums)
+      else:
+        hi = index_map[revision_range.closing_revnum]
+      lo = index_map[revision_range.opening_revnum]
+      # An empty range would never be removed, so callers would loop
+      # forever waiting for the coverage to be exhausted:
+      assert lo < hi, 'empty revision range %s' % (revision_range,)
+      self._bounds.append((lo, hi))
+
+    self._counts = [0] * (2 * size)
+    # The indexes of the ranges stored at each node.  Entries for
+    # ranges that have been removed are only discarded lazily:
+    self._members = [None] * (2 * size)
+    for i in range(len(items)):
+      for node in self._get_nodes(i):
+        self._counts[node] += 1
+        if self._members[node] is None:
+          self._members[node] = [i]
+        else:
+          self._members[node].append(i)
+
+    # Padding leaves must never be selected:
+    self._max = [0] * (2 * size)
+    for leaf in range(len(self._revnums), size):
+      self._max[size + leaf] = -1
+    for node in xrange(2 * size - 1, 0, -1):
+      self._update(node)
+
+  def __len__(self):
+    """Return the number of ranges that have not been removed yet."""
+
+    return self._num_live
+
+  def _get_nodes(self, i):
+    """Generate the nodes at which the range with index I is stored."""
+
+    (lo, hi) = self._bounds[i]
+    lo += self._size
+    hi += self._size
+    while lo < hi:
+      if lo & 1:
+        yield lo
+        lo += 1
+      if hi & 1:
+        hi -= 1
+        yield hi
+      lo //= 2
+      hi //= 2
+
+  def _update(self, node):
+    """Recompute the maximum of NODE from its count and children."""
+
+    if node < self._size:
+      self._max[node] = self._counts[node] + max(
+          self._max[2 * node], self._max[2 * node + 1]
+          )
+    elif self._max[node] >= 0:
+      self._max[node] = self._counts[node]
+
+  def get_best_revnum(self):
+    """Return (revnum, score) for the revnum with the highest score.
+
+    If the highest score is shared by multiple revisions, select the
+    oldest revision.  If no ranges are left, return
+    (SVN_INVALID_REVNUM, 0)."""
+
+    if not self._num_live:
+      return (SVN_INVALID_REVNUM, 0)
+
+    node = 1
+    while node < self._size:
+      if self._max[2 * node] >= self._max[2 * node + 1]:
+        node = 2 * node
+      else:
+        node = 2 * node + 1
+    return (self._revnums[node - self._size], self._max[1])
+
+  def remove_covering(self, revnum):
+    """Remove the ranges that contain REVNUM, which must be a leaf.
+
+    Return the keys of the removed ranges, in the order that they were
+    passed to the constructor."""
+
+    leaf = bisect.bisect_left(self._revnums, revnum)
+    assert self._revnums[leaf] == revnum
+
+    # Every live range stored on the path from the leaf to the root
+    # contains the leaf, so all of them are removed:
+    removed = []
+    node = self._size + leaf
+    while node:
+      members = self._members[node]
+      if members is not None:
+        for i in members:
+          if self._live[i]:
+            self._live[i] = False
+            removed.append(i)
+        self._members[node] = None
+      node //= 2
+
+    dirty = set()
+    for i in removed:
+      for node in self._get_nodes(i):
+        self._counts[node] -= 1
+        while node and node not in dirty:
+          dirty.add(node)
+          node //= 2
+
+    # Update the affected nodes and their ancestors.  Children have
+    # higher node numbers than their parents, so update in descending
+    # order:
+    dirty = list(dirty)
+    dirty.sort()
+    dirty.reverse()
+    for node in dirty:
+      self._update(node)
+
+    self._num_live -= len(removed)
+    removed.sort()
+    return [self._keys[i] for i in removed]
+
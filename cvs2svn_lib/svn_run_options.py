@@ -216,6 +216,21 @@ A directory called \\fIcvs2svn-tmp\\fR (or the directory specified by
             ),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--dump-deltas',
+        action='store_true',
+        help=(
+            'write file changes as deltas (dumpfile format version 3)'
+            ),
+        man_help=(
+            'Write a version 3 dumpfile, in which each file change is '
+            'expressed as a delta against the previous contents of the '
+            'file.  This makes the dumpfile (and the data piped into '
+            '"svnadmin load") much smaller for repositories with large, '
+            'frequently-modified files, at the cost of the time and memory '
+            'needed to compute the deltas.'
+            ),
+        ))
 
     group.add_option(ContextOption(
         '--dry-run',
@@ -353,6 +368,25 @@ A directory called \\fIcvs2svn-tmp\\fR (or the directory specified by
         metavar='PATH',
         compatible_with_option=True,
         ))
+    group.add_option(ContextOption(
+        '--output-buffer-size', type='int',
+        action='store',
+        help=(
+            'queue up to SIZE bytes of output in memory while it is '
+            'being written (default %d; 0 to write synchronously)'
+            % (config.OUTPUT_BUFFER_SIZE,)
+            ),
+        man_help=(
+            'Queue up to \\fIsize\\fR bytes of output in memory while a '
+            'background thread writes it to the dumpfile or to '
+            '"svnadmin load", so that cvs2svn does not have to wait while '
+            '\\fIsvnadmin\\fR commits a revision.  Use 0 to write the '
+            'output synchronously.  The default is %d.'
+            % (config.OUTPUT_BUFFER_SIZE,)
+            ),
+        metavar='SIZE',
+        compatible_with_option=True,
+        ))
 
     return group
 
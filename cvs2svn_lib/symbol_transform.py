@@ -49,6 +49,30 @@ class SymbolTransform:
 
     raise NotImplementedError()
 
+  def get_directory_transform(self, directory):
+    """Return a SymbolTransform equivalent to this one within DIRECTORY.
+
+    DIRECTORY is the filesystem path of a directory in the CVS
+    repository, normalized using os.path.normpath() and
+    os.path.normcase().  Return a SymbolTransform whose transform()
+    method returns the same results as this one for the RCS files
+    located directly in DIRECTORY, or None if this SymbolTransform
+    leaves all of their symbols unaltered.  This allows
+    CompiledSymbolTransform to skip rules that cannot apply.  The
+    default implementation returns SELF."""
+
+    return self
+
+  def is_memoizable(self):
+    """Return True iff the results of transform() can be memoized.
+
+    This is the case if the result of transform() only depends on
+    SYMBOL_NAME and on whether REVISION is a branch revision number,
+    but not on CVS_FILE or on the exact revision number.  The default
+    implementation returns False."""
+
+    return False
+
 
 class ReplaceSubstringsSymbolTransform(SymbolTransform):
   """Replace specific substrings in symbol names.
@@ -62,6 +86,9 @@ class ReplaceSubstringsSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
     return symbol_name.replace(self.old, self.new)
 
+  def is_memoizable(self):
+    return True
+
 
 class NormalizePathsSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
@@ -70,6 +97,9 @@ class NormalizePathsSymbolTransform(SymbolTransform):
     except IllegalSVNPathError, e:
       raise FatalError('Problem with %s: %s' % (symbol_name, e,))
 
+  def is_memoizable(self):
+    return True
+
 
 class CompoundSymbolTransform(SymbolTransform):
   """A SymbolTransform that applies other SymbolTransforms in series.
@@ -96,6 +126,28 @@ class CompoundSymbolTransform(SymbolTransform):
 
     return symbol_name
 
+  def get_directory_transform(self, directory):
+    symbol_transforms = []
+    for symbol_transform in self.symbol_transforms:
+      symbol_transform = symbol_transform.get_directory_transform(directory)
+      if symbol_transform is not None:
+        symbol_transforms.append(symbol_transform)
+
+    if not symbol_transforms:
+      return None
+    elif symbol_transforms == self.symbol_transforms:
+      return self
+    elif len(symbol_transforms) == 1:
+      return symbol_transforms[0]
+    else:
+      return CompoundSymbolTransform(symbol_transforms)
+
+  def is_memoizable(self):
+    for symbol_transform in self.symbol_transforms:
+      if not symbol_transform.is_memoizable():
+        return False
+    return True
+
 
 class RegexpSymbolTransform(SymbolTransform):
   """Transform symbols by using a regexp textual substitution."""
@@ -115,6 +167,9 @@ class RegexpSymbolTransform(SymbolTransform):
   def transform(self, cvs_file, symbol_name, revision):
     return self.pattern.sub(self.replacement, symbol_name)
 
+  def is_memoizable(self):
+    return True
+
 
 class SymbolMapper(SymbolTransform):
   """A SymbolTransform that transforms specific symbol definitions.
@@ -133,6 +188,9 @@ class SymbolMapper(SymbolTransform):
     # A map {(cvs_filename, symbol_name, revision) : new_name}:
     self._map = {}
 
+    # The set of directories containing the files in self._map:
+    self._directories = set()
+
     for (cvs_filename, symbol_name, revision, new_name) in items:
       self[cvs_filename, symbol_name, revision] = new_name
 
@@ -148,6 +206,7 @@ class SymbolMapper(SymbolTransform):
           % (cvs_filename, symbol_name, revision,)
           )
     self._map[key] = new_name
+    self._directories.add(os.path.dirname(cvs_filename))
 
   def transform(self, cvs_file, symbol_name, revision):
     # cvs_file.filename is guaranteed to already be normalised the way
@@ -157,6 +216,12 @@ class SymbolMapper(SymbolTransform):
         (cvs_filename, symbol_name, revision), symbol_name
         )
 
+  def get_directory_transform(self, directory):
+    if directory in self._directories:
+      return self
+    else:
+      return None
+
 
 class SubtreeSymbolMapper(SymbolTransform):
   """A SymbolTransform that transforms symbols within a whole repo subtree.
@@ -220,6 +285,50 @@ class SubtreeSymbolMapper(SymbolTransform):
         else:
           cvs_path = new_cvs_path
 
+  def get_directory_transform(self, directory):
+    # A map {symbol_name : (cvs_path, new_name)} for the most specific
+    # rules for DIRECTORY or one of its ancestors:
+    name_map = {}
+    for (symbol_name, symbol_map) in self._map.iteritems():
+      for (cvs_path, new_name) in symbol_map.iteritems():
+        if cvs_path.startswith(directory + os.sep):
+          # There is a rule for a path within DIRECTORY, which might be
+          # more specific than the rules for DIRECTORY itself for some
+          # of the files in DIRECTORY:
+          return self
+        elif cvs_path == directory \
+               or directory.startswith(cvs_path + os.sep):
+          if symbol_name not in name_map \
+                 or len(cvs_path) > len(name_map[symbol_name][0]):
+            name_map[symbol_name] = (cvs_path, new_name)
+
+    if not name_map:
+      return None
+
+    # The same rule applies to all of the files in DIRECTORY:
+    symbol_map = {}
+    for (symbol_name, (cvs_path, new_name)) in name_map.iteritems():
+      symbol_map[symbol_name] = new_name
+    return _SymbolNameMapper(symbol_map)
+
+
+class _SymbolNameMapper(SymbolTransform):
+  """A SymbolTransform that maps symbol names regardless of the file.
+
+  This is the form that a SubtreeSymbolMapper takes within a directory
+  that is entirely covered by its rules."""
+
+  def __init__(self, symbol_map):
+    """SYMBOL_MAP is a map {symbol_name : new_name}."""
+
+    self._symbol_map = symbol_map
+
+  def transform(self, cvs_file, symbol_name, revision):
+    return self._symbol_map.get(symbol_name, symbol_name)
+
+  def is_memoizable(self):
+    return True
+
 
 class IgnoreSymbolTransform(SymbolTransform):
   """Ignore symbols matching a specified regular expression."""
@@ -238,6 +347,9 @@ class IgnoreSymbolTransform(SymbolTransform):
     else:
       return symbol_name
 
+  def is_memoizable(self):
+    return True
+
 
 class SubtreeSymbolTransform(SymbolTransform):
   """A wrapper around another SymbolTransform, that limits it to a
@@ -304,6 +416,18 @@ class SubtreeSymbolTransform(SymbolTransform):
       # Rule does not apply to that path; return symbol name unaltered.
       return symbol_name
 
+  def get_directory_transform(self, directory):
+    if directory == self.__subtree \
+           or directory.startswith(self.__subtree + os.sep):
+      # The rule applies to all files in DIRECTORY:
+      return self.__inner.get_directory_transform(directory)
+    elif os.path.dirname(self.__subtree) == directory:
+      # The subtree might be one of the files in DIRECTORY:
+      return self
+    else:
+      # The rule doesn't apply to any of the files in DIRECTORY:
+      return None
+
 
 class TagOnlyTransform(SymbolTransform):
   """A wrapper around another SymbolTransform, that limits it to
@@ -323,6 +447,18 @@ class TagOnlyTransform(SymbolTransform):
       # It's a tag
       return self.__inner.transform(cvs_file, symbol_name, revision)
 
+  def get_directory_transform(self, directory):
+    inner = self.__inner.get_directory_transform(directory)
+    if inner is None:
+      return None
+    elif inner is self.__inner:
+      return self
+    else:
+      return TagOnlyTransform(inner)
+
+  def is_memoizable(self):
+    return self.__inner.is_memoizable()
+
 
 class BranchOnlyTransform(SymbolTransform):
   """A wrapper around another SymbolTransform, that limits it to
@@ -342,4 +478,85 @@ class BranchOnlyTransform(SymbolTransform):
       # It's a tag
       return symbol_name
 
+  def get_directory_transform(self, directory):
+    inner = self.__inner.get_directory_transform(directory)
+    if inner is None:
+      return None
+    elif inner is self.__inner:
+      return self
+    else:
+      return BranchOnlyTransform(inner)
+
+  def is_memoizable(self):
+    return self.__inner.is_memoizable()
+
+
+class CompiledSymbolTransform(SymbolTransform):
+  """Apply another SymbolTransform efficiently to the files of a project.
+
+  The wrapped SymbolTransform is specialized for each directory (see
+  SymbolTransform.get_directory_transform()), so that rules that
+  cannot apply to the files in a directory are not evaluated at all.
+  If the specialized transform is memoizable, its results are cached,
+  keyed by the symbol name and whether the revision is a branch, so
+  that files sharing a specialized transform share the work of
+  transforming their symbols.  The results are identical to those of
+  the wrapped SymbolTransform."""
+
+  def __init__(self, symbol_transform):
+    self._symbol_transform = symbol_transform
+
+    # A map {directory : (symbol_transform, memo)}, where
+    # symbol_transform is the specialized SymbolTransform for the
+    # directory (or None if no rules apply) and memo is a map
+    # {(symbol_name, is_branch) : new_name} or None if the results
+    # cannot be memoized:
+    self._directories = {}
+
+    # A map {id(symbol_transform) : memo}, so that directories with
+    # the same specialized SymbolTransform share their memo:
+    self._memos = {}
+
+    # The CVSFile most recently seen and its (symbol_transform, memo):
+    self._cvs_file = None
+    self._entry = None
+
+  def _get_entry(self, directory):
+    try:
+      return self._directories[directory]
+    except KeyError:
+      pass
+
+    symbol_transform = self._symbol_transform.get_directory_transform(
+        directory
+        )
+    if symbol_transform is None or not symbol_transform.is_memoizable():
+      memo = None
+    else:
+      memo = self._memos.setdefault(id(symbol_transform), {})
+    entry = self._directories[directory] = (symbol_transform, memo)
+    return entry
+
+  def transform(self, cvs_file, symbol_name, revision):
+    if cvs_file is not self._cvs_file:
+      # cvs_file.filename is guaranteed to already be normalised the
+      # way os.path.normpath() normalises paths.
+      self._entry = self._get_entry(
+          os.path.normcase(os.path.dirname(cvs_file.filename))
+          )
+      self._cvs_file = cvs_file
+
+    (symbol_transform, memo) = self._entry
+    if symbol_transform is None:
+      return symbol_name
+    elif memo is None:
+      return symbol_transform.transform(cvs_file, symbol_name, revision)
+
+    key = (symbol_name, is_branch_revision_number(revision))
+    try:
+      return memo[key]
+    except KeyError:
+      new_name = symbol_transform.transform(cvs_file, symbol_name, revision)
+      memo[key] = new_name
+      return new_name
 
@@ -3485,6 +3485,37 @@ def main_git2():
       ])
 
 
+@Cvs2SvnTestFunction
+def main_git_repos():
+  "test cvs2git --gitrepos option"
+
+  # The repository can be checked using "git fsck --full".  We just
+  # check that the expected packfile and references were written:
+  repos = 'cvs2svn-tmp/main.git'
+  if os.path.exists(repos):
+    safe_rmtree(repos)
+  conv = GitConversion('main', None, [
+      '--use-external-blob-generator',
+      '--blobfile=cvs2svn-tmp/blobfile.out',
+      '--gitrepos=%s' % (repos,),
+      '--username=cvs2git',
+      'test-data/main-cvsrepos',
+      ])
+
+  pack_files = os.listdir(os.path.join(repos, 'objects', 'pack'))
+  pack_files.sort()
+  if len(pack_files) != 2 or pack_files[0][:-4] + '.pack' != pack_files[1]:
+    raise Failure()
+  refs = [
+      line.split()[1]
+      for line in open(os.path.join(repos, 'packed-refs'))
+      if not line.startswith('#')
+      ]
+  for ref in ['refs/heads/master', 'refs/tags/T_ALL_INITIAL_FILES']:
+    if ref not in refs:
+      raise Failure()
+
+
 @Cvs2SvnTestFunction
 def git_options():
   "test cvs2git using options file"
@@ -3866,6 +3897,147 @@ def add_on_branch2():
     ))
 
 
+@Cvs2SvnTestFunction
+def pipeline_passes():
+  "run streaming pairs of passes concurrently"
+
+  conv = ensure_conversion('main', args=['--pipeline-passes'])
+  if hasattr(os, 'mkfifo') \
+         and not conv.output_found(r'----- passes .* pipelined -----'):
+    raise Failure()
+
+
+@Cvs2SvnTestFunction
+def write_stats():
+  "write per-pass statistics with --write-stats"
+
+  stats_file = os.path.join(tmp_dir, 'write-stats.json')
+  conv = ensure_conversion(
+      'main', args=['--write-stats=%s' % (stats_file,)]
+      )
+  try:
+    import json
+  except ImportError:
+    try:
+      import simplejson as json
+    except ImportError:
+      return
+
+  f = open(stats_file)
+  stats = json.load(f)
+  f.close()
+  if stats['cvs_files'] != 29:
+    raise Failure()
+  for pass_stats in stats['passes']:
+    if 'duration' not in pass_stats or 'artifacts_created' not in pass_stats:
+      raise Failure()
+  # CollectRevsPass writes the metadata database through IndexedDatabase:
+  metadata_stats = stats['passes'][0]['artifacts']['metadata.pck']
+  if metadata_stats['bytes_written'] <= 0:
+    raise Failure()
+
+
+@Cvs2SvnTestFunction
+def keep_databases_loaded():
+  "keep databases loaded between passes"
+
+  conv = ensure_conversion('main', args=['--keep-databases-loaded'])
+  if not conv.path_exists('trunk', 'single-files', 'twoquick'):
+    raise Failure()
+
+
+@Cvs2SvnTestFunction
+def dump_deltas():
+  "write file changes as deltas with --dump-deltas"
+
+  conv = ensure_conversion('main', args=['--dump-deltas'])
+  ref = ensure_conversion('main')
+
+  # svnadmin checks the deltas when loading them; make sure that the
+  # resulting files are the same as without --dump-deltas:
+  ref_wc = ref.get_wc()
+  for (dirpath, dirnames, filenames) in os.walk(ref_wc):
+    if '.svn' in dirnames:
+      dirnames.remove('.svn')
+    for filename in filenames:
+      path = os.path.join(dirpath, filename)
+      if (
+            open(path, 'rb').read()
+            != open(conv.get_wc(path[len(ref_wc) + 1:]), 'rb').read()
+            ):
+        raise Failure()
+
+
+@Cvs2SvnTestFunction
+def dump_deltas_spooled_base():
+  "--dump-deltas after a file was too large to cache"
+
+  # file.txt,v grows beyond the spool threshold set in the options
+  # file in 1.2 and shrinks again in 1.3; 1.3 must not be written as a
+  # delta against 1.1.  svnadmin checks the delta base's checksum:
+  conv = ensure_conversion(
+      'delta-base-spool', options_file='cvs2svn-dump-deltas.options'
+      )
+  if 'modified line 5' not in open(conv.get_wc('trunk', 'file.txt')).read():
+    raise Failure()
+
+
+@Cvs2SvnTestFunction
+def resume_output_pass():
+  "resume OutputPass from a checkpoint"
+
+  dumpfile = os.path.join(tmp_dir, 'resume.dump')
+  resume_tmp_dir = os.path.join(tmp_dir, 'resume-tmp')
+  if os.path.exists(resume_tmp_dir):
+    safe_rmtree(resume_tmp_dir)
+  args = [
+      '--checkpoint-interval=4', '--skip-cleanup',
+      '--tmpdir=%s' % (resume_tmp_dir,), '--dumpfile=%s' % (dumpfile,),
+      'test-data/main-cvsrepos',
+      ]
+  run_script(cvs2svn, None, *args)
+  expected = open(dumpfile, 'rb').read()
+
+  # Pretend that OutputPass was interrupted after writing some output
+  # beyond the last checkpoint, which has to be discarded:
+  open(dumpfile, 'ab').write('Revision-number: ')
+  stdout = run_script(cvs2svn, None, '--passes=OutputPass:', *args)
+  resume_re = re.compile(r'^Resuming OutputPass after r\d+\.$')
+  if not [line for line in stdout if resume_re.match(line)]:
+    raise Failure('OutputPass was not resumed')
+  if open(dumpfile, 'rb').read() != expected:
+    raise Failure('Resumed dumpfile differs')
+
+
+@Cvs2SvnTestFunction
+def incremental_no_changes():
+  "follow-up conversion of an unchanged repository"
+
+  state_filename = os.path.join(tmp_dir, 'incremental-state.pck')
+  if os.path.exists(state_filename):
+    os.remove(state_filename)
+  dumpfile = os.path.join(tmp_dir, 'incremental.dump')
+  args = [
+      '--incremental=%s' % (state_filename,),
+      '--dumpfile=%s' % (dumpfile,),
+      'test-data/main-cvsrepos',
+      ]
+  run_script(cvs2svn, None, *args)
+  if not os.path.exists(state_filename):
+    raise Failure('The incremental state was not written')
+  revision_re = re.compile(r'^Revision-number: ', re.M)
+  if not revision_re.search(open(dumpfile, 'rb').read()):
+    raise Failure('The first conversion output no revisions')
+
+  # A follow-up conversion of the same repository has nothing to add:
+  stdout = run_script(cvs2svn, None, *args)
+  replay_re = re.compile(r'^Replaying r1-r\d+, ')
+  if not [line for line in stdout if replay_re.match(line)]:
+    raise Failure('The earlier commits were not replayed')
+  if revision_re.search(open(dumpfile, 'rb').read()):
+    raise Failure('The follow-up conversion output revisions')
+
+
 ########################################################################
 # Run the tests
 
@@ -4073,6 +4245,15 @@ test_list = [
     include_empty_directories_no_prune,
     exclude_symbol_default,
     add_on_branch2,
+    pipeline_passes,
+    write_stats,
+    keep_databases_loaded,
+    dump_deltas,
+    dump_deltas_spooled_base,
+    resume_output_pass,
+# 180:
+    incremental_no_changes,
+    main_git_repos,
     ]
 
 if __name__ == '__main__':